@@ -0,0 +1,158 @@
+"""
+# LangChain Coder - Batch generation
+Headless batch generation over a task corpus, without a browser or a Streamlit session.
+Reads the tasks from data/coding_tasks.json or a JSONL file ({"task": ..., "input": ..., "output": ...} per line),
+generates code for every task, provider and language with a bounded concurrency and appends one JSON line per
+result to the output file with its timing and token usage. Results already in the output file are skipped, so an
+interrupted run resumes where it stopped. Responses land in the response cache, which pre-warms it for the UI.
+
+Usage:
+    python batch_generate.py --providers mock,openai --languages Python,C++ --concurrency 4 --output results/batch.jsonl
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import traceback
+from dotenv import load_dotenv
+from libs.core_api import get_provider, provider_config_from_env
+from libs.generation_engine import get_generation_engine
+from libs.logger import logger
+from libs.prompt_registry import GUIDELINES
+from libs.response_cache import bypass_response_cache
+from libs.usage_meter import Usage, get_usage_ledger
+
+PROVIDERS = ("mock", "openai", "gemini", "palm", "vertexai")
+
+def load_tasks(tasks_path):
+    """Load the tasks of a coding_tasks.json file or of a JSONL file as (task_id, task, input, output) tuples."""
+    tasks = []
+    with open(tasks_path) as file:
+        if tasks_path.endswith(".jsonl"):
+            records = [json.loads(line) for line in file if line.strip()]
+        else:
+            records = [{"task": task["task"], **task.get("example", {})} for task in json.load(file)["coding_tasks"]]
+    for record in records:
+        task_id = record.get("id") or hashlib.sha256(record["task"].encode("utf-8")).hexdigest()[:12]
+        tasks.append((str(task_id), record["task"], record.get("input"), record.get("output")))
+    return tasks
+
+def load_completed(output_path):
+    """Return the (task_id, provider, language) keys which already have a successful result."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path) as file:
+        for line in file:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # The last line of an interrupted run may be cut short.
+                continue
+            if result.get("status") == "ok":
+                completed.add((result["task_id"], result["provider"], result["language"]))
+    return completed
+
+def create_provider(provider_name, model_name=None):
+    """Create a provider client from the environment, the same settings the UI uses by default."""
+    return get_provider(provider_config_from_env(provider_name, model_name))
+
+class BatchGenerator:
+    def __init__(self, providers, languages, output_path, concurrency=4, coding_guidelines=None):
+        self.providers = providers
+        self.languages = languages
+        self.output_path = output_path
+        self.concurrency = concurrency
+        self.coding_guidelines = coding_guidelines or {}
+        self._write_lock = threading.Lock()
+        self.stats = {"ok": 0, "error": 0, "cached": 0, "skipped": 0}
+
+    def _write_result(self, result):
+        with self._write_lock:
+            with open(self.output_path, "a") as file:
+                file.write(json.dumps(result) + "\n")
+                file.flush()
+
+    async def _generate(self, semaphore, provider, task_id, task, task_input, task_output, code_language):
+        code_prompt = f"Task = '{task}'\nInput = '{task_input}'\nOutput = '{task_output}'"
+        result = {"task_id": task_id, "task": task, "provider": provider.provider_name, "model": provider.model_name, "language": code_language}
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                code_input = json.dumps(task_input) if isinstance(task_input, (dict, list)) else task_input
+                prompt = provider.render_generate_prompt(code_prompt, code_language, self.coding_guidelines, code_input)
+                options = provider.generate_options()
+                completion = await get_generation_engine().submit(provider.cached_completion, prompt, **options)
+                cached = completion is not None
+                if not cached:
+                    completion = await provider.acomplete(prompt, **options)
+                code = provider.utils.extract_code(completion, code_language) if completion else None
+                if not code:
+                    raise ValueError("The provider returned no code.")
+                usage = Usage.measure(prompt, completion, provider.model_name)
+                result.update({
+                    "status": "ok", "code": code, "cached": cached,
+                    "prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens,
+                    "cost": 0.0 if cached else get_usage_ledger().price_table.cost(provider.model_name, usage),
+                })
+                self.stats["cached" if cached else "ok"] += 1
+            except Exception as exception:
+                logger.error(f"Error generating task {task_id} with {provider.provider_name} in {code_language}: {traceback.format_exc()}")
+                result.update({"status": "error", "error": str(exception)})
+                self.stats["error"] += 1
+            result["latency_seconds"] = round(time.perf_counter() - started, 3)
+            result["timestamp"] = time.time()
+        self._write_result(result)
+        print(f"[{result['status']}] {task_id} {provider.provider_name}/{code_language} in {result['latency_seconds']}s", flush=True)
+
+    async def run(self, tasks):
+        completed = load_completed(self.output_path)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        jobs = []
+        for task_id, task, task_input, task_output in tasks:
+            for provider in self.providers:
+                for code_language in self.languages:
+                    if (task_id, provider.provider_name, code_language) in completed:
+                        self.stats["skipped"] += 1
+                        continue
+                    jobs.append(self._generate(semaphore, provider, task_id, task, task_input, task_output, code_language))
+        logger.info(f"Batch generation of {len(jobs)} results, {self.stats['skipped']} already completed")
+        await get_generation_engine().gather(*jobs)
+        return self.stats
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Generate code for a task corpus without the Streamlit UI.")
+    parser.add_argument("--tasks", default="data/coding_tasks.json", help="coding_tasks.json or JSONL file with one task per line.")
+    parser.add_argument("--providers", default="mock", help=f"Comma separated providers: {', '.join(PROVIDERS)}.")
+    parser.add_argument("--model", default=None, help="Model name, the provider default when omitted.")
+    parser.add_argument("--languages", default="Python", help="Comma separated code languages.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of generations in flight.")
+    parser.add_argument("--output", default="results/batch_generate.jsonl", help="JSONL file the results are appended to.")
+    parser.add_argument("--limit", type=int, default=None, help="Only generate the first N tasks.")
+    parser.add_argument("--guidelines", default="", help=f"Comma separated coding guidelines: {', '.join(name for name, _ in GUIDELINES)}.")
+    parser.add_argument("--bypass-cache", action="store_true", help="Always call the providers, the responses still refresh the cache.")
+    return parser.parse_args()
+
+def main():
+    load_dotenv()
+    arguments = parse_arguments()
+    tasks = load_tasks(arguments.tasks)[:arguments.limit]
+    providers = [create_provider(name.strip(), arguments.model) for name in arguments.providers.split(",") if name.strip()]
+    languages = [language.strip() for language in arguments.languages.split(",") if language.strip()]
+    coding_guidelines = {name.strip(): True for name in arguments.guidelines.split(",") if name.strip()}
+
+    output_directory = os.path.dirname(arguments.output)
+    if output_directory:
+        os.makedirs(output_directory, exist_ok=True)
+
+    batch_generator = BatchGenerator(providers, languages, arguments.output, arguments.concurrency, coding_guidelines)
+    started = time.perf_counter()
+    with bypass_response_cache(arguments.bypass_cache):
+        stats = get_generation_engine().run(batch_generator.run(tasks))
+    print(f"Done in {time.perf_counter() - started:.1f}s: {stats['ok']} generated, {stats['cached']} from cache, {stats['error']} failed, {stats['skipped']} already completed", flush=True)
+
+if __name__ == "__main__":
+    main()
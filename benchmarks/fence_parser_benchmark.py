@@ -0,0 +1,91 @@
+"""
+# LangChain Coder - Fenced code parser benchmark
+Times the extraction of code from large provider responses with the single pass parser of libs/code_fences.py,
+once on the whole text and once fed in stream sized chunks, next to the two extractors it replaced: the repeated
+find calls of the old GeneralUtils.extract_code and the greedy regex of the old Vertex AI path.
+
+Usage:
+    python benchmarks/fence_parser_benchmark.py --sizes 1,4,16 --repeat 5
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs.code_fences import FenceParser, extract_code
+
+BLOCK_LINES = 40
+PROGRAM_LINE = 'def step_{index}(value):\n    return value * {index} + len("step {index}")\n'
+
+def build_response(size_mb, blocks):
+    """A markdown response of about size_mb megabytes with prose and `blocks` fenced blocks, the last one in Python."""
+    target = int(size_mb * 1024 * 1024)
+    block_size = target // blocks
+    parts = []
+    for block in range(blocks):
+        lines, length, index = [], 0, 0
+        while length < block_size:
+            line = PROGRAM_LINE.format(index=index)
+            lines.append(line)
+            length += len(line)
+            index += 1
+        language = "python" if block == blocks - 1 else "text"
+        parts.append(f"Part {block + 1} of the answer:\n\n```{language}\n{''.join(lines)}```\n")
+    return "\n".join(parts)
+
+def find_extract(code):
+    start = code.find('```') + len('```\n')
+    end = code.find('```', start)
+    start = code.find('\n', start) + 1
+    return code[start:end]
+
+def regex_extract(response):
+    generated_code = re.search('```(.*)```', response, re.DOTALL).group(1)
+    return generated_code.split("\n", 1)[1]
+
+def chunked_extract(response, chunk_size=64):
+    parser = FenceParser()
+    for start in range(0, len(response), chunk_size):
+        parser.feed(response[start:start + chunk_size])
+    parser.close()
+    return parser.current_code("Python")
+
+def time_call(function, argument, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(argument)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the fenced code extraction on large responses.")
+    parser.add_argument("--sizes", default="1,4,16", help="Comma separated response sizes in megabytes.")
+    parser.add_argument("--blocks", type=int, default=3, help="Number of fenced blocks per response.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement, the median is reported.")
+    return parser.parse_args()
+
+def main():
+    arguments = parse_arguments()
+    extractors = {
+        "find (old)": find_extract,
+        "regex (old vertex)": regex_extract,
+        "parser": lambda response: extract_code(response, "Python"),
+        "parser, 64 byte chunks": chunked_extract,
+    }
+    print(f"{'size':>8}  {'extractor':<24}{'median':>10}{'MB/s':>10}  picked python block")
+    for size_mb in [float(size) for size in arguments.sizes.split(",")]:
+        response = build_response(size_mb, arguments.blocks)
+        megabytes = len(response) / (1024 * 1024)
+        python_block = extract_code(response, "Python")
+        for name, extractor in extractors.items():
+            seconds = time_call(extractor, response, arguments.repeat)
+            picked = extractor(response) == python_block
+            print(f"{megabytes:>6.1f}MB  {name:<24}{seconds * 1000:>8.1f}ms{megabytes / seconds:>10.1f}  {picked}")
+
+if __name__ == "__main__":
+    main()
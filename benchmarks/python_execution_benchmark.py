@@ -0,0 +1,66 @@
+"""
+# LangChain Coder - Python execution benchmark
+Times short Python programs run on the warm worker pool of libs/python_worker_pool.py next to a fresh interpreter
+per run, the way offline execution worked before the pool.
+
+Usage:
+    python benchmarks/python_execution_benchmark.py --runs 50 --pool-size 2
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs.python_worker_pool import PythonWorkerPool
+
+PROGRAMS = {
+    "hello world": 'print("Hello, World!")',
+    "read stdin": "numbers = [int(value) for value in input().split()]\nprint(sum(numbers))",
+    "json and re": 'import json, re\nprint(json.dumps({"words": re.findall(r"\\w+", "a quick test")}))',
+    "loop": "total = 0\nfor i in range(100000):\n    total += i * i\nprint(total)",
+}
+STDIN = "1 2 3 4 5"
+
+def run_fresh(code):
+    with tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=True) as file:
+        file.write(code)
+        file.flush()
+        output = subprocess.run(["python", file.name], capture_output=True, text=True, input=STDIN)
+        return output.stdout + output.stderr
+
+def measure(function, code, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        function(code)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the warm Python worker pool against a fresh interpreter per run.")
+    parser.add_argument("--runs", type=int, default=50, help="Runs per program, the median is reported.")
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--max-runs", type=int, default=50, help="Programs per worker before it is replaced.")
+    return parser.parse_args()
+
+def main():
+    arguments = parse_arguments()
+    pool = PythonWorkerPool(size=arguments.pool_size, max_runs=arguments.max_runs).start()
+    # Let the pool warm up, as it does at application startup.
+    pool.run("pass")
+
+    print(f"{'program':<14}{'fresh':>10}{'pool':>10}{'speedup':>9}")
+    for name, code in PROGRAMS.items():
+        assert run_fresh(code) == pool.run(code, STDIN), name
+        fresh = measure(run_fresh, code, arguments.runs)
+        warm = measure(lambda program: pool.run(program, STDIN), code, arguments.runs)
+        print(f"{name:<14}{fresh * 1000:>8.1f}ms{warm * 1000:>8.1f}ms{fresh / warm:>8.1f}x")
+    print(pool.get_stats())
+
+if __name__ == "__main__":
+    main()
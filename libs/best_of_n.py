@@ -0,0 +1,91 @@
+"""
+Best-of-N code generation.
+
+Samples N candidate programs concurrently from a provider and runs them through the offline runner in
+parallel. The first candidate whose output matches the expected output wins, otherwise the candidates are
+ranked by whether they ran without errors and how close their output is to the expected one.
+"""
+import difflib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from libs.generation_engine import get_generation_engine
+from libs.logger import logger
+
+@dataclass
+class CandidateResult:
+    code: str
+    output: str = None
+    matched: bool = False
+    score: float = 0.0
+    index: int = 0
+
+class BestOfNSelector:
+    def __init__(self, general_utils, max_workers=4):
+        self.general_utils = general_utils
+        self.max_workers = max_workers
+
+    def _score(self, candidate, expected_output):
+        if candidate.output is None:
+            return 0.0
+        output = candidate.output.strip()
+        if self.general_utils.is_error_output(output):
+            return 0.0
+        if not expected_output:
+            return 1.0 if output else 0.5
+        # Runs without error come first, then the closest output to the expected one.
+        return 0.5 + 0.5 * difflib.SequenceMatcher(None, output, expected_output.strip()).ratio()
+
+    def _run_candidate(self, candidate, code_language, code_input, script_run_ctx):
+        add_script_run_ctx(threading.current_thread(), script_run_ctx)
+        try:
+            # Every build gets its own directory in the compile cache, so compiled candidates run in parallel too.
+            candidate.output = self.general_utils.run_code(candidate.code, code_language, code_input)
+        except Exception as exception:
+            logger.error(f"Error running candidate {candidate.index}: {exception}")
+            candidate.output = f"Error: {exception}"
+        finally:
+            add_script_run_ctx(threading.current_thread(), None)
+        return candidate
+
+    def select(self, candidates, code_language, expected_output=None, code_input=None):
+        """
+        Execute the candidates in parallel on the same input and return the best CandidateResult, or None without candidates.
+        """
+        if not candidates:
+            return None
+
+        results = [CandidateResult(code=code, index=index) for index, code in enumerate(candidates)]
+        script_run_ctx = get_script_run_ctx()
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(results)), thread_name_prefix="best-of-n")
+        try:
+            futures = [executor.submit(self._run_candidate, result, code_language, code_input, script_run_ctx) for result in results]
+            for future in as_completed(futures):
+                result = future.result()
+                result.score = self._score(result, expected_output)
+                if expected_output and result.output is not None and result.output.strip() == expected_output.strip():
+                    result.matched = True
+                    result.score = 1.0
+                    logger.info(f"Candidate {result.index} matched the expected output.")
+                    return result
+        finally:
+            # The winner is returned without waiting for the slower candidates.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        best_result = max(results, key=lambda result: (result.score, -result.index))
+        logger.info(f"No candidate matched the expected output, best candidate {best_result.index} with score {best_result.score:.2f}")
+        return best_result
+
+    async def generate_best(self, provider, code_prompt, code_language, count, expected_output=None, execute=True, code_input=None):
+        """
+        Sample `count` candidates from the provider and select the best one.
+        Without execution the first candidate is returned.
+        """
+        candidates = await provider.generate_candidates(code_prompt, code_language, count)
+        logger.info(f"Generated {len(candidates)} candidates with {provider.provider_name}")
+        if not candidates:
+            return None
+        if not execute:
+            return CandidateResult(code=candidates[0])
+        return await get_generation_engine().submit(self.select, candidates, code_language, expected_output, code_input)
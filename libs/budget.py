@@ -0,0 +1,150 @@
+"""
+Pre-flight budget admission control.
+
+Before a request is dispatched its worst case cost is estimated from the prompt tokens plus the whole
+`max_tokens` completion budget, priced with the usage ledger price table. The estimate is checked against the
+session budget and the global daily budget, minus what the ledger already recorded and the worst case of the
+requests still in flight. A request which does not fit is either rejected with BudgetExceededError or, with the
+"downgrade" policy, transparently rerouted to the first cheaper model of the same provider family that fits.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from libs.logger import logger
+from libs.token_counter import count_tokens
+from libs.usage_meter import Usage, current_session_id, get_usage_ledger
+
+# Cheaper models to try, in order, when a model does not fit the budget.
+# Only the Open AI models have cheaper models in their family. The Gemini, Palm and Vertex AI models of the
+# price table all cost the same, so they are not covered and a request which does not fit is rejected.
+DOWNGRADE_CHAINS = {
+    "gpt-4-32k": ["gpt-4", "gpt-3.5-turbo-16k", "gpt-3.5-turbo"],
+    "gpt-4-32k-0613": ["gpt-4-0613", "gpt-3.5-turbo-16k-0613", "gpt-3.5-turbo-0613"],
+    "gpt-4": ["gpt-3.5-turbo-16k", "gpt-3.5-turbo"],
+    "gpt-4-0613": ["gpt-3.5-turbo-16k-0613", "gpt-3.5-turbo-0613"],
+    "gpt-3.5-turbo-16k": ["gpt-3.5-turbo"],
+    "gpt-3.5-turbo-16k-0613": ["gpt-3.5-turbo-0613"],
+    "text-davinci-003": ["gpt-3.5-turbo"],
+}
+
+class BudgetExceededError(Exception):
+    """The worst case cost of the request does not fit the remaining budget."""
+
+class BudgetController:
+    REJECT = "reject"
+    DOWNGRADE = "downgrade"
+
+    def __init__(self, session_budget=None, global_budget=None, policy=DOWNGRADE, usage_ledger=None):
+        self.session_budget = session_budget
+        self.global_budget = global_budget
+        self.policy = policy
+        self.usage_ledger = usage_ledger or get_usage_ledger()
+        self._session_budgets = {}
+        self._session_policies = {}
+        self._reserved = {}
+        self._lock = threading.Lock()
+        self.stats = {"admitted": 0, "downgraded": 0, "rejected": 0}
+
+    def configure_session(self, session_id, budget=None, policy=None):
+        """Override the session budget and policy, None falls back to the process defaults."""
+        with self._lock:
+            self._session_budgets[session_id] = budget
+            self._session_policies[session_id] = policy
+
+    def estimate_worst_case(self, model_name, prompt, max_tokens, completions=1):
+        prompt_tokens = count_tokens(prompt, model_name)
+        # Every completion of a multi candidate request may use the whole output limit.
+        max_tokens = (max_tokens or 0) * completions
+        # Character priced models are bounded with the usual four characters per token.
+        usage = Usage(prompt_tokens, max_tokens, len(prompt), max_tokens * 4, source="estimate")
+        return self.usage_ledger.price_table.cost(model_name, usage)
+
+    def remaining(self, session_id):
+        """Return the remaining (session, global) budget, None when the budget is unlimited."""
+        with self._lock:
+            session_budget = self._session_budgets.get(session_id)
+            if session_budget is None:
+                session_budget = self.session_budget
+            session_reserved = sum(amount for (reserved_session, _), amount in self._reserved.items() if reserved_session == session_id)
+            global_reserved = sum(self._reserved.values())
+        session_remaining = None
+        if session_budget is not None:
+            session_remaining = session_budget - self.usage_ledger.total_cost(session_id=session_id) - session_reserved
+        global_remaining = None
+        if self.global_budget is not None:
+            global_remaining = self.global_budget - self.usage_ledger.total_cost(day=time.strftime("%Y-%m-%d", time.gmtime())) - global_reserved
+        return session_remaining, global_remaining
+
+    def _fits(self, cost, session_remaining, global_remaining):
+        return all(remaining is None or cost <= remaining for remaining in (session_remaining, global_remaining))
+
+    def _choose(self, provider, prompt, session_id, completions):
+        session_remaining, global_remaining = self.remaining(session_id)
+        if session_remaining is None and global_remaining is None:
+            return provider, 0.0
+
+        cost = self.estimate_worst_case(provider.model_name, prompt, provider.max_tokens, completions)
+        if self._fits(cost, session_remaining, global_remaining):
+            return provider, cost
+
+        with self._lock:
+            policy = self._session_policies.get(session_id) or self.policy
+        if policy == self.DOWNGRADE:
+            for model_name in DOWNGRADE_CHAINS.get(provider.model_name, []):
+                downgraded_cost = self.estimate_worst_case(model_name, prompt, provider.max_tokens, completions)
+                if not self._fits(downgraded_cost, session_remaining, global_remaining):
+                    continue
+                downgraded_provider = provider.with_model(model_name)
+                if downgraded_provider is not None:
+                    logger.warning(f"Worst case cost {cost:.4f} USD of {provider.model_name} exceeds the budget, downgrading to {model_name} ({downgraded_cost:.4f} USD)")
+                    return downgraded_provider, downgraded_cost
+
+        limits = ", ".join(f"{name} {remaining:.4f} USD" for name, remaining in (("session", session_remaining), ("global", global_remaining)) if remaining is not None)
+        raise BudgetExceededError(f"Worst case cost {cost:.4f} USD of {provider.model_name} exceeds the remaining budget ({limits}).")
+
+    @contextmanager
+    def admit(self, provider, prompt, completions=1):
+        """
+        Admit a request for `completions` completions and yield the provider to send it to, the worst case cost is
+        reserved until the block exits.
+        """
+        session_id = current_session_id()
+        try:
+            admitted_provider, cost = self._choose(provider, prompt, session_id, completions)
+        except BudgetExceededError as exception:
+            with self._lock:
+                self.stats["rejected"] += 1
+            logger.error(str(exception))
+            raise
+
+        reservation = (session_id, object())
+        with self._lock:
+            self.stats["admitted"] += 1
+            if admitted_provider is not provider:
+                self.stats["downgraded"] += 1
+            self._reserved[reservation] = cost
+        try:
+            yield admitted_provider
+        finally:
+            with self._lock:
+                del self._reserved[reservation]
+
+_budget_controller = None
+_budget_controller_lock = threading.Lock()
+
+def _read_budget(name):
+    value = os.getenv(name)
+    return float(value) if value else None
+
+def get_budget_controller():
+    """Return the process wide budget controller, creating it on first use."""
+    global _budget_controller
+    with _budget_controller_lock:
+        if _budget_controller is None:
+            _budget_controller = BudgetController(
+                session_budget=_read_budget("SESSION_BUDGET_USD"),
+                global_budget=_read_budget("GLOBAL_DAILY_BUDGET_USD"),
+                policy=os.getenv("BUDGET_POLICY", BudgetController.DOWNGRADE),
+            )
+        return _budget_controller
@@ -0,0 +1,253 @@
+"""
+Chunked map-reduce pipeline for fixing and converting large source files.
+
+A source file larger than one chunk is split at its top level function and class boundaries, the leading
+imports stay with the first chunk. Each chunk is sent to the provider concurrently together with the shared
+context of the file (the imports and the signatures of every other chunk), so the model knows the names the
+chunk uses. The results are reassembled in the original order with their imports merged at the top, which
+makes the latency scale with the largest chunk instead of the whole file.
+A fix only sends the chunks holding the lines named by the error, the other chunks keep their code. A chunk which
+failed is retried once, a fix chunk which still fails keeps its original code so the chunks already paid for are
+not thrown away.
+Files which fit a single chunk, or have a single top level block, use the regular single prompt path.
+"""
+import os
+import re
+from dataclasses import dataclass
+from libs.generation_engine import get_generation_engine
+from libs.logger import logger
+from libs.response_cache import bypass_response_cache
+from libs.targeted_repair import find_error_lines
+from libs.token_counter import count_tokens
+
+IMPORT_PATTERN = re.compile(
+    r"^\s*(import\s|from\s+\S+\s+import\s|#include|#import|using\s|package\s|use\s|require[\s(]|extern\s+crate\s|library\(|.*=\s*require\()"
+)
+DEFINITION_PATTERN = re.compile(
+    r"^(async\s+def|def|class|function|func|fun|fn|struct|interface|enum|impl|trait|object|module|type|template|"
+    r"public|private|protected|internal|static|export|const|let|var|val|data)\b"
+)
+# C like function definitions starting at column zero, e.g. "int main(void) {" or "std::string name()".
+SIGNATURE_PATTERN = re.compile(r"^[A-Za-z_][\w\s\*&:<>,\[\]]*\([^;]*\)\s*(const\s*)?\{?\s*$")
+PREFIX_PATTERN = re.compile(r"^(@|#\[|//|#(?!include|import)|/\*|\*|--|;)")
+DOCSTRING_PATTERN = re.compile(r"^[rRuU]?(\"\"\"|\'\'\')")
+# Tasks whose chunks may be left as they are, a half converted program is of no use.
+KEEP_ORIGINAL_TASKS = {"fix_chunk"}
+# A failed chunk is sent once more before the run gives up on it.
+MAX_CHUNK_ATTEMPTS = 2
+
+@dataclass
+class SourceChunk:
+    index: int
+    code: str
+    signatures: tuple
+    # First and last line of the chunk in the source, 1 based.
+    start_line: int = 1
+    end_line: int = 1
+
+def _is_boundary(line):
+    if not line or line[0].isspace():
+        return False
+    return bool(DEFINITION_PATTERN.match(line) or SIGNATURE_PATTERN.match(line))
+
+def _docstring_end(lines, index):
+    """Index of the line after the docstring starting at lines[index], None when no docstring starts there."""
+    match = DOCSTRING_PATTERN.match(lines[index])
+    if not match:
+        return None
+    quote = match.group(1)
+    if quote in lines[index][match.end():]:
+        return index + 1
+    for end in range(index + 1, len(lines)):
+        if quote in lines[end]:
+            return end + 1
+    return len(lines)
+
+def _header_end(lines):
+    """Index of the line after the module docstring and the comments above it, 0 without a docstring."""
+    for index, line in enumerate(lines):
+        docstring_end = _docstring_end(lines, index)
+        if docstring_end is not None:
+            return docstring_end
+        if line.strip() and not PREFIX_PATTERN.match(line.strip()):
+            break
+    return 0
+
+def _block_ranges(lines):
+    """Return the end of the import preamble and the (start, end) line ranges of the top level blocks."""
+    preamble_end = 0
+    # The module docstring comes before the imports, it belongs to the preamble when imports follow it.
+    index = _header_end(lines)
+    while index < len(lines):
+        line = lines[index]
+        if IMPORT_PATTERN.match(line):
+            preamble_end = index + 1
+        elif line.strip() and not PREFIX_PATTERN.match(line.strip()):
+            break
+        index += 1
+
+    starts = []
+    for index in range(preamble_end, len(lines)):
+        if not _is_boundary(lines[index]):
+            continue
+        start = index
+        while start - 1 >= preamble_end and lines[start - 1].strip() and PREFIX_PATTERN.match(lines[start - 1]) and not lines[start - 1][0].isspace():
+            start -= 1
+        if not starts or start > starts[-1]:
+            starts.append(start)
+
+    if not starts:
+        return preamble_end, [(preamble_end, len(lines))]
+    ranges = []
+    if "\n".join(lines[preamble_end:starts[0]]).strip():
+        ranges.append((preamble_end, starts[0]))
+    for position, start in enumerate(starts):
+        end = starts[position + 1] if position + 1 < len(starts) else len(lines)
+        ranges.append((start, end))
+    return preamble_end, ranges
+
+def split_blocks(code):
+    """
+    Split the source into its import preamble and its top level blocks, each block starts at a definition
+    and carries the decorators and comments right above it.
+    """
+    lines = code.splitlines()
+    preamble_end, ranges = _block_ranges(lines)
+    return "\n".join(lines[:preamble_end]), ["\n".join(lines[start:end]) for start, end in ranges]
+
+def _signature(block):
+    for line in block.splitlines():
+        if _is_boundary(line):
+            return line.rstrip(" {")
+    return None
+
+def split_source(code, max_chunk_tokens, model_name=None):
+    """Group the top level blocks into chunks of at most `max_chunk_tokens`, a larger block is a chunk of its own."""
+    lines = code.splitlines()
+    preamble_end, ranges = _block_ranges(lines)
+    preamble = "\n".join(lines[:preamble_end])
+    # Each chunk is a list of (text, start, end) parts.
+    chunks, current, current_tokens = [], [], count_tokens(preamble, model_name)
+    if preamble:
+        current.append((preamble, 0, preamble_end))
+    for start, end in ranges:
+        block = "\n".join(lines[start:end])
+        block_tokens = count_tokens(block, model_name)
+        # The imports always stay with the first block.
+        if current and current != [(preamble, 0, preamble_end)] and current_tokens + block_tokens > max_chunk_tokens:
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append((block, start, end))
+        current_tokens += block_tokens
+    if current:
+        chunks.append(current)
+    return preamble, [
+        SourceChunk(
+            index,
+            "\n\n".join(text.strip("\n") for text, _, _ in parts),
+            tuple(filter(None, (_signature(text) for text, _, _ in parts))),
+            start_line=parts[0][1] + 1,
+            end_line=parts[-1][2],
+        )
+        for index, parts in enumerate(chunks)
+    ]
+
+def chunks_touched(chunks, diagnostics, line_count):
+    """Return the chunks holding a line named by the diagnostics, all of them when it names none."""
+    error_lines = find_error_lines(diagnostics, line_count)
+    touched = [chunk for chunk in chunks if any(chunk.start_line <= line <= chunk.end_line for line in error_lines)]
+    return touched or chunks
+
+def merge_chunks(outputs):
+    """
+    Reassemble the chunk outputs in order, their leading imports are merged and deduplicated at the top, below
+    the module docstring of the first chunk.
+    """
+    header, imports, bodies = "", [], []
+    for number, output in enumerate(outputs):
+        lines = output.strip("\n").splitlines()
+        position = 0
+        if number == 0:
+            position = _header_end(lines)
+            header = "\n".join(lines[:position]).rstrip()
+        while position < len(lines) and (IMPORT_PATTERN.match(lines[position]) or not lines[position].strip()):
+            line = lines[position].rstrip()
+            if line and line not in imports:
+                imports.append(line)
+            position += 1
+        bodies.append("\n".join(lines[position:]).rstrip())
+    sections = ([header] if header else []) + (["\n".join(imports)] if imports else []) + [body for body in bodies if body]
+    return "\n\n".join(sections) + "\n"
+
+class ChunkedPipeline:
+    def __init__(self, provider, max_chunk_tokens=None, render=None):
+        self.provider = provider
+        # Renders the prompt of a chunk, the session bound provider.render_prompt by default.
+        self.render = render or provider.render_prompt
+        max_chunk_tokens = max_chunk_tokens or int(os.getenv("CHUNK_MAX_TOKENS", 1200))
+        # The output of a chunk is about as long as the chunk, so it has to fit the completion budget too.
+        if provider.max_tokens:
+            max_chunk_tokens = min(max_chunk_tokens, max(200, provider.max_tokens // 2))
+        self.max_chunk_tokens = max_chunk_tokens
+
+    def plan(self, code):
+        """Return the chunks of the code, None when the code should be sent in a single prompt."""
+        if not code or count_tokens(code, self.provider.model_name) <= self.max_chunk_tokens:
+            return None
+        preamble, chunks = split_source(code, self.max_chunk_tokens, self.provider.model_name)
+        if len(chunks) < 2:
+            logger.info("Source has a single top level block, sending it in one prompt.")
+            return None
+        return preamble, chunks
+
+    def _context(self, preamble, chunks, chunk):
+        signatures = [signature for other in chunks if other.index != chunk.index for signature in other.signatures]
+        return "\n".join(filter(None, [preamble, *signatures])) or "None"
+
+    async def _map_chunk(self, task_type, code_language, preamble, chunks, chunk, values, attempt=0):
+        engine = get_generation_engine()
+        rendered = await engine.submit(
+            self.render, task_type, code_language, code=chunk.code, context=self._context(preamble, chunks, chunk),
+            chunk_number=chunk.index + 1, chunk_count=len(chunks), **values,
+        )
+        # A retry must not be answered with the cached completion which had no code.
+        with bypass_response_cache(attempt > 0):
+            completion = await self.provider.acomplete(rendered.text)
+        extracted_code = self.provider.utils.extract_code(completion, code_language) if completion else None
+        if not extracted_code:
+            raise ValueError(f"Chunk {chunk.index + 1} of {len(chunks)} returned no code.")
+        return extracted_code
+
+    async def run(self, task_type, code, code_language, **values):
+        """
+        Map the `task_type` chunk prompt ("fix_chunk" or "convert_chunk") over the chunks of the code and return
+        the reassembled code, None when the code is not chunked or a convert chunk failed.
+        A fix is only sent for the chunks touched by the `error` value, the other chunks keep their code.
+        """
+        plan = self.plan(code)
+        if plan is None:
+            return None
+        preamble, chunks = plan
+        keep_original = task_type in KEEP_ORIGINAL_TASKS
+        pending = chunks_touched(chunks, values.get("error"), len(code.splitlines())) if keep_original else chunks
+        logger.info(f"Running {task_type} over {len(pending)} of {len(chunks)} chunks of at most {self.max_chunk_tokens} tokens")
+        outputs = {chunk.index: chunk.code for chunk in chunks}
+        for attempt in range(MAX_CHUNK_ATTEMPTS):
+            results = await get_generation_engine().gather(
+                *[self._map_chunk(task_type, code_language, preamble, chunks, chunk, values, attempt) for chunk in pending], return_exceptions=True
+            )
+            failed = []
+            for chunk, result in zip(pending, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Error in chunked {task_type} of chunk {chunk.index + 1} (attempt {attempt + 1}): {result}")
+                    failed.append(chunk)
+                else:
+                    outputs[chunk.index] = result
+            pending = failed
+            if not pending:
+                break
+        if pending:
+            if not keep_original:
+                return None
+            logger.warning(f"Keeping the original code of chunks {', '.join(str(chunk.index + 1) for chunk in pending)}")
+        return merge_chunks([outputs[chunk.index] for chunk in chunks])
@@ -0,0 +1,83 @@
+"""
+Process wide registry of provider clients.
+
+Streamlit reruns the whole script on every widget change, so the provider classes used to be rebuilt
+(LLM client, prompt templates, chains, SDK configuration) on every slider drag. The registry hands out
+warm clients keyed by provider, model, temperature, max tokens and a fingerprint of the credentials,
+so the SDK objects and their pooled HTTP connections are reused across reruns and sessions.
+Clients which were not used for `idle_timeout` seconds are evicted.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from libs.logger import logger
+
+class ClientRegistry:
+    def __init__(self, idle_timeout=1800, max_clients=32):
+        self.idle_timeout = idle_timeout
+        self.max_clients = max_clients
+        self._clients = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def fingerprint(credentials):
+        """Hash the credentials so the raw secrets are never kept in the registry keys."""
+        if not credentials:
+            return "environment"
+        payload = json.dumps(credentials, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def get_client(self, provider_name, factory, model=None, temperature=None, max_tokens=None, credentials=None):
+        """
+        Return the registered client for the given settings, calling factory() to build it on a miss.
+        """
+        key = (provider_name, model, temperature, max_tokens, self.fingerprint(credentials))
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._clients.get(key)
+            if entry is not None:
+                entry["last_used"] = now
+                self.stats["hits"] += 1
+                return entry["client"]
+
+            logger.info(f"Creating {provider_name} client for model {model}, temperature {temperature}, max tokens {max_tokens}")
+            client = factory()
+            self._clients[key] = {"client": client, "last_used": now}
+            self.stats["misses"] += 1
+            self._evict_overflow()
+            return client
+
+    def _evict_idle(self, now):
+        idle_keys = [key for key, entry in self._clients.items() if now - entry["last_used"] > self.idle_timeout]
+        for key in idle_keys:
+            logger.info(f"Evicting idle {key[0]} client for model {key[1]}")
+            del self._clients[key]
+            self.stats["evictions"] += 1
+
+    def _evict_overflow(self):
+        while len(self._clients) > self.max_clients:
+            oldest_key = min(self._clients, key=lambda key: self._clients[key]["last_used"])
+            del self._clients[oldest_key]
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+    def __len__(self):
+        return len(self._clients)
+
+_client_registry = None
+_client_registry_lock = threading.Lock()
+
+def get_client_registry():
+    """Return the process wide client registry, creating it on first use."""
+    global _client_registry
+    with _client_registry_lock:
+        if _client_registry is None:
+            _client_registry = ClientRegistry(idle_timeout=int(os.getenv("CLIENT_IDLE_TIMEOUT", 1800)))
+        return _client_registry
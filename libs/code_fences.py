@@ -0,0 +1,163 @@
+"""
+Single pass parser for fenced code blocks.
+
+Every provider answers with markdown in which the code sits in one or more ``` fences, often with prose or a
+second block (example output, a shell command) around it. The parser walks the text once, jumping from one ```
+to the next, and returns every block with its language tag, so the caller can pick the block written in the
+requested language instead of whatever comes first. It also accepts the text in chunks as it streams in: only
+the unfinished last line is kept between chunks, so the work stays linear in the size of the response. A fence which is still open
+when the text ends gives an unterminated block, which is what a truncated or still streaming answer looks like.
+"""
+from dataclasses import dataclass
+
+FENCE = "```"
+
+# Language tags models use for the languages of the app, all lower case.
+LANGUAGE_TAGS = {
+    "python": ("python", "python3", "py"),
+    "javascript": ("javascript", "js", "node", "nodejs"),
+    "ruby": ("ruby", "rb"),
+    "swift": ("swift",),
+    "scala": ("scala",),
+    "kotlin": ("kotlin", "kt"),
+    "java": ("java",),
+    "c": ("c", "h"),
+    "c++": ("c++", "cpp", "cxx", "cc", "hpp"),
+    "c#": ("c#", "csharp", "cs"),
+    "go lang": ("go", "golang"),
+}
+
+@dataclass
+class CodeBlock:
+    language: str
+    code: str
+    closed: bool = True
+
+def _fence_of(line):
+    """Return (fence length, info string) when the line opens or closes a fence, else None."""
+    stripped = line.lstrip(" ")
+    if len(line) - len(stripped) > 3 or not stripped.startswith(FENCE):
+        return None
+    length = len(stripped) - len(stripped.lstrip("`"))
+    return length, stripped[length:].strip()
+
+def _without_last_newline(code):
+    if code.endswith("\r\n"):
+        return code[:-2]
+    return code[:-1] if code.endswith("\n") else code
+
+class FenceParser:
+    """Incremental parser, feed it the text in any number of chunks and call close() at the end."""
+
+    def __init__(self):
+        self.blocks = []
+        self._pending = []
+        self._fence_length = 0
+        self._language = None
+        self._code_parts = []
+
+    @property
+    def in_block(self):
+        return self._fence_length > 0
+
+    def feed(self, chunk):
+        """Parse a chunk of the text, return the blocks it completed."""
+        completed = len(self.blocks)
+        newline = chunk.rfind("\n")
+        if newline == -1:
+            # No complete line yet, a fence may still be split across chunks.
+            self._pending.append(chunk)
+            return []
+        text = "".join(self._pending) + chunk[:newline + 1] if self._pending else chunk[:newline + 1]
+        self._pending = [chunk[newline + 1:]] if newline + 1 < len(chunk) else []
+        self._scan(text)
+        return self.blocks[completed:]
+
+    def _scan(self, text):
+        """Parse complete lines, jumping from one ``` to the next instead of visiting every line."""
+        position = code_start = 0
+        while True:
+            fence_position = text.find(FENCE, position)
+            if fence_position == -1:
+                break
+            line_start = text.rfind("\n", 0, fence_position) + 1
+            line_end = text.find("\n", fence_position)
+            fence = _fence_of(text[line_start:line_end])
+            position = line_end + 1
+            if fence is None:
+                continue
+            length, info = fence
+            if not self.in_block:
+                if FENCE in info:
+                    # A one line block such as ```print("hi")```.
+                    self.blocks.append(CodeBlock("", info[:info.find(FENCE)].strip()))
+                    continue
+                self._fence_length, self._language, self._code_parts = length, self._tag_of(info), []
+                code_start = position
+            elif length >= self._fence_length and not info:
+                self._code_parts.append(text[code_start:line_start])
+                self.blocks.append(CodeBlock(self._language, _without_last_newline("".join(self._code_parts))))
+                self._fence_length, self._code_parts = 0, []
+        if self.in_block:
+            self._code_parts.append(text[code_start:])
+
+    @staticmethod
+    def _tag_of(info):
+        return info.split(maxsplit=1)[0].lower() if info else ""
+
+    def partial_block(self):
+        """The block which is still open, with the text received so far, or None."""
+        if not self.in_block:
+            return None
+        code = "".join(self._code_parts) + "".join(self._pending)
+        return CodeBlock(self._language, code if self._pending else _without_last_newline(code), closed=False)
+
+    def current_code(self, code_language=None):
+        """The code of the best block received so far, counting the open one, None before the first fence."""
+        partial = self.partial_block()
+        block = select_code_block(self.blocks + [partial] if partial else self.blocks, code_language)
+        return block.code if block else None
+
+    def close(self):
+        """End of the text, an open fence becomes an unterminated block. Returns all blocks."""
+        if self._pending:
+            # The last line has no newline, a closing fence there still closes the block.
+            text = "".join(self._pending) + "\n"
+            self._pending = []
+            self._scan(text)
+        block = self.partial_block()
+        if block:
+            self.blocks.append(block)
+            self._fence_length, self._code_parts = 0, []
+        return self.blocks
+
+def parse_code_blocks(text):
+    """Return all fenced code blocks of the text."""
+    parser = FenceParser()
+    parser.feed(text)
+    return parser.close()
+
+def matches_language(tag, code_language):
+    if not tag or not code_language:
+        return False
+    language = code_language.lower()
+    return tag == language or tag in LANGUAGE_TAGS.get(language, ())
+
+def select_code_block(blocks, code_language=None):
+    """
+    Pick the block to use: the first closed block tagged with the requested language, then an unterminated one,
+    then the first block of all.
+    """
+    if not blocks:
+        return None
+    matching = [block for block in blocks if matches_language(block.language, code_language)]
+    if matching:
+        return next((block for block in matching if block.closed), matching[0])
+    return blocks[0]
+
+def extract_code(text, code_language=None):
+    """Return the code of the best block of the text, the text itself when it has no fences."""
+    if FENCE not in text:
+        return text
+    block = select_code_block(parse_code_blocks(text), code_language)
+    return block.code if block else text
@@ -21,6 +21,7 @@ Date : 01-01-2024
 import requests
 import json
 from libs.logger import logger
+from libs.resilience import RETRYABLE_STATUS_CODES, RetryableError, get_resilience_manager
 
 lang_codes = {
   'c': 'c',
@@ -44,6 +45,8 @@ lang_codes = {
 class CodeRunner:
     # Code Runner Server URL.
     server_url = 'https://code-runner-plugin.vercel.app'
+    # Seconds to wait for the Code Runner API before the request is retried.
+    timeout = 60
 
     def __init__(self):
         self.logger = logger
@@ -76,7 +79,12 @@ class CodeRunner:
             data = {"code": code, "language": language,"input" : code_input,"compileOnly" : compile_only}
 
             self.logger.info(f"Sending request to {self.server_url}/run_code and data is '{data}'")
-            response = requests.post(f"{self.server_url}/run_code", json=data)
+            try:
+                # Rate limits, timeouts and 5xx responses are retried, repeated failures open the circuit.
+                response = get_resilience_manager().call("code-runner", self._post_run_code, data)
+            except RetryableError as retryable_error:
+                self.logger.error(f"Request to {self.server_url}/run_code failed: {retryable_error}")
+                return None
 
             if response.status_code != 200:
                 self.logger.error(f"Request to {self.server_url}/run_code failed with status code {response.status_code}")
@@ -101,6 +109,12 @@ class CodeRunner:
             self.logger.error(f"An unexpected error occurred: {general_exception}")
             raise
 
+    def _post_run_code(self, data):
+        response = requests.post(f"{self.server_url}/run_code", json=data, timeout=self.timeout)
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            raise RetryableError(f"Code Runner API returned status code {response.status_code}", retry_after=response.headers.get("Retry-After"), status_code=response.status_code)
+        return response
+
     def save_code(self, filename, code):
         try:
             data = {"filename": filename, "code": code}
@@ -0,0 +1,308 @@
+"""
+Asyncio HTTP service for generation and execution.
+
+A small HTTP/1.1 server on asyncio streams, no web framework needed, exposing the core API to IDE plugins and CI:
+
+    POST /v1/generate  {"code_prompt", "code_language", "provider", "model", "coding_guidelines", "code_input"}
+    POST /v1/fix       {"code", "code_language", "error", "fix_instructions", ...}
+    POST /v1/convert   {"code", "code_language", ...}
+    POST /v1/complete  {"prompt", "provider", "model"}
+    POST /v1/execute   {"code", "code_language", "code_input", "expected_output"}
+    GET  /health and GET /v1/stats
+
+Provider calls run on the shared generation engine, the service loop only does the network IO. Executions run on a
+bounded worker pool and are only enabled when the operator allows them. Every request has a timeout (the
+"timeout" field, capped by the service) after which it is cancelled and answered with 504, a program run by
+/v1/execute only gets the time left until then once a worker picks it up and is killed right after the request
+timed out. Generate and complete accept "stream": true and answer with chunked newline delimited JSON, one {"chunk"}
+line per piece of the completion and a final {"code"} or {"completion"} line. The "mock" provider is a local
+stand-in backend, so the service runs fully offline.
+"""
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, replace
+from libs.core_api import (ConvertRequest, ExecuteRequest, FixRequest, GenerateRequest, GenerationSettings, aconvert, afix, agenerate,
+                           execute, get_provider, provider_config_from_env)
+from libs.generation_engine import get_generation_engine
+from libs.logger import logger
+
+# Time a program gets past the request timeout, so the request always times out first and is answered with 504.
+EXECUTION_GRACE_SECONDS = 0.5
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error", 504: "Gateway Timeout"}
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def _require(payload, *names):
+    missing = [name for name in names if not payload.get(name)]
+    if missing:
+        raise HTTPError(400, f"Missing fields: {', '.join(missing)}")
+
+def _settings(payload):
+    return GenerationSettings(payload.get("coding_guidelines") or {}, payload.get("code_input"))
+
+class CoderService:
+    def __init__(self, host="127.0.0.1", port=8765, execution_workers=4, request_timeout=120, max_timeout=600,
+                 default_provider="mock", allow_execution=False, max_body_size=1024 * 1024):
+        self.host = host
+        self.port = port
+        self.request_timeout = request_timeout
+        self.max_timeout = max_timeout
+        self.default_provider = default_provider
+        self.allow_execution = allow_execution
+        self.max_body_size = max_body_size
+        self._execution_pool = ThreadPoolExecutor(max_workers=execution_workers, thread_name_prefix="execution-worker")
+        self._server = None
+        self.stats = {"requests": 0, "errors": 0, "timeouts": 0, "executions": 0}
+        self._routes = {
+            "/health": ("GET", self._health),
+            "/v1/stats": ("GET", self._stats),
+            "/v1/generate": ("POST", self._generate),
+            "/v1/fix": ("POST", self._fix),
+            "/v1/convert": ("POST", self._convert),
+            "/v1/complete": ("POST", self._complete),
+            "/v1/execute": ("POST", self._execute),
+        }
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Coder service listening on http://{self.host}:{self.port}")
+        return self
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._execution_pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _read_request(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            raise HTTPError(400, "Empty request.")
+        try:
+            method, target, _ = request_line.split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line.")
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        content_length = int(headers.get("content-length") or 0)
+        if content_length > self.max_body_size:
+            raise HTTPError(413, f"Request body exceeds {self.max_body_size} bytes.")
+        body = await reader.readexactly(content_length) if content_length else b""
+        return method.upper(), target.split("?", 1)[0], body
+
+    async def _handle_connection(self, reader, writer):
+        started = time.perf_counter()
+        status, path = 500, "?"
+        try:
+            method, path, body = await asyncio.wait_for(self._read_request(reader), 30)
+            self.stats["requests"] += 1
+            route = self._routes.get(path)
+            if route is None:
+                raise HTTPError(404, f"No route {path}.")
+            route_method, handler = route
+            if method != route_method:
+                raise HTTPError(405, f"{path} expects {route_method}.")
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                raise HTTPError(400, "Request body is not valid JSON.")
+            if not isinstance(payload, dict):
+                raise HTTPError(400, "Request body must be a JSON object.")
+            timeout = self._timeout(payload)
+
+            if payload.get("stream") and path in ("/v1/generate", "/v1/complete"):
+                status = 200
+                await self._stream(writer, payload, path, timeout)
+            else:
+                response = await asyncio.wait_for(handler(payload), timeout)
+                status = 200
+                await self._send_json(writer, status, response)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            status = 504
+            await self._send_json(writer, status, {"error": "Request timed out."})
+        except HTTPError as exception:
+            self.stats["errors"] += 1
+            status = exception.status
+            await self._send_json(writer, status, {"error": exception.message})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            logger.warning(f"Client disconnected during {path}")
+        except Exception as exception:
+            self.stats["errors"] += 1
+            logger.error(f"Error handling {path}: {exception}")
+            await self._send_json(writer, 500, {"error": str(exception)})
+        finally:
+            logger.info(f"{path} answered {status} in {time.perf_counter() - started:.3f}s")
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _send_head(self, writer, status, headers):
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'Unknown')}", "Connection: close", *[f"{name}: {value}" for name, value in headers.items()]]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+
+    async def _send_json(self, writer, status, payload):
+        try:
+            body = json.dumps(payload).encode("utf-8")
+            await self._send_head(writer, status, {"Content-Type": "application/json", "Content-Length": len(body)})
+            writer.write(body)
+            await writer.drain()
+        except ConnectionError:
+            logger.warning("Client disconnected before the response was sent.")
+
+    async def _send_chunk(self, writer, payload):
+        data = (json.dumps(payload) + "\n").encode("utf-8")
+        writer.write(f"{len(data):X}\r\n".encode("latin-1") + data + b"\r\n")
+        await writer.drain()
+
+    async def _on_engine(self, coroutine):
+        """Run a provider coroutine on the generation engine loop, cancelling it when the request is cancelled."""
+        return await asyncio.wrap_future(get_generation_engine().schedule(coroutine))
+
+    async def _provider(self, payload):
+        config = provider_config_from_env(payload.get("provider") or self.default_provider, payload.get("model"))
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, get_provider, config)
+        except (KeyError, ValueError) as exception:
+            raise HTTPError(400, str(exception))
+
+    def _timeout(self, payload):
+        return min(float(payload.get("timeout") or self.request_timeout), self.max_timeout)
+
+    async def _health(self, payload):
+        return {"status": "ok"}
+
+    async def _stats(self, payload):
+        return {**self.stats, "allow_execution": self.allow_execution}
+
+    async def _generate(self, payload):
+        _require(payload, "code_prompt", "code_language")
+        provider = await self._provider(payload)
+        request = GenerateRequest(payload["code_prompt"], payload["code_language"], _settings(payload))
+        return asdict(await self._on_engine(agenerate(provider, request)))
+
+    async def _fix(self, payload):
+        _require(payload, "code", "code_language", "error")
+        provider = await self._provider(payload)
+        request = FixRequest(payload["code"], payload["code_language"], payload["error"], payload.get("fix_instructions") or "",
+                             payload.get("history"), _settings(payload))
+        return asdict(await self._on_engine(afix(provider, request)))
+
+    async def _convert(self, payload):
+        _require(payload, "code", "code_language")
+        provider = await self._provider(payload)
+        request = ConvertRequest(payload["code"], payload["code_language"], payload.get("history"), _settings(payload))
+        return asdict(await self._on_engine(aconvert(provider, request)))
+
+    async def _complete(self, payload):
+        _require(payload, "prompt")
+        provider = await self._provider(payload)
+        completion = await self._on_engine(provider.acomplete(payload["prompt"]))
+        return {"completion": completion, "provider_name": provider.provider_name, "model_name": provider.model_name}
+
+    async def _execute(self, payload):
+        if not self.allow_execution:
+            raise HTTPError(403, "Code execution is disabled on this service.")
+        _require(payload, "code", "code_language")
+        request = ExecuteRequest(payload["code"], payload["code_language"], payload.get("code_input"), payload.get("expected_output"))
+        deadline = time.monotonic() + self._timeout(payload)
+
+        def run():
+            # The job may have waited for a free worker, the program only gets the time left until the request times
+            # out. Cancelling the future alone would leave a running program running.
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            self.stats["executions"] += 1
+            return execute(replace(request, timeout=remaining + EXECUTION_GRACE_SECONDS))
+
+        result = await asyncio.get_running_loop().run_in_executor(self._execution_pool, run)
+        if result is None:
+            raise asyncio.TimeoutError
+        return asdict(result)
+
+    async def _stream(self, writer, payload, path, timeout):
+        """Stream the completion as chunked newline delimited JSON while it is generated."""
+        if path == "/v1/generate":
+            _require(payload, "code_prompt", "code_language")
+        else:
+            _require(payload, "prompt")
+        provider = await self._provider(payload)
+
+        def prepare():
+            if path == "/v1/generate":
+                settings = _settings(payload)
+                prompt = provider.render_generate_prompt(payload["code_prompt"], payload["code_language"], settings.coding_guidelines, settings.code_input)
+                return prompt, provider.generate_options()
+            return payload["prompt"], {}
+
+        # Rendering the prompt and the provider stream run on the generation engine like every other provider call.
+        engine = get_generation_engine()
+        prompt, options = await self._on_engine(engine.submit(prepare))
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        cancelled = threading.Event()
+        done = object()
+
+        def produce():
+            try:
+                for chunk in provider.stream_complete(prompt, **options):
+                    if cancelled.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk)
+            except Exception as exception:
+                loop.call_soon_threadsafe(queue.put_nowait, exception)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        await self._send_head(writer, 200, {"Content-Type": "application/x-ndjson", "Transfer-Encoding": "chunked"})
+        producer = asyncio.ensure_future(self._on_engine(engine.submit(produce)))
+        completion, deadline = "", loop.time() + timeout
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    self.stats["timeouts"] += 1
+                    await self._send_chunk(writer, {"error": "Request timed out."})
+                    break
+                if item is done:
+                    final = {"completion": completion}
+                    if path == "/v1/generate":
+                        final = {"code": provider.utils.extract_code(completion, payload["code_language"]) if completion else None}
+                    await self._send_chunk(writer, final)
+                    break
+                if isinstance(item, Exception):
+                    self.stats["errors"] += 1
+                    await self._send_chunk(writer, {"error": str(item)})
+                    break
+                completion += item
+                await self._send_chunk(writer, {"chunk": item})
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            cancelled.set()
+            if producer.done():
+                await producer
@@ -0,0 +1,220 @@
+"""
+Content addressed compilation cache.
+
+Compiled languages used to be rebuilt from scratch into temp files on every run, although the same program is
+usually run again and again with different input. Builds are keyed by a hash of the source, the compiler path and
+version and the full build command with its flags, and the artifacts (executable, class files, jar) are kept in
+their own directory under cache/compiled. A hit skips the compiler and goes straight to execution. The directory
+is bounded by COMPILE_CACHE_MAX_MB and the least recently used builds are evicted, the last use survives a restart
+as the modification time of the build directory. A build is only evicted once no program runs from it anymore.
+Failed builds are not cached, their diagnostics are returned.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from libs.logger import logger
+from libs.toolchain_registry import get_toolchain_registry
+
+JAVA_CLASS_PATTERN = re.compile(r"public\s+(?:final\s+|abstract\s+)*class\s+(\w+)")
+
+def _java_class(code):
+    match = JAVA_CLASS_PATTERN.search(code)
+    return match.group(1) if match else "Main"
+
+# How every compiled language is built into a build directory and run from it: (toolchain of the compiler, source
+# file name, build command, run command), the build command gets the source path and the build directory.
+BUILDS = {
+    "C": ("c", lambda code: "main.c",
+          lambda source, directory: ["gcc", "-std=c11", "-o", os.path.join(directory, "main"), source],
+          lambda code, directory: [os.path.join(directory, "main")]),
+    "C++": ("cpp", lambda code: "main.cpp",
+            lambda source, directory: ["g++", "-std=c++17", "-o", os.path.join(directory, "main"), source],
+            lambda code, directory: [os.path.join(directory, "main")]),
+    "Java": ("javac", lambda code: f"{_java_class(code)}.java",
+             lambda source, directory: ["javac", "-d", directory, source],
+             lambda code, directory: ["java", "-cp", directory, _java_class(code)]),
+    "Kotlin": ("kotlin", lambda code: "main.kt",
+               lambda source, directory: ["kotlinc", source, "-include-runtime", "-d", os.path.join(directory, "main.jar")],
+               lambda code, directory: ["java", "-jar", os.path.join(directory, "main.jar")]),
+    "C#": ("csharp", lambda code: "main.cs",
+           lambda source, directory: ["csc", f"-out:{os.path.join(directory, 'main.exe')}", source],
+           lambda code, directory: [os.path.join(directory, "main.exe")]),
+    "Go": ("go", lambda code: "main.go",
+           lambda source, directory: ["go", "build", "-o", os.path.join(directory, "main"), source],
+           lambda code, directory: [os.path.join(directory, "main")]),
+}
+BUILDS["GO Lang"] = BUILDS["Go"]
+COMPILED_LANGUAGES = frozenset(BUILDS)
+BUILD_TIMEOUT = 300
+
+def _directory_size(directory):
+    size = 0
+    for root, _, files in os.walk(directory):
+        for file_name in files:
+            try:
+                size += os.path.getsize(os.path.join(root, file_name))
+            except OSError:
+                pass
+    return size
+
+class CompileCache:
+    def __init__(self, directory="cache/compiled", max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Build key -> size in bytes, ordered from the least to the most recently used.
+        self._entries = OrderedDict()
+        # Build key -> number of programs running from its directory, those builds are not evicted.
+        self._running = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "build_seconds_saved": 0.0}
+        self._build_seconds = {}
+        self._load()
+
+    def _load(self):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            builds = [entry for entry in os.scandir(self.directory) if entry.is_dir() and not entry.name.startswith(".")]
+        except OSError as exception:
+            logger.error(f"Error opening compile cache {self.directory}: {exception}")
+            return
+        for entry in sorted(builds, key=lambda entry: entry.stat().st_mtime):
+            self._entries[entry.name] = _directory_size(entry.path)
+        logger.info(f"Compile cache opened at {self.directory} with {len(self._entries)} builds")
+
+    @staticmethod
+    def make_key(language, code, build_command, toolchain):
+        payload = json.dumps([language, code, build_command, toolchain.path, toolchain.version])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    @contextmanager
+    def build(self, language, code):
+        """
+        Yield (run command, None) for the built program, from the cache when it was built before, or (None,
+        diagnostics) when the compiler rejects it. The program is run inside the block, its build directory is
+        not evicted before the block exits.
+        """
+        key, result = self._build(language, code)
+        try:
+            yield result
+        finally:
+            if key is not None:
+                self._release(key)
+
+    def _acquire(self, key):
+        self._running[key] = self._running.get(key, 0) + 1
+
+    def _release(self, key):
+        with self._lock:
+            self._running[key] -= 1
+            if self._running[key] == 0:
+                del self._running[key]
+                # Evictions skipped while the program ran.
+                self._evict()
+
+    def _build(self, language, code):
+        """Return (key of the acquired build, result), the key is None when nothing was built."""
+        compiler, source_name, build_command, run_command = BUILDS[language]
+        # Keyed on the compiler which builds the program, not on the runtime which runs it.
+        toolchain = get_toolchain_registry().get(compiler)
+        # The paths are placeholders, so the key only depends on the source, the compiler and its flags.
+        key = self.make_key(language, code, build_command("SOURCE", "BUILD"), toolchain)
+        build_directory = self._path(key)
+
+        with self._lock:
+            if key in self._entries and os.path.isdir(build_directory):
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                self.stats["build_seconds_saved"] += self._build_seconds.get(key, 0.0)
+                try:
+                    os.utime(build_directory)
+                except OSError:
+                    pass
+                logger.info(f"Compile cache hit for {language} build {key[:12]}")
+                self._acquire(key)
+                return key, (run_command(code, build_directory), None)
+            self._entries.pop(key, None)
+            self.stats["misses"] += 1
+
+        # Build into a private directory and move it into place, so a concurrent run never sees half a build.
+        staging_directory = tempfile.mkdtemp(prefix=".build-", dir=self.directory)
+        try:
+            source_path = os.path.join(staging_directory, source_name(code))
+            with open(source_path, "w") as file:
+                file.write(code)
+            started = time.perf_counter()
+            compile_output = subprocess.run(build_command(source_path, staging_directory), capture_output=True, text=True, timeout=BUILD_TIMEOUT, cwd=staging_directory)
+            build_seconds = time.perf_counter() - started
+            if compile_output.returncode != 0:
+                return None, (None, (compile_output.stderr or compile_output.stdout).replace(staging_directory + os.sep, ""))
+            os.rename(staging_directory, build_directory)
+        except OSError as exception:
+            with self._lock:
+                if os.path.isdir(build_directory):
+                    # Another run built the same program first.
+                    self._acquire(key)
+                    return key, (run_command(code, build_directory), None)
+            logger.error(f"Error building {language} program: {exception}")
+            return None, (None, str(exception))
+        except subprocess.TimeoutExpired:
+            return None, (None, f"Error: compilation timed out after {BUILD_TIMEOUT} seconds.")
+        finally:
+            shutil.rmtree(staging_directory, ignore_errors=True)
+
+        logger.info(f"Compiled {language} build {key[:12]} in {build_seconds:.2f}s")
+        with self._lock:
+            self._entries[key] = _directory_size(build_directory)
+            self._build_seconds[key] = build_seconds
+            self._acquire(key)
+            self._evict()
+        return key, (run_command(code, build_directory), None)
+
+    def _evict(self):
+        total = sum(self._entries.values())
+        # The most recently used build is kept even when it alone exceeds the budget.
+        for key in list(self._entries)[:-1]:
+            if total <= self.max_bytes:
+                break
+            if key in self._running:
+                continue
+            total -= self._entries.pop(key)
+            self._build_seconds.pop(key, None)
+            shutil.rmtree(self._path(key), ignore_errors=True)
+            self.stats["evictions"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            hits, misses = self.stats["hits"], self.stats["misses"]
+            return {**self.stats, "builds": len(self._entries), "size_bytes": sum(self._entries.values()),
+                    "hit_rate": hits / (hits + misses) if hits + misses else 0.0}
+
+    def clear(self):
+        """Remove every build no program runs from."""
+        with self._lock:
+            for key in list(self._entries):
+                if key in self._running:
+                    continue
+                shutil.rmtree(self._path(key), ignore_errors=True)
+                del self._entries[key]
+                self._build_seconds.pop(key, None)
+
+_compile_cache = None
+_compile_cache_lock = threading.Lock()
+
+def get_compile_cache():
+    """Return the process wide compile cache, creating it on first use."""
+    global _compile_cache
+    with _compile_cache_lock:
+        if _compile_cache is None:
+            _compile_cache = CompileCache(max_bytes=int(float(os.getenv("COMPILE_CACHE_MAX_MB", 512)) * 1024 * 1024))
+        return _compile_cache
@@ -0,0 +1,141 @@
+"""
+Token budgeted conversation memory.
+
+Every session keeps a sliding window of its most recent turns plus a rolling summary of the older ones, and the
+context handed to the fix and convert prompts never exceeds a hard token budget. Turns leaving the window are
+folded into the summary off the request path: the summary prompt is scheduled on the generation engine and the
+memory carries on with the previous summary until it returns. Without a provider to summarize with the older
+turns are condensed to their first line, so the memory stays bounded either way.
+"""
+import os
+import threading
+from dataclasses import dataclass
+from libs.generation_engine import get_generation_engine
+from libs.logger import logger
+from libs.prompt_registry import get_prompt_registry
+from libs.token_counter import CHARACTERS_PER_TOKEN, count_tokens
+
+@dataclass
+class Turn:
+    role: str
+    content: str
+    tokens: int
+
+def _truncate(text, max_tokens):
+    """Cut the text to about `max_tokens`, keeping its beginning."""
+    max_characters = max_tokens * CHARACTERS_PER_TOKEN
+    return text if len(text) <= max_characters else text[:max_characters].rstrip() + " ..."
+
+class ConversationMemory:
+    def __init__(self, max_tokens=1500, window_turns=6, summary_tokens=None, model_name=None):
+        self.max_tokens = max_tokens
+        self.window_turns = window_turns
+        self.summary_tokens = summary_tokens or max_tokens // 3
+        self.model_name = model_name
+        self.summary = ""
+        self._turns = []
+        self._pending = []
+        self._summarizing = False
+        self._lock = threading.Lock()
+
+    def add_turn(self, role, content, summarizer=None):
+        """Append a turn, the turns leaving the window are summarized in the background with `summarizer`."""
+        if not content:
+            return
+        with self._lock:
+            self._turns.append(Turn(role, content, count_tokens(content, self.model_name)))
+            window_budget = self.max_tokens - self.summary_tokens
+            while len(self._turns) > 1 and (len(self._turns) > self.window_turns or sum(turn.tokens for turn in self._turns) > window_budget):
+                self._pending.append(self._turns.pop(0))
+            should_summarize = bool(self._pending) and not self._summarizing
+            if should_summarize:
+                self._summarizing = True
+        if should_summarize:
+            self._schedule_summary(summarizer)
+
+    def _schedule_summary(self, summarizer):
+        if summarizer is None:
+            self._fold_pending(None)
+            return
+        try:
+            get_generation_engine().schedule(self._summarize(summarizer))
+        except Exception as exception:
+            logger.error(f"Error scheduling the conversation summary: {exception}")
+            self._fold_pending(None)
+
+    async def _summarize(self, summarizer):
+        with self._lock:
+            turns = list(self._pending)
+            summary = self.summary
+        prompt = get_prompt_registry().render(
+            "summarize", "", summary=summary or "None", turns=self._format_turns(turns), summary_tokens=self.summary_tokens
+        ).text
+        new_summary = None
+        try:
+            new_summary = await summarizer.acomplete(prompt)
+        except Exception as exception:
+            logger.error(f"Error summarizing the conversation: {exception}")
+        self._fold_pending(new_summary, len(turns))
+
+    def _fold_pending(self, new_summary, count=None):
+        with self._lock:
+            turns = self._pending[:count] if count is not None else list(self._pending)
+            del self._pending[:len(turns)]
+            if not new_summary:
+                # Condense the turns to their first line when no summary could be generated.
+                condensed = [f"{turn.role}: {turn.content.strip().splitlines()[0]}" for turn in turns if turn.content.strip()]
+                new_summary = "\n".join(filter(None, [self.summary, *condensed]))
+            # Keep the latest part of the summary when it outgrows its budget.
+            max_characters = self.summary_tokens * CHARACTERS_PER_TOKEN
+            new_summary = new_summary.strip()
+            if len(new_summary) > max_characters:
+                new_summary = new_summary[-max_characters:].partition("\n")[2] or new_summary[-max_characters:]
+            self.summary = new_summary
+            self._summarizing = False
+            pending_left = bool(self._pending)
+        if pending_left:
+            self._fold_pending(None)
+
+    def _format_turns(self, turns):
+        return "\n\n".join(f"{turn.role}: {turn.content}" for turn in turns)
+
+    def context(self, max_tokens=None):
+        """Return the summary and the most recent turns that fit the token budget, newest turns first to be kept."""
+        max_tokens = max_tokens or self.max_tokens
+        with self._lock:
+            summary = self.summary
+            turns = list(self._turns)
+        sections, used_tokens = [], 0
+        if summary:
+            summary = _truncate(summary, self.summary_tokens)
+            sections.append(f"Summary of the earlier conversation:\n{summary}")
+            used_tokens += count_tokens(sections[0], self.model_name)
+        recent_turns = []
+        for turn in reversed(turns):
+            remaining_tokens = max_tokens - used_tokens
+            if remaining_tokens <= 0:
+                break
+            content = turn.content if turn.tokens <= remaining_tokens else _truncate(turn.content, remaining_tokens)
+            recent_turns.insert(0, f"{turn.role}: {content}")
+            used_tokens += min(turn.tokens, remaining_tokens)
+        if recent_turns:
+            sections.append("Recent turns:\n" + "\n\n".join(recent_turns))
+        return "\n\n".join(sections)
+
+    @property
+    def buffer(self):
+        return self.context()
+
+    def clear(self):
+        with self._lock:
+            self.summary = ""
+            self._turns.clear()
+            self._pending.clear()
+
+def create_memory(model_name=None):
+    """Create a conversation memory with the budget configured in the environment."""
+    return ConversationMemory(
+        max_tokens=int(os.getenv("MEMORY_MAX_TOKENS", 1500)),
+        window_turns=int(os.getenv("MEMORY_WINDOW_TURNS", 6)),
+        model_name=model_name,
+    )
@@ -0,0 +1,206 @@
+"""
+UI independent core API.
+
+Generation, fixing, conversion and execution take explicit request objects and return result objects, nothing
+here reads or writes the Streamlit session state. Requests, results and the ProviderConfig used to build a
+provider are plain dataclasses, so they can be pickled and the work can run on a background worker or in a
+process pool (see `process_request`). The Streamlit layer only builds the requests from its session state and
+shows the results.
+"""
+import os
+import threading
+from dataclasses import dataclass, field
+from libs.chunked_pipeline import ChunkedPipeline
+from libs.generation_engine import get_generation_engine
+from libs.logger import logger
+
+@dataclass(frozen=True)
+class ProviderConfig:
+    provider_name: str
+    model_name: str = None
+    temperature: float = None
+    max_tokens: int = None
+    api_key: str = None
+    proxy_api: str = ""
+    project: str = ""
+    location: str = "us-central1"
+    credentials_file_path: str = None
+
+@dataclass
+class GenerationSettings:
+    coding_guidelines: dict = field(default_factory=dict)
+    code_input: str = None
+
+@dataclass
+class GenerateRequest:
+    code_prompt: str
+    code_language: str
+    settings: GenerationSettings = field(default_factory=GenerationSettings)
+
+@dataclass
+class FixRequest:
+    code: str
+    code_language: str
+    error: str = None
+    fix_instructions: str = ""
+    history: str = None
+    settings: GenerationSettings = field(default_factory=GenerationSettings)
+
+@dataclass
+class ConvertRequest:
+    code: str
+    code_language: str
+    history: str = None
+    settings: GenerationSettings = field(default_factory=GenerationSettings)
+
+@dataclass
+class ExecuteRequest:
+    code: str
+    code_language: str
+    code_input: str = None
+    expected_output: str = None
+    compiler_mode: str = "offline"
+    # Seconds after which the program is killed, None runs it without a limit.
+    timeout: float = None
+
+@dataclass
+class GenerationResult:
+    code: str = None
+    provider_name: str = None
+    model_name: str = None
+    error: str = None
+
+@dataclass
+class ExecutionResult:
+    output: str = None
+    failed: bool = False
+    matched: bool = None
+
+def provider_config_from_env(provider_name, model_name=None, max_tokens=2048):
+    """Build the ProviderConfig of a provider from the environment (.env keys and Google Cloud settings)."""
+    api_keys = {"openai": "OPENAI_API_KEY", "gemini": "GEMINI_API_KEY", "palm": "PALMAI_API_KEY"}
+    return ProviderConfig(
+        provider_name, model_name,
+        max_tokens=max_tokens,
+        api_key=os.getenv(api_keys[provider_name]) if provider_name in api_keys else None,
+        proxy_api=os.getenv("OPENAI_PROXY_API", ""),
+        project=os.getenv("GOOGLE_CLOUD_PROJECT", ""),
+        location=os.getenv("GOOGLE_CLOUD_REGION", "us-central1"),
+        credentials_file_path=os.getenv("GOOGLE_APPLICATION_CREDENTIALS"),
+    )
+
+def create_provider(config):
+    """Create the provider client described by the config."""
+    if config.provider_name == "mock":
+        from libs.mock_provider import MockProvider
+        return MockProvider(model=config.model_name or "mock-coder")
+    if config.provider_name == "openai":
+        from libs.openai_langchain import OpenAILangChain
+        return OpenAILangChain(config.api_key, temprature=config.temperature or 0.3, max_tokens=config.max_tokens or 1000,
+                               model=config.model_name or "gpt-3.5-turbo", proxy_api=config.proxy_api)
+    if config.provider_name == "gemini":
+        from libs.geminiai import GeminiAI
+        return GeminiAI(config.api_key, model=config.model_name or "gemini-pro", temperature=config.temperature or 0.1, max_output_tokens=config.max_tokens or 2048)
+    if config.provider_name == "palm":
+        from libs.palmai import PalmAI
+        return PalmAI(config.api_key, model=config.model_name or "text-bison-001", temperature=config.temperature or 0.3, max_output_tokens=config.max_tokens or 2048)
+    if config.provider_name == "vertexai":
+        from libs.vertexai_langchain import VertexAILangChain
+        vertexai = VertexAILangChain(project=config.project, location=config.location, model_name=config.model_name or "code-bison",
+                                     max_tokens=config.max_tokens or 2048, temperature=config.temperature or 0.3, credentials_file_path=config.credentials_file_path)
+        if not vertexai.load_model(vertexai.model_name, vertexai.max_tokens, vertexai.temperature):
+            raise RuntimeError("Vertex AI model could not be loaded.")
+        return vertexai
+    raise ValueError(f"Unknown provider '{config.provider_name}'.")
+
+def _result(provider, code=None, error=None):
+    return GenerationResult(code=code, provider_name=provider.provider_name, model_name=provider.model_name, error=error)
+
+def _renderer(provider, settings):
+    """Render the prompts of the provider with the explicit settings of the request."""
+    def render(task_type, code_language, **values):
+        return provider.render_task_prompt(task_type, code_language, settings.coding_guidelines, settings.code_input, **values)
+    return render
+
+async def _complete_code(provider, prompt, code_language, **options):
+    completion = await provider.acomplete(prompt, **options)
+    return provider.utils.extract_code(completion, code_language) if completion else None
+
+async def agenerate(provider, request):
+    try:
+        prompt = provider.render_generate_prompt(request.code_prompt, request.code_language, request.settings.coding_guidelines, request.settings.code_input)
+        code = await _complete_code(provider, prompt, request.code_language, **provider.generate_options())
+        return _result(provider, code, None if code else "The provider returned no code.")
+    except Exception as exception:
+        logger.error(f"Error in code generation: {exception}")
+        return _result(provider, error=str(exception))
+
+async def afix(provider, request):
+    if not request.error:
+        return _result(provider, request.code)
+    try:
+        render = _renderer(provider, request.settings)
+        values = {"fix_instructions": request.fix_instructions or "", "error": request.error}
+        code = await ChunkedPipeline(provider, render=render).run("fix_chunk", request.code, request.code_language, **values)
+        if not code:
+            prompt = render("fix", request.code_language, code=request.code, history=request.history or "None", **values).text
+            code = await _complete_code(provider, prompt, request.code_language)
+        return _result(provider, code, None if code else "The provider returned no code.")
+    except Exception as exception:
+        logger.error(f"Error in code fixing: {exception}")
+        return _result(provider, error=str(exception))
+
+async def aconvert(provider, request):
+    try:
+        render = _renderer(provider, request.settings)
+        code = await ChunkedPipeline(provider, render=render).run("convert_chunk", request.code, request.code_language)
+        if not code:
+            prompt = render("convert", request.code_language, code=request.code, history=request.history or "None").text
+            code = await _complete_code(provider, prompt, request.code_language)
+        return _result(provider, code, None if code else "The provider returned no code.")
+    except Exception as exception:
+        logger.error(f"Error in code conversion: {exception}")
+        return _result(provider, error=str(exception))
+
+def generate(provider, request):
+    return get_generation_engine().run(agenerate(provider, request))
+
+def fix(provider, request):
+    return get_generation_engine().run(afix(provider, request))
+
+def convert(provider, request):
+    return get_generation_engine().run(aconvert(provider, request))
+
+def execute(request, general_utils=None):
+    """Run the code of the request with the offline compilers or the JDoodle API and compare it with the expected output."""
+    if general_utils is None:
+        from libs.general_utils import GeneralUtils
+        general_utils = GeneralUtils()
+    if request.compiler_mode.lower() == "api":
+        output = general_utils.code_runer.run_code(request.code, request.code_language, code_input=request.code_input, compile_only=False)
+    else:
+        output = general_utils.run_code(request.code, request.code_language, request.code_input, request.timeout)
+    matched = (output or "").strip() == request.expected_output.strip() if request.expected_output else None
+    return ExecutionResult(output=output, failed=general_utils.is_error_output(output), matched=matched)
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+def get_provider(config):
+    """Return the provider of the config, created once per process."""
+    with _providers_lock:
+        provider = _providers.get(config)
+        if provider is None:
+            provider = _providers[config] = create_provider(config)
+        return provider
+
+def process_request(config, request):
+    """
+    Entry point for worker processes, e.g. ProcessPoolExecutor.submit(process_request, config, request).
+    Both arguments and the returned result are picklable.
+    """
+    if isinstance(request, ExecuteRequest):
+        return execute(request)
+    provider = get_provider(config)
+    handlers = {GenerateRequest: generate, FixRequest: fix, ConvertRequest: convert}
+    return handlers[type(request)](provider, request)
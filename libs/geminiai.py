@@ -1,48 +1,80 @@
 
+import copy
 import re
+import threading
 import traceback
+from contextlib import contextmanager
 import google.generativeai as genai
 from dotenv import load_dotenv
 from libs.logger import logger
 import streamlit as st
 import libs.general_utils
+from libs.llm_provider import LLMProvider
+from libs.usage_meter import report_usage
+
+_configure_condition = threading.Condition()
+_configured_api_key = None
+_active_calls = 0
+
+@contextmanager
+def google_ai_key(api_key):
+    """
+    google.generativeai keeps one global configuration shared by Gemini and Palm, which the request reads when it
+    is sent. The key stays configured until the block exits: calls with the configured key run concurrently, a
+    call with another key waits for them to finish before it reconfigures.
+    """
+    global _configured_api_key, _active_calls
+    with _configure_condition:
+        while api_key != _configured_api_key and _active_calls:
+            _configure_condition.wait()
+        if api_key != _configured_api_key:
+            genai.configure(api_key=api_key)
+            _configured_api_key = api_key
+        _active_calls += 1
+    try:
+        yield
+    finally:
+        with _configure_condition:
+            _active_calls -= 1
+            if not _active_calls:
+                _configure_condition.notify_all()
+
+def configure_google_ai(api_key):
+    """Configure the key for calls which do not send a request right away."""
+    with google_ai_key(api_key):
+        pass
+
+# top_k and top_p of the generation modes of the Google models.
+SAMPLING_MODES = {"precise": (40, 0.95), "balanced": (20, 0.85), "creative": (10, 0.75)}
+
+def sampling_options(mode):
+    if mode not in SAMPLING_MODES:
+        raise ValueError("Invalid mode. Choose from 'precise', 'balanced', 'creative'.")
+    top_k, top_p = SAMPLING_MODES[mode]
+    return {"top_k": top_k, "top_p": top_p}
+
+class GeminiAI(LLMProvider):
+    provider_name = "gemini"
+    generate_task = "generate_expert"
 
-class GeminiAI:
     def __init__(self, api_key, model="gemini-pro", temperature=0.1, max_output_tokens=2048,mode="balanced"):
         self.api_key = api_key
         self.model = model
+        self.model_name = model
+        self._model_variants = {}
         self.temperature = temperature
         self.max_output_tokens = max_output_tokens
+        self.max_tokens = max_output_tokens
         self.mode = mode
         self.top_k = 20
         self.top_p = 0.85
         self._configure()
         self.utils = libs.general_utils.GeneralUtils()
 
-        # Dynamically construct guidelines based on session state
-        self.guidelines_list = []
-
-        if st.session_state["coding_guidelines"]["modular_code"]:
-            self.guidelines_list.append("- Ensure the method is modular in its approach.")
-        if st.session_state["coding_guidelines"]["exception_handling"]:
-            self.guidelines_list.append("- Integrate robust exception handling.")
-        if st.session_state["coding_guidelines"]["error_handling"]:
-            self.guidelines_list.append("- Add error handling to each module.")
-        if st.session_state["coding_guidelines"]["efficient_code"]:
-            self.guidelines_list.append("- Optimize the code to ensure it runs efficiently.")
-        if st.session_state["coding_guidelines"]["robust_code"]:
-            self.guidelines_list.append("- Ensure the code is robust against potential issues.")
-        if st.session_state["coding_guidelines"]["naming_conventions"]:
-            self.guidelines_list.append("- Follow standard naming conventions.")
-
-        # Convert the list to a string
-        self.guidelines = "\n".join(self.guidelines_list)
-        
-        
     def _configure(self):
         try:
             logger.info("Configuring Gemini AI Pro...")
-            genai.configure(api_key=self.api_key)
+            configure_google_ai(self.api_key)
             self.generation_config = {
                 "temperature": self.temperature,
                 "top_p": self.top_p,
@@ -61,22 +93,8 @@ class GeminiAI:
         """
         try:
             # Define top_k and top_p based on the mode
-            if self.mode == "precise":
-                top_k = 40
-                top_p = 0.95
-                self.temprature = 0
-            elif self.mode == "balanced":
-                top_k = 20
-                top_p = 0.85
-                self.temprature = 0.3
-            elif self.mode == "creative":
-                top_k = 10
-                top_p = 0.75
-                self.temprature = 1
-            else:
-                raise ValueError("Invalid mode. Choose from 'precise', 'balanced', 'creative'.")
-
-            logger.info(f"Generating code with mode: {self.mode}, top_k: {top_k}, top_p: {top_p}")
+            sampling = sampling_options(self.mode)
+            logger.info(f"Generating code with mode: {self.mode}, top_k: {sampling['top_k']}, top_p: {sampling['top_p']}")
 
             
             # check for valid prompt and language
@@ -90,35 +108,24 @@ class GeminiAI:
                 logger.info(f"Generating code for prompt: {code_prompt} in language: {code_language}")
                 
             # Plain and Simple Coding Task Prompt
-            prompt = f"""
-            Task: You're an experienced developer. Your mission is to create a program for {code_prompt} in {code_language} that takes {st.session_state.code_input} as input.
-
-            Your goal is clear: Craft a solution that showcases your expertise as a coder and problem solver.
-
-            Ensure that the program's output contains only the code you've written, with no extraneous information.
-
-            Show your skills and solve this challenge with confidence!
-            
-            And follow the proper coding guidelines and dont add comment unless instructed to do so.
-            {self.guidelines}
-            """
+            prompt = self.build_generate_prompt(code_prompt, code_language)
             
             # Print prompt in Log
             logger.info(f"Gemini AI prompt: {prompt}")
 
-            gemini_completion = self.model.generate_content(prompt)
+            gemini_completion = self.complete(prompt)
             logger.info("Text generation completed successfully.")
             
             code = None
             if gemini_completion:
                 # extract the code from the gemini completion
-                code = gemini_completion.text
+                code = gemini_completion
                 logger.info(f"GeminiAI coder is initialized.")
                 logger.info(f"Generated code: {code[:100]}...")
             
             if gemini_completion:
                 # Extracted code from the gemini completion
-                extracted_code = self.utils.extract_code(code)
+                extracted_code = self.utils.extract_code(code, code_language)
                 
                 # Check if the code or extracted code is not empty or null
                 if not code or not extracted_code:
@@ -146,46 +153,26 @@ class GeminiAI:
             if code and len(code) > 0:
                 logger.info(f"Fixing code {code[:100]}... in language {code_language} and error is {st.session_state.stderr}")
                 
-                # Improved instructions template
-                template = f"""
-                Task: Correct the code snippet provided below in the {code_language} programming language, following the given instructions {fix_instructions}
-
-                {code}
-
-                Instructions for Fixing:
-                1. Identify and rectify any syntax errors, logical issues, or bugs in the code.
-                2. Ensure that the code produces the desired output.
-                3. Comment on each line where you make changes, explaining the nature of the fix.
-                4. Verify that the corrected code is displayed in the output.
-
-                Please make sure that the fixed code is included in the output, along with comments detailing the modifications made.
-                """
-
                 # If there was an error in the previous execution, include it in the prompt
                 if st.session_state.stderr:
                     logger.info(f"Error in previous execution: {st.session_state.stderr}")
                     st.toast(f"Error in previous execution: {st.session_state.stderr}", icon="❌")
-                    template += f"\nFix the following error: {st.session_state.output}"
-                    
-                    # Check if the error indicates a missing or unavailable module
-                    error_message = st.session_state.output.lower()  # Convert to lowercase for case-insensitive matching
-
                 else:
                     st.toast("No error in previous execution.", icon="✅")
                     return code
 
                 # Prompt Templates
-                code_template = template
+                code_template = self.render_prompt("fix", code_language, code=code, fix_instructions=fix_instructions, error=st.session_state.output).text
                 
                 # LLM Chains definition
                 # Create a chain that generates the code
-                gemini_completion = self.model.generate_content(code_template)
+                gemini_completion = self.complete(code_template)
                 logger.info("Text generation completed successfully.")
 
                 if gemini_completion:
                     # Extracted code from the palm completion
-                    code = gemini_completion.text
-                    extracted_code = self.utils.extract_code(code)
+                    code = gemini_completion
+                    extracted_code = self.utils.extract_code(code, code_language)
                     
                     # Check if the code or extracted code is not empty or null
                     if not code or not extracted_code:
@@ -215,34 +202,20 @@ class GeminiAI:
             if code and len(code) > 0:
                 logger.info(f"Converting code {code[:100]}... to language {code_language}")
                 
-                # Improved instructions template
-                template = f"""
-                Task: Convert the code snippet provided below to the {code_language} programming language, following the given instructions:
-
-                {code}
-
-                Instructions for Conversion:
-                1. Identify the functionality of the original code.
-                2. Translate the code into the {code_language} programming language, maintaining the same functionality.
-                3. Verify that the converted code is displayed in the output.
-
-                Please make sure only the converted code should be included in the output.
-                """
-
                 # Prompt Templates
-                code_template = template
+                code_template = self.render_prompt("convert", code_language, code=code).text
                 
                 # LLM Chains definition
                 # Create a chain that generates the code
-                gemini_completion = self.model.generate_content(code_template)
+                gemini_completion = self.complete(code_template)
                 logger.info("Text generation completed successfully.")
 
                 if gemini_completion:
                     # Extracted code from the palm completion
-                    code = gemini_completion.text
+                    code = gemini_completion
                     extracted_code = None
                     if code:
-                        extracted_code = self.utils.extract_code(code)
+                        extracted_code = self.utils.extract_code(code, code_language)
                     
                     # Check if the code or extracted code is not empty or null
                     if not code or not extracted_code:
@@ -255,4 +228,35 @@ class GeminiAI:
                 logger.error("Error in code conversion: Please enter a valid code and language.")
         except Exception as exception:
             st.toast(f"Error in code conversion: {exception}", icon="❌")
-            logger.error(f"Error in code conversion: {traceback.format_exc()}")
\ No newline at end of file
+            logger.error(f"Error in code conversion: {traceback.format_exc()}")
+
+    def with_model(self, model_name):
+        # The cheaper variant shares the key and generation config, only the Gemini model differs.
+        if model_name not in self._model_variants:
+            variant = copy.copy(self)
+            variant.model_name = model_name
+            variant.model = genai.GenerativeModel(model_name=model_name, generation_config=self.generation_config)
+            variant._model_variants = {}
+            self._model_variants[model_name] = variant
+        return self._model_variants[model_name]
+
+    def _complete(self, prompt, **options):
+        with google_ai_key(self.api_key):
+            gemini_completion = self.model.generate_content(prompt)
+        self._report_usage(gemini_completion)
+        return gemini_completion.text if gemini_completion else None
+
+    def _report_usage(self, gemini_response):
+        # Only recent versions of the SDK return usage metadata, the usage is counted locally otherwise.
+        usage_metadata = getattr(gemini_response, "usage_metadata", None)
+        if usage_metadata:
+            report_usage(getattr(usage_metadata, "prompt_token_count", None), getattr(usage_metadata, "candidates_token_count", None))
+
+    def _stream_complete(self, prompt, **options):
+        # The stream is opened with the key, the chunks are read after it is released.
+        with google_ai_key(self.api_key):
+            gemini_stream = self.model.generate_content(prompt, stream=True)
+        for chunk in gemini_stream:
+            # The usage metadata of the last chunk covers the whole response.
+            self._report_usage(chunk)
+            yield chunk.text
@@ -1,8 +1,16 @@
 # general_utils.py
 import base64
+import json
 import os
 import tempfile
+from libs import code_fences
 from libs.code_runner import CodeRunner
+from libs.compile_cache import COMPILED_LANGUAGES, get_compile_cache
+from libs.python_worker_pool import WorkerError, get_python_worker_pool
+from libs.core_api import ExecuteRequest, execute
+from libs.generation_engine import get_generation_engine
+from libs.targeted_repair import TargetedRepair
+from libs.toolchain_registry import TOOLCHAIN_COMMANDS, get_toolchain_registry
 from libs.logger import logger
 import subprocess
 import traceback
@@ -23,19 +31,15 @@ class GeneralUtils:
     def __init__(self):
         self.code_runer = CodeRunner()
 
-    def extract_code(self, code):
+    def extract_code(self, code, code_language=None):
         """
         Extracts the code from the provided string.
-        If the string contains '```', it extracts the code between them.
+        If the string contains ``` fences, it returns the block written in code_language, else the first block.
         Otherwise, it returns the original string.
         """
         try:
             if '```' in code:
-                start = code.find('```') + len('```\n')
-                end = code.find('```', start)
-                # Skip the first line after ```
-                start = code.find('\n', start) + 1
-                extracted_code = code[start:end]
+                extracted_code = code_fences.extract_code(code, code_language)
                 logger.info("Code extracted successfully.")
                 return extracted_code
             else:
@@ -45,7 +49,16 @@ class GeneralUtils:
             logger.error(f"Error occurred while extracting code: {exception}")
             return None
 
-    def execute_code(self, compiler_mode: str):
+    def is_error_output(self, code_output):
+        """
+        Checks whether the output of an execution reports an error.
+        """
+        if not code_output:
+            return False
+        code_output = code_output.lower()
+        return "error" in code_output or "exception" in code_output
+
+    def execute_code(self, compiler_mode: str, provider=None):
         code_language = st.session_state.code_language
         generated_code = st.session_state.generated_code
         code_output = None
@@ -72,34 +85,39 @@ class GeneralUtils:
             # Execute code using JDoodle API
             elif compiler_mode.lower() == "api":
                 logger.info("Executing code using JDoodle API")
-                code_output = self.code_runer.run_code(generated_code, code_language,code_input=st.session_state.code_input,compile_only=False)
+                execution = execute(ExecuteRequest(generated_code, code_language, code_input=st.session_state.code_input, compiler_mode="api"), self)
+                code_output = execution.output
                 logger.info(f"Execution Output: {code_output}")
                 return code_output
 
             # Execute code using local compilers
             else:
                 logger.info("Executing code using local compilers")
-                code_output = self.run_code(generated_code, code_language)
+                execution = execute(ExecuteRequest(generated_code, code_language, st.session_state.code_input, st.session_state.code_output), self)
+                code_output = execution.output
                 
                 # Check for errors in code execution
-                if "error" in code_output.lower() or "exception" in code_output.lower() or "SyntaxError" in code_output.lower() or "NameError" in code_output.lower():
+                if execution.failed:
 
                     logger.error(f"Error in code execution: {code_output}")
                     st.session_state.stderr = code_output
-                    response = st.session_state.sequential_chain({'code_topic': generated_code})
-                    fixed_code = response['code_fix']
-                    st.code(fixed_code, language=code_language.lower())
-
-                    with st.expander('Message History'):
-                        st.info(st.session_state.memory.buffer)
-                    logger.warning(f"Trying to run fixed code: {fixed_code}")
-                    code_output = self.run_code(code=fixed_code, language=code_language)
-                    logger.warning(f"Fixed code output: {code_output}")
-                    logger.info(f"Execution Output: '{code_output}' and session output: '{st.session_state.code_output}'")
+                    # The fix goes through the provider, so it is cached, budgeted and metered like every other call.
+                    if provider:
+                        st.session_state.output = code_output
+                        fixed_code = self.repair_code(provider, generated_code, code_language, code_output)
+                        st.code(fixed_code, language=code_language.lower())
+
+                        logger.warning(f"Trying to run fixed code: {fixed_code}")
+                        execution = execute(ExecuteRequest(fixed_code, code_language, st.session_state.code_input, st.session_state.code_output), self)
+                        code_output = execution.output
+                        logger.warning(f"Fixed code output: {code_output}")
+                        logger.info(f"Execution Output: '{code_output}' and session output: '{st.session_state.code_output}'")
+                    else:
+                        logger.warning("No provider is selected, the failing code is not fixed.")
                 
                 # check for expected output
-                if (st.session_state.code_output is not None and st.session_state.code_output != "" and len(st.session_state.code_output) > 0):
-                    if (code_output == st.session_state.code_output):
+                if execution.matched is not None:
+                    if execution.matched:
                         st.toast("Output:\n" + code_output, icon="🔥")
                     else:
                         st.toast("Error the expected output doesnt match the generated output:\n'" + st.session_state.code_output + "'\n", icon="❌")
@@ -112,6 +130,18 @@ class GeneralUtils:
             logger.error(f"Error in code execution: {traceback.format_exc()}")
             return code_output
     
+    def repair_code(self, provider, code, code_language, diagnostics):
+        """
+        Repair the failing region of the code with a unified diff, falling back to fixing the whole file.
+        """
+        engine = get_generation_engine()
+        fix_instructions = st.session_state.code_fix_instructions or ""
+        fixed_code = engine.run(TargetedRepair(provider).repair(code, code_language, diagnostics, fix_instructions))
+        if fixed_code:
+            st.toast("Applied a targeted fix to the failing lines.", icon="✅")
+            return fixed_code
+        return engine.run(provider.fix(code, code_language, fix_instructions))
+
     # Generate Dynamic HTML for JDoodle Compiler iFrame Embedding.
     def generate_dynamic_html(self,language, code_prompt):
         logger.info("Generating dynamic HTML for language: %s", language)
@@ -137,34 +167,30 @@ class GeneralUtils:
         language_code=get_language_codes()[language]
         logger.info(f"Checking compilers for language: {language} with lang_code: {language_code}")
 
-        compilers = {
-            "python": ["python", "--version"],
-            "nodejs": ["node", "--version"],
-            "c": ["gcc", "--version"],
-            "cpp": ["g++", "--version"],
-            "csharp": ["csc", "--version"],
-            "go": ["go", "--version"],
-            "ruby": ["ruby", "--version"],
-            "java": ["java", "--version"],
-            "kotlin": ["kotlinc", "--version"],
-            "scala": ["scala", "--version"],
-            "swift": ["swift", "--version"]
-        }
-
-        if language_code not in compilers:
+        if language_code not in TOOLCHAIN_COMMANDS:
             logger.error(f"Invalid language selected '{language_code}' not found in compilers list.")
             st.toast(f"Invalid language selected '{language_code}' not found in compilers list.", icon="❌")
             return False
 
-        compiler = subprocess.run(compilers[language_code], capture_output=True, text=True)
-        if compiler.returncode != 0:
+        # Answered from the toolchain inventory, the compilers are not started again for every run.
+        toolchain = get_toolchain_registry().get(language_code)
+        if not toolchain.available:
             logger.error(f"{language.capitalize()} compiler not found.")
             st.toast(f"{language.capitalize()} compiler not found.", icon="❌")
             return False
 
         return True
     
-    def run_code(self,code, language):
+    def _run_program(self, command, code_input=None, timeout=None):
+        """Run the program and return its stdout followed by its stderr, it is killed once the timeout expires."""
+        try:
+            output = subprocess.run(command, capture_output=True, text=True, input=code_input, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Killed {command[0]} after {timeout} seconds")
+            return f"Error: the program did not finish within {timeout} seconds."
+        return output.stdout + output.stderr
+
+    def run_code(self,code, language, code_input=None, timeout=None):
         logger.info(f"Running code: {code[:100]} in language: {language}")
 
         # Check for code and language validity
@@ -175,42 +201,40 @@ class GeneralUtils:
         compilers_status = self.check_compilers(language)
         if not compilers_status:
             return "Compilers not found. Please install compilers on your system."
+
+        # Task inputs may be structured, the program reads them as JSON from stdin.
+        if code_input is not None and not isinstance(code_input, str):
+            code_input = json.dumps(code_input)
         
         if language == "Python":
+            python_worker_pool = get_python_worker_pool()
+            if python_worker_pool:
+                try:
+                    output = python_worker_pool.run(code, code_input, timeout)
+                    logger.info(f"Runner Output execution: {output}")
+                    return output
+                except (OSError, WorkerError) as exception:
+                    logger.error(f"Error running code on the Python worker pool, starting a new interpreter: {exception}")
+
             with tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=True) as file:
                 file.write(code)
                 file.flush()
 
                 logger.info(f"Input file: {file.name}")
-                output = subprocess.run(
-                    ["python", file.name], capture_output=True, text=True)
-                logger.info(f"Runner Output execution: {output.stdout + output.stderr}")
-                return output.stdout + output.stderr
+                output = self._run_program(["python", file.name], code_input, timeout)
+                logger.info(f"Runner Output execution: {output}")
+                return output
 
-        elif language == "C" or language == "C++":
-            
-            ext = ".c" if language == "C" else ".cpp"
-            compiler = "gcc" if language == "C" else "g++"
-            std = "-std=c11" if language == "C" else "-std=c++17"
-
-            with tempfile.NamedTemporaryFile(mode="w", suffix=ext, delete=True) as src_file:
-                src_file.write(code)
-                src_file.flush()
-
-                logger.info(f"Input file: {src_file.name}")
+        elif language in COMPILED_LANGUAGES:
+            # Unchanged programs are not compiled again, see libs/compile_cache.py.
+            with get_compile_cache().build(language, code) as (program, compile_errors):
+                if compile_errors is not None:
+                    return compile_errors
 
-                with tempfile.NamedTemporaryFile(mode="w", suffix="", delete=True) as exec_file:
-                    compile_output = subprocess.run(
-                        [compiler, std, "-o", exec_file.name, src_file.name], capture_output=True, text=True)
-
-                    if compile_output.returncode != 0:
-                        return compile_output.stderr
-
-                    logger.info(f"Output file: {exec_file.name}")
-                    run_output = subprocess.run(
-                        [exec_file.name], capture_output=True, text=True)
-                    logger.info(f"Runner Output execution: {run_output.stdout + run_output.stderr}")
-                    return run_output.stdout + run_output.stderr
+                logger.info(f"Running program: {' '.join(program)}")
+                run_output = self._run_program(program, code_input, timeout)
+                logger.info(f"Runner Output execution: {run_output}")
+                return run_output
 
         elif language == "JavaScript":
             with tempfile.NamedTemporaryFile(mode="w", suffix=".js", delete=True) as file:
@@ -218,73 +242,27 @@ class GeneralUtils:
                 file.flush()
 
                 logger.info(f"Input file: {file.name}")
-                output = subprocess.run(
-                    ["node", file.name], capture_output=True, text=True)
-                logger.info(f"Runner Output execution: {output.stdout + output.stderr}")
-                return output.stdout + output.stderr
-            
-        elif language == "Java":
-                with tempfile.NamedTemporaryFile(mode="w", suffix=".java", delete=True) as file:
-                    file.write(code)
-                    file.flush()
-                    classname = "Main"  # Assuming the class name is Main, adjust if needed
-                    compile_output = subprocess.run(["javac", file.name], capture_output=True, text=True)
-                    if compile_output.returncode != 0:
-                        return compile_output.stderr
-                    run_output = subprocess.run(["java", "-cp", tempfile.gettempdir(), classname], capture_output=True, text=True)
-                    return run_output.stdout + run_output.stderr
+                output = self._run_program(["node", file.name], code_input, timeout)
+                logger.info(f"Runner Output execution: {output}")
+                return output
 
         elif language == "Swift":
                 with tempfile.NamedTemporaryFile(mode="w", suffix=".swift", delete=True) as file:
                     file.write(code)
                     file.flush()
-                    output = subprocess.run(["swift", file.name], capture_output=True, text=True)
-                    return output.stdout + output.stderr
-
-        elif language == "C#":
-                with tempfile.NamedTemporaryFile(mode="w", suffix=".cs", delete=True) as file:
-                    file.write(code)
-                    file.flush()
-                    compile_output = subprocess.run(["csc", file.name], capture_output=True, text=True)
-                    if compile_output.returncode != 0:
-                        return compile_output.stderr
-                    exe_name = file.name.replace(".cs", ".exe")
-                    run_output = subprocess.run([exe_name], capture_output=True, text=True)
-                    return run_output.stdout + run_output.stderr
+                    return self._run_program(["swift", file.name], code_input, timeout)
 
         elif language == "Scala":
                 with tempfile.NamedTemporaryFile(mode="w", suffix=".scala", delete=True) as file:
                     file.write(code)
                     file.flush()
-                    output = subprocess.run(["scala", file.name], capture_output=True, text=True)
-                    return output.stdout + output.stderr
+                    return self._run_program(["scala", file.name], code_input, timeout)
 
         elif language == "Ruby":
                 with tempfile.NamedTemporaryFile(mode="w", suffix=".rb", delete=True) as file:
                     file.write(code)
                     file.flush()
-                    output = subprocess.run(["ruby", file.name], capture_output=True, text=True)
-                    return output.stdout + output.stderr
-
-        elif language == "Kotlin":
-                with tempfile.NamedTemporaryFile(mode="w", suffix=".kt", delete=True) as file:
-                    file.write(code)
-                    file.flush()
-                    compile_output = subprocess.run(["kotlinc", file.name, "-include-runtime", "-d", "output.jar"], capture_output=True, text=True)
-                    if compile_output.returncode != 0:
-                        return compile_output.stderr
-                    run_output = subprocess.run(["java", "-jar", "output.jar"], capture_output=True, text=True)
-                    return run_output.stdout + run_output.stderr
-
-        elif language == "Go":
-                with tempfile.NamedTemporaryFile(mode="w", suffix=".go", delete=True) as file:
-                    file.write(code)
-                    file.flush()
-                    compile_output = subprocess.run(["go", "build", "-o", "output.exe", file.name], capture_output=True, text=True)
-                    if compile_output.returncode != 0:
-                        return compile_output.stderr
-                    run_output = subprocess.run(["./output.exe"], capture_output=True, text=True)
-                    return run_output.stdout + run_output.stderr
+                    return self._run_program(["ruby", file.name], code_input, timeout)
         else:
             return "Unsupported language."
 
@@ -426,67 +404,3 @@ class GeneralUtils:
         except Exception as e:
             logger.error(f"Error saving uploaded file: {e}")
             return None
-    
-    
-    # Create method which takes string and calulate its number of words,letter count and for each 1000 characters in that string it will multiply with $0.0005 and return the cost, cost per whole string and total cost..
-    def calculate_code_generation_cost(self,string,price=0.0005):
-        # Calculate number of words
-        number_of_words = len(string.split())
-        
-        # Calculate number of letters
-        number_of_letters = len(string)
-        
-        # Calculate cost
-        cost = price * (number_of_letters / 1000)
-        
-        # Calculate cost per whole string
-        cost_per_whole_string = price * (len(string) / 1000)
-        
-        # Calculate total cost
-        total_cost = cost * number_of_words
-        
-        # Return the cost, cost per whole string and total cost
-        #return cost, cost_per_whole_string, total_cost
-
-        # Return the total cost
-        return total_cost
-
-    def codey_generation_cost(self,string):
-        codey_price = 0.0005
-        return self.calculate_code_generation_cost(string,codey_price)
-
-    def gpt_3_generation_cost(self,string):
-        model_price = 0.0002
-        return self.calculate_code_generation_cost(string,model_price)
-
-    def gpt_3_5_turbo_generation_costself(self,string):
-        model_price = 0.0080
-        return self.calculate_code_generation_cost(string,model_price)
-
-    def gpt_4_generation_cost(self,string):
-        model_price = 0.06
-        return self.calculate_code_generation_cost(string,model_price)
-    
-    def gpt_text_davinci_generation_cost(self,string):
-        model_price = 0.0060
-        return self.calculate_code_generation_cost(string,model_price)
-    
-    def palm_text_bison_generation_cost(self,string):
-        model_price = 0.00025
-        return self.calculate_code_generation_cost(string,model_price)
-    
-    def palm_chat_bison_generation_cost(self,string):
-        model_price = 0.00025
-        return self.calculate_code_generation_cost(string,model_price)
-
-    def palm_embedding_gecko_generation_cost(self,string):
-        model_price = 0.0002
-        return self.calculate_code_generation_cost(string,model_price)
-    
-    def gemini_pro_generation_cost(self,string):
-        model_price = 0.00025 
-        return self.calculate_code_generation_cost(string,model_price)
-    
-    def gemini_pro_vision_generation_cost(self,string):
-        model_price = 0.00025 
-        return self.calculate_code_generation_cost(string,model_price)
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""
+Async generation engine shared by all the LLM providers.
+
+The engine owns one long-lived asyncio event loop running on a background thread, so every
+Streamlit session in the process submits work to the same loop instead of blocking its own
+script thread for the whole LLM round-trip. The number of provider calls in flight is bounded
+by a semaphore and the blocking SDK calls are executed on a fixed size worker pool.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from libs.logger import logger
+
+# Streamlit context of the session that scheduled the current coroutine.
+_script_run_ctx = contextvars.ContextVar("script_run_ctx", default=None)
+
+class GenerationEngine:
+    """Runs provider coroutines on a shared event loop with bounded concurrency."""
+
+    def __init__(self, max_concurrency=8):
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="generation-worker")
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(self._executor)
+        self._thread = threading.Thread(target=self._run_loop, name="generation-engine", daemon=True)
+        self._thread.start()
+        logger.info(f"Generation engine started with max concurrency: {max_concurrency}")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    @property
+    def loop(self):
+        return self._loop
+
+    def schedule(self, coroutine):
+        """
+        Schedule a coroutine on the engine loop and return a concurrent.futures.Future.
+        The Streamlit context of the calling thread is carried along so provider code can still use st.toast.
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Cannot schedule work from inside the generation engine loop, await the coroutine instead.")
+
+        script_run_ctx = get_script_run_ctx()
+
+        async def _with_script_run_ctx():
+            _script_run_ctx.set(script_run_ctx)
+            return await coroutine
+
+        return asyncio.run_coroutine_threadsafe(_with_script_run_ctx(), self._loop)
+
+    def run(self, coroutine, timeout=None):
+        """Run a coroutine on the engine loop and block the calling thread until it finishes."""
+        return self.schedule(coroutine).result(timeout)
+
+    async def submit(self, func, *args, **kwargs):
+        """Run a blocking provider call on the worker pool once a concurrency slot is free."""
+        script_run_ctx = _script_run_ctx.get()
+        context = contextvars.copy_context()
+
+        def _call():
+            thread = threading.current_thread()
+            add_script_run_ctx(thread, script_run_ctx)
+            try:
+                return context.run(func, *args, **kwargs)
+            finally:
+                add_script_run_ctx(thread, None)
+
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, _call)
+
+    async def gather(self, *coroutines, return_exceptions=False):
+        """Fan out several coroutines concurrently, the semaphore still bounds the provider calls."""
+        return await asyncio.gather(*coroutines, return_exceptions=return_exceptions)
+
+    def shutdown(self):
+        logger.info("Shutting down generation engine.")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_generation_engine():
+    """Return the process wide generation engine, creating it on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            max_concurrency = int(os.getenv("GENERATION_MAX_CONCURRENCY", 8))
+            _engine = GenerationEngine(max_concurrency=max_concurrency)
+        return _engine
@@ -0,0 +1,71 @@
+"""
+Hedged code generation.
+
+The primary provider is asked first. When it has not answered within the hedge delay, the same request is
+sent to a secondary provider and the first valid extracted code wins. The hedge delay is a percentile of the
+primary provider latency recorded by the latency tracker, so a slow tail is cut without doubling the
+traffic of the typical request. The losing request is cancelled; its blocking SDK call cannot be interrupted
+so it runs to completion on its worker and its response only lands in the response cache.
+"""
+import asyncio
+import os
+from dataclasses import dataclass
+from libs.latency_tracker import get_latency_tracker
+from libs.logger import logger
+
+@dataclass
+class HedgedResult:
+    code: str
+    provider_name: str
+    hedged: bool = False
+
+class HedgedRequest:
+    def __init__(self, percentile=95, default_delay=None, min_delay=None, latency_tracker=None):
+        self.percentile = percentile
+        self.default_delay = float(os.getenv("HEDGE_DEFAULT_DELAY", 5.0)) if default_delay is None else default_delay
+        self.min_delay = float(os.getenv("HEDGE_MIN_DELAY", 0.5)) if min_delay is None else min_delay
+        self.latency_tracker = latency_tracker or get_latency_tracker()
+
+    def hedge_delay(self, provider):
+        """Seconds to wait for the primary provider before the secondary one is started."""
+        delay = self.latency_tracker.percentile(provider.provider_name, provider.model_name, self.percentile, default=self.default_delay)
+        return max(self.min_delay, delay)
+
+    async def _attempt(self, provider, code_prompt, code_language):
+        code = await provider.generate_extracted(code_prompt, code_language)
+        if not code or not code.strip():
+            raise ValueError(f"{provider.provider_name} returned no code.")
+        return HedgedResult(code=code, provider_name=provider.provider_name)
+
+    async def generate(self, primary, secondary, code_prompt, code_language):
+        """
+        Return the HedgedResult of whichever provider first returns valid code, or None when both fail.
+        """
+        delay = self.hedge_delay(primary)
+        primary_task = asyncio.ensure_future(self._attempt(primary, code_prompt, code_language))
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if done and primary_task.exception() is None:
+            return primary_task.result()
+        if done:
+            logger.error(f"Primary provider {primary.provider_name} failed: {primary_task.exception()}")
+            pending = set()
+        else:
+            logger.info(f"Primary provider {primary.provider_name} exceeded the hedge delay of {delay:.2f}s, starting {secondary.provider_name}")
+            pending = {primary_task}
+
+        secondary_task = asyncio.ensure_future(self._attempt(secondary, code_prompt, code_language))
+        pending.add(secondary_task)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        result = task.result()
+                        result.hedged = task is secondary_task
+                        logger.info(f"Hedged request won by {result.provider_name}")
+                        return result
+                    logger.error(f"Hedged request failed: {task.exception()}")
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
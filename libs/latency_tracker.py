@@ -0,0 +1,62 @@
+"""
+Per provider latency tracking.
+
+Every completion which reaches a provider backend records its wall clock latency in a bounded window
+per provider and model. The hedged request mode derives its hedge delay from a percentile of that window,
+so the delay follows the providers as they get faster or slower.
+"""
+import os
+import threading
+from collections import deque
+import numpy as np
+from libs.logger import logger
+
+class LatencyTracker:
+    def __init__(self, window_size=100, min_samples=5):
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(provider_name, model_name=None):
+        return f"{provider_name}/{model_name}" if model_name else provider_name
+
+    def record(self, provider_name, model_name, latency):
+        key = self.make_key(provider_name, model_name)
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window_size)).append(latency)
+        logger.info(f"Latency of {key}: {latency:.2f}s")
+
+    def percentile(self, provider_name, model_name=None, percentile=95, default=None):
+        """
+        Return the latency percentile in seconds, or `default` until enough samples were recorded.
+        """
+        with self._lock:
+            samples = list(self._samples.get(self.make_key(provider_name, model_name), ()))
+        if len(samples) < self.min_samples:
+            return default
+        return float(np.percentile(samples, percentile))
+
+    def get_stats(self):
+        with self._lock:
+            snapshot = {key: list(samples) for key, samples in self._samples.items()}
+        return {
+            key: {"count": len(samples), "p50": float(np.percentile(samples, 50)), "p95": float(np.percentile(samples, 95))}
+            for key, samples in snapshot.items() if samples
+        }
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+_latency_tracker = None
+_latency_tracker_lock = threading.Lock()
+
+def get_latency_tracker():
+    """Return the process wide latency tracker, creating it on first use."""
+    global _latency_tracker
+    with _latency_tracker_lock:
+        if _latency_tracker is None:
+            _latency_tracker = LatencyTracker(window_size=int(os.getenv("LATENCY_WINDOW_SIZE", 100)))
+        return _latency_tracker
@@ -0,0 +1,295 @@
+"""
+Common interface shared by the OpenAI, Gemini, Palm and Vertex AI providers.
+
+Every provider implements the blocking generate/fix/convert methods used by the Streamlit UI and a
+`_complete` method which sends one fully rendered prompt to its backend. Prompts are rendered from the
+shared prompt registry. The async `generate`, `fix`,
+`convert` and `acomplete` coroutines run those calls on the shared generation engine.
+Completions are served from the shared response cache when an identical request was seen before.
+`stream_complete` yields the completion incrementally for providers with a streaming backend.
+The latency of every call reaching a backend is recorded in the shared latency tracker.
+Backend calls are retried and guarded by a circuit breaker per provider/model in the resilience layer,
+identical calls in flight are coalesced and every call is admitted by the rate limiter of its provider and key.
+The token usage and cost of every backend call is appended to the usage ledger, and every request is
+admitted against the budgets first, possibly on a cheaper model of the same family (see `with_model`).
+Large files are fixed and converted chunk by chunk by the chunked pipeline.
+"""
+import time
+import streamlit as st
+from libs.budget import get_budget_controller
+from libs.chunked_pipeline import ChunkedPipeline
+from libs.client_registry import ClientRegistry
+from libs.generation_engine import get_generation_engine
+from libs.latency_tracker import get_latency_tracker
+from libs.resilience import get_resilience_manager
+from libs.response_recorder import get_response_recorder
+from libs.logger import logger
+from libs.prompt_registry import get_prompt_registry
+from libs.rate_limiter import get_rate_limiter
+from libs.response_cache import get_response_cache, is_cache_bypassed
+from libs.single_flight import get_single_flight
+from libs.token_counter import count_tokens
+from libs.usage_meter import Usage, get_usage_ledger, reset_reported_usage
+
+class LLMProvider:
+    provider_name = None
+    model_name = None
+    temperature = None
+    max_tokens = None
+    # Prompt registry template used for code generation.
+    generate_task = "generate"
+    history_tasks = ("fix", "convert")
+
+    def generate_code(self, code_prompt, code_language):
+        raise NotImplementedError(f"{self.__class__.__name__} does not support code generation.")
+
+    def fix_generated_code(self, code, code_language, fix_instructions=""):
+        raise NotImplementedError(f"{self.__class__.__name__} does not support code fixing.")
+
+    def convert_generated_code(self, code, code_language):
+        raise NotImplementedError(f"{self.__class__.__name__} does not support code conversion.")
+
+    def prompt_settings(self):
+        """
+        The coding guidelines and code input of the current session, read at call time since clients are shared.
+        """
+        return st.session_state["coding_guidelines"], st.session_state.code_input
+
+    def previous_error(self):
+        """Return the output of the last run when it failed, None otherwise."""
+        return st.session_state.output if st.session_state.stderr else None
+
+    def conversation_history(self):
+        """The token budgeted conversation memory of the current session, carried by the fix and convert prompts."""
+        memory = st.session_state.get("memory")
+        return (memory.context() if memory else "") or "None"
+
+    def render_prompt(self, task_type, code_language, **values):
+        coding_guidelines, code_input = self.prompt_settings()
+        if task_type in self.history_tasks:
+            values.setdefault("history", self.conversation_history())
+        return self.render_task_prompt(task_type, code_language, coding_guidelines, code_input, **values)
+
+    def render_task_prompt(self, task_type, code_language, coding_guidelines=None, code_input=None, **values):
+        """Render a prompt with explicit settings, used by the core API where there is no session."""
+        if task_type in self.history_tasks:
+            values.setdefault("history", "None")
+        return get_prompt_registry().render(task_type, code_language, coding_guidelines, code_input, self.model_name, **values)
+
+    def build_generate_prompt(self, code_prompt, code_language):
+        coding_guidelines, code_input = self.prompt_settings()
+        return self.render_generate_prompt(code_prompt, code_language, coding_guidelines, code_input)
+
+    def render_generate_prompt(self, code_prompt, code_language, coding_guidelines=None, code_input=None):
+        """Render the generation prompt with explicit settings, used where there is no session."""
+        return self.render_task_prompt(self.generate_task, code_language, coding_guidelines, code_input, code_prompt=code_prompt).text
+
+    def prompt_namespace(self, code_language):
+        """
+        Stable hash of the compiled generation prompt (template, language and guidelines), used as a cache namespace.
+        """
+        coding_guidelines, code_input = self.prompt_settings()
+        return get_prompt_registry().compile_for(self.generate_task, code_language, coding_guidelines, code_input).static_hash
+
+    def generate_options(self):
+        """
+        Provider specific options passed to complete() by generate_code.
+        """
+        return {}
+
+    def generate_code_stream(self, code_prompt, code_language):
+        """
+        Yield the raw completion chunks of a code generation request as they arrive.
+        """
+        prompt = self.build_generate_prompt(code_prompt, code_language)
+        yield from self.stream_complete(prompt, **self.generate_options())
+
+    def complete(self, prompt, sample=0, **options):
+        """
+        Send a rendered prompt to the provider and return the raw completion text.
+        `sample` tells the candidates of the same prompt apart in the cache, it is never sent to the provider.
+        """
+        completion = self.cached_completion(prompt, sample=sample, **options)
+        if completion is not None:
+            return completion
+
+        # The budget admits the request as is, on a cheaper model of the family, or raises BudgetExceededError.
+        with get_budget_controller().admit(self, prompt) as provider:
+            if provider is not self:
+                completion = provider.cached_completion(prompt, sample=sample, **options)
+                if completion is not None:
+                    return completion
+            cache_key = provider.cache_key(prompt, sample=sample, **options)
+            # Identical requests already in flight wait for that call instead of reaching the provider again.
+            return get_single_flight().do(cache_key, provider._fetch_completion, cache_key, prompt, **options)
+
+    def cached_completion(self, prompt, sample=0, **options):
+        if is_cache_bypassed():
+            return None
+        completion = get_response_cache().get(self.cache_key(prompt, sample=sample, **options))
+        if completion is not None:
+            logger.info(f"Response cache hit for {self.provider_name}/{self.model_name}.")
+        return completion
+
+    def with_model(self, model_name):
+        """
+        Return a copy of the provider using another model of the same family, or None when not supported.
+        """
+        return None
+
+    def _fetch_completion(self, cache_key, prompt, **options):
+        self.acquire_rate_limit(prompt)
+        reset_reported_usage()
+        start_time = time.monotonic()
+        completion = get_resilience_manager().call(self.circuit_name, self._complete, prompt, **options)
+        get_latency_tracker().record(self.provider_name, self.model_name, time.monotonic() - start_time)
+        self.record_usage(prompt, completion)
+        if completion:
+            get_response_cache().set(cache_key, completion)
+            self.record_response(prompt, completion)
+        return completion
+
+    def record_response(self, prompt, completion):
+        response_recorder = get_response_recorder()
+        if response_recorder is not None:
+            response_recorder.record(self.provider_name, self.model_name, prompt, completion)
+
+    @property
+    def circuit_name(self):
+        return f"{self.provider_name}/{self.model_name}"
+
+    @property
+    def rate_limit_key(self):
+        # Quotas are enforced per provider and API key, only a fingerprint of the key is kept.
+        return f"{self.provider_name}/{ClientRegistry.fingerprint(getattr(self, 'api_key', None))}"
+
+    def estimate_request_tokens(self, prompt, completions=1):
+        # Providers count the prompt and the whole completion budget of every candidate against the tokens per minute quota.
+        return count_tokens(prompt, self.model_name) + (self.max_tokens or 0) * completions
+
+    def acquire_rate_limit(self, prompt, completions=1):
+        get_rate_limiter().acquire(self.provider_name, self.rate_limit_key, self.estimate_request_tokens(prompt, completions))
+
+    def record_usage(self, prompt, completion):
+        """
+        Meter a backend call with the usage reported by the provider, or a local tokenizer count, and return its cost.
+        """
+        usage = Usage.measure(prompt, completion, self.model_name)
+        return get_usage_ledger().record(self.provider_name, self.model_name, usage)
+
+    def cache_key(self, prompt, sample=0, **options):
+        # The rendered prompt already carries the language, coding guidelines and code input.
+        key_parts = dict(
+            provider=self.provider_name,
+            model=self.model_name,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            options=options,
+            prompt=prompt,
+        )
+        # The first sample shares its key with a plain completion of the prompt.
+        if sample:
+            key_parts["sample"] = sample
+        return get_response_cache().make_key(**key_parts)
+
+    def stream_complete(self, prompt, **options):
+        """
+        Same as complete() but yields the completion in chunks, the full text is cached once the stream ends.
+        """
+        completion = self.cached_completion(prompt, **options)
+        if completion is not None:
+            yield completion
+            return
+
+        with get_budget_controller().admit(self, prompt) as provider:
+            if provider is not self:
+                completion = provider.cached_completion(prompt, **options)
+                if completion is not None:
+                    yield completion
+                    return
+            yield from provider._fetch_stream(prompt, **options)
+
+    def _fetch_stream(self, prompt, **options):
+        chunks = []
+        self.acquire_rate_limit(prompt)
+        reset_reported_usage()
+        start_time = time.monotonic()
+        completed = False
+        try:
+            for chunk in get_resilience_manager().stream(self.circuit_name, self._stream_complete, prompt, **options):
+                if chunk:
+                    chunks.append(chunk)
+                    yield chunk
+            completed = True
+        finally:
+            # A stream stopped early (e.g. by the early syntax validation) has still been billed for its chunks.
+            if completed or chunks:
+                get_latency_tracker().record(self.provider_name, self.model_name, time.monotonic() - start_time)
+                self.record_usage(prompt, "".join(chunks))
+
+        completion = "".join(chunks)
+        if completion:
+            get_response_cache().set(self.cache_key(prompt, **options), completion)
+            self.record_response(prompt, completion)
+
+    def _complete(self, prompt, **options):
+        raise NotImplementedError(f"{self.__class__.__name__} must implement _complete.")
+
+    def _stream_complete(self, prompt, **options):
+        # Providers without a streaming backend return the whole completion as a single chunk.
+        yield self._complete(prompt, **options)
+
+    async def generate(self, code_prompt, code_language):
+        return await get_generation_engine().submit(self.generate_code, code_prompt, code_language)
+
+    async def fix(self, code, code_language, fix_instructions=""):
+        # Large files are fixed chunk by chunk, everything else takes the single prompt path.
+        error = await get_generation_engine().submit(self.previous_error)
+        if error:
+            fixed_code = await ChunkedPipeline(self).run("fix_chunk", code, code_language, fix_instructions=fix_instructions, error=error)
+            if fixed_code:
+                return fixed_code
+        return await get_generation_engine().submit(self.fix_generated_code, code, code_language, fix_instructions)
+
+    async def convert(self, code, code_language):
+        converted_code = await ChunkedPipeline(self).run("convert_chunk", code, code_language)
+        if converted_code:
+            return converted_code
+        return await get_generation_engine().submit(self.convert_generated_code, code, code_language)
+
+    async def abuild_generate_prompt(self, code_prompt, code_language):
+        # The prompt reads the session state, so it is rendered on a worker carrying the Streamlit context.
+        return await get_generation_engine().submit(self.build_generate_prompt, code_prompt, code_language)
+
+    async def acomplete(self, prompt, **options):
+        return await get_generation_engine().submit(self.complete, prompt, **options)
+
+    async def acomplete_candidates(self, prompt, count, **options):
+        """
+        Sample `count` completions concurrently. The sample index is part of the cache key so
+        the samples are not collapsed onto one cached response, it is not sent to the provider.
+        """
+        completions = await get_generation_engine().gather(
+            *[self.acomplete(prompt, sample=index, **options) for index in range(count)], return_exceptions=True
+        )
+        for completion in completions:
+            if isinstance(completion, Exception):
+                logger.error(f"Error sampling candidate from {self.provider_name}: {completion}")
+        return [completion for completion in completions if isinstance(completion, str) and completion]
+
+    async def generate_extracted(self, code_prompt, code_language):
+        """
+        Generate code for the prompt and return the extracted code, without touching the session state.
+        """
+        prompt = await self.abuild_generate_prompt(code_prompt, code_language)
+        completion = await self.acomplete(prompt, **self.generate_options())
+        return self.utils.extract_code(completion, code_language) if completion else None
+
+    async def generate_candidates(self, code_prompt, code_language, count):
+        """
+        Generate `count` candidate programs for the prompt and return the extracted code of each.
+        """
+        prompt = await self.abuild_generate_prompt(code_prompt, code_language)
+        completions = await self.acomplete_candidates(prompt, count, **self.generate_options())
+        candidates = [self.utils.extract_code(completion, code_language) for completion in completions]
+        return [candidate for candidate in candidates if candidate]
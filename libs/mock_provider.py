@@ -0,0 +1,172 @@
+"""
+Deterministic local mock provider.
+
+Has the same interface as the real providers and answers without any network access or API key, so the whole
+pipeline can be exercised, benchmarked and load tested reproducibly on an air-gapped box. Answers come from, in
+order: responses replayed from a JSONL file keyed by prompt hash (see libs/response_recorder.py), canned responses
+whose regex pattern matches the prompt (templated with $code_language, $program and the named groups of the
+pattern), and a hello world program in the language named by the prompt.
+The latency follows a configurable distribution (fixed, uniform, normal, lognormal or exponential), a share of
+the calls fails with retryable 503 or 429 errors, and streams are cut into token sized chunks. All the randomness
+is derived from the seed, the prompt and how often the prompt was seen, so runs repeat exactly whatever the
+concurrency. Every setting can also be given in the environment (MOCK_LATENCY, MOCK_LATENCY_DISTRIBUTION, ...).
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+from string import Template
+import libs.general_utils
+from libs.llm_provider import LLMProvider
+from libs.logger import logger
+from libs.resilience import RetryableError
+from libs.response_recorder import prompt_hash
+from libs.token_counter import CHARACTERS_PER_TOKEN
+
+MOCK_PROGRAMS = {
+    "Python": 'print("Hello, World!")',
+    "JavaScript": 'console.log("Hello, World!");',
+    "Ruby": 'puts "Hello, World!"',
+    "Swift": 'print("Hello, World!")',
+    "Scala": 'object Main extends App {\n    println("Hello, World!")\n}',
+    "Kotlin": 'fun main() {\n    println("Hello, World!")\n}',
+    "Java": 'public class Main {\n    public static void main(String[] args) {\n        System.out.println("Hello, World!");\n    }\n}',
+    "C": '#include <stdio.h>\n\nint main() {\n    printf("Hello, World!\\n");\n    return 0;\n}',
+    "C++": '#include <iostream>\n\nint main() {\n    std::cout << "Hello, World!" << std::endl;\n    return 0;\n}',
+    "C#": 'using System;\n\nclass Program {\n    static void Main() {\n        Console.WriteLine("Hello, World!");\n    }\n}',
+    "GO Lang": 'package main\n\nimport "fmt"\n\nfunc main() {\n    fmt.Println("Hello, World!")\n}',
+}
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+def load_mock_responses(path):
+    """
+    Load a JSONL file of {"prompt_hash" or "prompt", "completion"} replay entries and {"pattern", "completion"} canned
+    responses, return (replayed responses by prompt hash, [(compiled pattern, completion template)]).
+    """
+    replayed, canned = {}, []
+    if not path:
+        return replayed, canned
+    try:
+        with open(path) as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if "pattern" in entry:
+                    canned.append((re.compile(entry["pattern"], re.IGNORECASE | re.DOTALL), entry["completion"]))
+                else:
+                    replayed[entry.get("prompt_hash") or prompt_hash(entry["prompt"])] = entry["completion"]
+        logger.info(f"Loaded {len(replayed)} replayed and {len(canned)} canned mock responses from {path}")
+    except (OSError, ValueError, KeyError, re.error) as exception:
+        logger.error(f"Error loading mock responses {path}: {exception}")
+    return replayed, canned
+
+def _env(name, default, cast=str):
+    value = os.getenv(name)
+    return cast(value) if value not in (None, "") else default
+
+class MockProvider(LLMProvider):
+    provider_name = "mock"
+
+    def __init__(self, model="mock-coder", latency=None, jitter=None, failure_rate=None, seed=None, latency_distribution=None,
+                 rate_limit_rate=None, stream_chunk_tokens=None, token_latency=None, responses_path=None):
+        self.model_name = model
+        self.temperature = 0.0
+        self.max_tokens = 0
+        self.latency = latency if latency is not None else _env("MOCK_LATENCY", 0.5, float)
+        self.jitter = jitter if jitter is not None else _env("MOCK_LATENCY_JITTER", 0.0, float)
+        self.latency_distribution = latency_distribution or _env("MOCK_LATENCY_DISTRIBUTION", "uniform")
+        if self.latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution '{self.latency_distribution}', expected one of {', '.join(LATENCY_DISTRIBUTIONS)}.")
+        self.failure_rate = failure_rate if failure_rate is not None else _env("MOCK_FAILURE_RATE", 0.0, float)
+        self.rate_limit_rate = rate_limit_rate if rate_limit_rate is not None else _env("MOCK_RATE_LIMIT_RATE", 0.0, float)
+        self.stream_chunk_tokens = stream_chunk_tokens or _env("MOCK_STREAM_CHUNK_TOKENS", 4, int)
+        self.token_latency = token_latency if token_latency is not None else _env("MOCK_TOKEN_LATENCY", 0.0, float)
+        self.seed = seed if seed is not None else _env("MOCK_SEED", 0, int)
+        self._replayed, self._canned = load_mock_responses(responses_path or os.getenv("MOCK_RESPONSES_PATH"))
+        self._prompt_counts = {}
+        self._lock = threading.Lock()
+        self.utils = libs.general_utils.GeneralUtils()
+
+    def build_generate_prompt(self, code_prompt, code_language):
+        return self.render_generate_prompt(code_prompt, code_language)
+
+    def render_generate_prompt(self, code_prompt, code_language, coding_guidelines=None, code_input=None):
+        return f"Task: Design a program {code_prompt} in {code_language}."
+
+    def generate_code(self, code_prompt, code_language):
+        prompt = self.build_generate_prompt(code_prompt, code_language)
+        return self.utils.extract_code(self.complete(prompt), code_language)
+
+    def fix_generated_code(self, code, code_language, fix_instructions=""):
+        prompt = self.render_prompt("fix", code_language, code=code, fix_instructions=fix_instructions, error=self.previous_error()).text
+        return self.utils.extract_code(self.complete(prompt), code_language)
+
+    def convert_generated_code(self, code, code_language):
+        prompt = self.render_prompt("convert", code_language, code=code).text
+        return self.utils.extract_code(self.complete(prompt), code_language)
+
+    def _random_for(self, prompt):
+        """A random generator determined by the seed, the prompt and how often the prompt was completed before."""
+        key = prompt_hash(prompt)
+        with self._lock:
+            count = self._prompt_counts.get(key, 0)
+            self._prompt_counts[key] = count + 1
+        return random.Random(f"{self.seed}:{key}:{count}")
+
+    def _sample_latency(self, generator):
+        if self.latency_distribution == "fixed":
+            return self.latency
+        if self.latency_distribution == "normal":
+            return max(0.0, generator.gauss(self.latency, self.jitter))
+        if self.latency_distribution == "lognormal":
+            # The latency is the median, the jitter the sigma of the underlying normal distribution.
+            return generator.lognormvariate(0.0, self.jitter) * self.latency
+        if self.latency_distribution == "exponential":
+            return generator.expovariate(1.0 / self.latency) if self.latency > 0 else 0.0
+        return max(0.0, self.latency + generator.uniform(-self.jitter, self.jitter))
+
+    def _simulate_call(self, prompt):
+        generator = self._random_for(prompt)
+        delay = self._sample_latency(generator)
+        outcome = generator.random()
+        time.sleep(delay)
+        if outcome < self.failure_rate:
+            raise RetryableError(f"Mock provider failure after {delay:.2f}s", status_code=503)
+        if outcome < self.failure_rate + self.rate_limit_rate:
+            raise RetryableError(f"Mock provider rate limited after {delay:.2f}s", retry_after=1.0, status_code=429)
+
+    def _program_for(self, prompt):
+        for code_language, program in MOCK_PROGRAMS.items():
+            if f" in {code_language}." in prompt or f" in {code_language} " in prompt or f" the {code_language} programming language" in prompt:
+                return code_language, program
+        return "Python", MOCK_PROGRAMS["Python"]
+
+    def _response_for(self, prompt):
+        replayed = self._replayed.get(prompt_hash(prompt))
+        if replayed is not None:
+            return replayed
+        code_language, program = self._program_for(prompt)
+        for pattern, completion in self._canned:
+            match = pattern.search(prompt)
+            if match:
+                values = {"code_language": code_language, "program": program, **{name: value or "" for name, value in match.groupdict().items()}}
+                return Template(completion).safe_substitute(values)
+        logger.info(f"Mock provider answered with a {code_language} program.")
+        return f"```{code_language.lower()}\n{program}\n```"
+
+    def _complete(self, prompt, **options):
+        self._simulate_call(prompt)
+        return self._response_for(prompt)
+
+    def _stream_complete(self, prompt, **options):
+        self._simulate_call(prompt)
+        completion = self._response_for(prompt)
+        chunk_size = max(1, self.stream_chunk_tokens * CHARACTERS_PER_TOKEN)
+        for start in range(0, len(completion), chunk_size):
+            if self.token_latency:
+                time.sleep(self.token_latency * self.stream_chunk_tokens)
+            yield completion[start:start + chunk_size]
@@ -0,0 +1,142 @@
+"""
+Cheap first model cascade verified by execution.
+
+The prompt is generated with the cheapest model tier of the provider family first. The code is run with
+GeneralUtils.run_code and its output compared with the expected output; only when the check fails the next,
+more expensive tier is asked. Without an expected output a run without errors passes.
+The success rate of every tier is tracked per language, a tier which was tried `min_attempts` times without a
+single success is skipped for that language. The last tier is always tried so the cascade returns an answer.
+"""
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from libs.generation_engine import get_generation_engine
+from libs.logger import logger
+
+DEFAULT_TIERS = {
+    "openai": ["gpt-3.5-turbo", "gpt-4"],
+    "gemini": ["gemini-pro"],
+    "palm": ["text-bison-001"],
+    "vertexai": ["code-bison"],
+    "mock": ["mock-coder"],
+}
+
+@dataclass
+class CascadeResult:
+    code: str
+    model_name: str
+    output: str = None
+    passed: bool = False
+    attempts: list = field(default_factory=list)
+
+class TierStats:
+    def __init__(self, min_attempts=5):
+        self.min_attempts = min_attempts
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, model_name, code_language, passed):
+        with self._lock:
+            stats = self._stats.setdefault((model_name, code_language), {"attempts": 0, "successes": 0})
+            stats["attempts"] += 1
+            stats["successes"] += int(passed)
+
+    def success_rate(self, model_name, code_language):
+        with self._lock:
+            stats = self._stats.get((model_name, code_language))
+        if not stats or not stats["attempts"]:
+            return None
+        return stats["successes"] / stats["attempts"]
+
+    def should_skip(self, model_name, code_language):
+        """Skip tiers which never produced a passing program for the language."""
+        with self._lock:
+            stats = self._stats.get((model_name, code_language))
+        return bool(stats) and stats["attempts"] >= self.min_attempts and stats["successes"] == 0
+
+    def get_stats(self):
+        with self._lock:
+            return {f"{model_name}/{code_language}": dict(stats) for (model_name, code_language), stats in self._stats.items()}
+
+class ModelCascade:
+    def __init__(self, general_utils, tiers=None, tier_stats=None):
+        self.general_utils = general_utils
+        self.tiers = tiers
+        self.tier_stats = tier_stats or get_tier_stats()
+
+    def tiers_for(self, provider):
+        tiers = self.tiers or load_cascade_tiers(provider.provider_name) or [provider.model_name]
+        return [tier for tier in tiers if tier]
+
+    def verify(self, code, code_language, expected_output=None, code_input=None):
+        """Run the code with the input of the task and return (passed, output)."""
+        try:
+            output = self.general_utils.run_code(code, code_language, code_input)
+        except Exception as exception:
+            logger.error(f"Error running the cascade code: {exception}")
+            return False, f"Error: {exception}"
+        if output is None or self.general_utils.is_error_output(output):
+            return False, output
+        if expected_output:
+            return output.strip() == expected_output.strip(), output
+        return True, output
+
+    def _tier_provider(self, provider, model_name):
+        if model_name == provider.model_name:
+            return provider
+        return provider.with_model(model_name)
+
+    async def generate(self, provider, code_prompt, code_language, expected_output=None, code_input=None):
+        """
+        Walk the tiers from the cheapest one and return the CascadeResult of the first verified program,
+        or the program of the last tier tried when none passed.
+        """
+        engine = get_generation_engine()
+        tiers = self.tiers_for(provider)
+        result = None
+        for index, model_name in enumerate(tiers):
+            is_last_tier = index == len(tiers) - 1
+            if not is_last_tier and self.tier_stats.should_skip(model_name, code_language):
+                logger.info(f"Skipping cascade tier {model_name}, it never succeeded for {code_language}")
+                continue
+            tier_provider = self._tier_provider(provider, model_name)
+            if tier_provider is None:
+                logger.warning(f"{provider.provider_name} has no model {model_name}, skipping the cascade tier.")
+                continue
+
+            code = await tier_provider.generate_extracted(code_prompt, code_language)
+            if not code:
+                self.tier_stats.record(model_name, code_language, False)
+                continue
+            passed, output = await engine.submit(self.verify, code, code_language, expected_output, code_input)
+            self.tier_stats.record(model_name, code_language, passed)
+            attempts = (result.attempts if result else []) + [model_name]
+            result = CascadeResult(code=code, model_name=model_name, output=output, passed=passed, attempts=attempts)
+            logger.info(f"Cascade tier {model_name} {'passed' if passed else 'failed'} for {code_language}")
+            if passed:
+                return result
+        return result
+
+_tier_stats = None
+_tier_stats_lock = threading.Lock()
+
+def get_tier_stats():
+    """Return the process wide cascade tier statistics, creating them on first use."""
+    global _tier_stats
+    with _tier_stats_lock:
+        if _tier_stats is None:
+            _tier_stats = TierStats(min_attempts=int(os.getenv("CASCADE_MIN_ATTEMPTS", 5)))
+        return _tier_stats
+
+def load_cascade_tiers(provider_name):
+    """Tiers configured in CASCADE_TIERS ({"openai": ["gpt-3.5-turbo", "gpt-4"]}) or the defaults."""
+    configured_tiers = os.getenv("CASCADE_TIERS")
+    if configured_tiers:
+        try:
+            tiers = json.loads(configured_tiers).get(provider_name)
+            if tiers:
+                return tiers
+        except ValueError as exception:
+            logger.error(f"Error parsing CASCADE_TIERS: {exception}")
+    return DEFAULT_TIERS.get(provider_name, [])
@@ -5,40 +5,35 @@ from dotenv import load_dotenv
 from libs.logger import logger
 import streamlit as st
 import libs.general_utils
+from libs.generation_engine import get_generation_engine
+from libs.geminiai import configure_google_ai, google_ai_key, sampling_options
+from libs.llm_provider import LLMProvider
+from libs.budget import get_budget_controller
+from libs.resilience import get_resilience_manager
+from libs.usage_meter import reset_reported_usage
+
+# The Palm API returns at most 8 candidates per request.
+MAX_CANDIDATE_COUNT = 8
+
+class PalmAI(LLMProvider):
+    provider_name = "palm"
+    generate_task = "generate_expert"
 
-class PalmAI:
     def __init__(self,api_key, model="text-bison-001", temperature=0.3, max_output_tokens=2048, mode="balanced"):
         """
         Initialize the PalmAI class with the given parameters.
         """
         self.model = "models/" + model
+        self.model_name = model
         self.temperature = temperature
         self.max_output_tokens = max_output_tokens
+        self.max_tokens = max_output_tokens
         self.mode = mode
         self.api_key = None
         self.top_k = 20
         self.top_p = 0.85
         self._configure_api(api_key)
         self.utils = libs.general_utils.GeneralUtils()
-        
-        # Dynamically construct guidelines based on session state
-        self.guidelines_list = []
-
-        if st.session_state["coding_guidelines"]["modular_code"]:
-            self.guidelines_list.append("- Ensure the method is modular in its approach.")
-        if st.session_state["coding_guidelines"]["exception_handling"]:
-            self.guidelines_list.append("- Integrate robust exception handling.")
-        if st.session_state["coding_guidelines"]["error_handling"]:
-            self.guidelines_list.append("- Add error handling to each module.")
-        if st.session_state["coding_guidelines"]["efficient_code"]:
-            self.guidelines_list.append("- Optimize the code to ensure it runs efficiently.")
-        if st.session_state["coding_guidelines"]["robust_code"]:
-            self.guidelines_list.append("- Ensure the code is robust against potential issues.")
-        if st.session_state["coding_guidelines"]["naming_conventions"]:
-            self.guidelines_list.append("- Follow standard naming conventions.")
-
-        # Convert the list to a string
-        self.guidelines = "\n".join(self.guidelines_list)
 
     def _configure_api(self,api_key=None):
         """
@@ -56,7 +51,7 @@ class PalmAI:
             else:
                 self.api_key = api_key
                 st.toast("API key provided from settings.", icon="✅")
-            palm.configure(api_key=self.api_key)
+            configure_google_ai(self.api_key)
             logger.info("Palm API configured successfully.")
         except Exception as exception:
             logger.error(f"Error occurred while configuring Palm API: {exception}")
@@ -67,23 +62,8 @@ class PalmAI:
         Function to generate text using the palm API.
         """
         try:
-            # Define top_k and top_p based on the mode
-            if self.mode == "precise":
-                top_k = 40
-                top_p = 0.95
-                self.temprature = 0
-            elif self.mode == "balanced":
-                top_k = 20
-                top_p = 0.85
-                self.temprature = 0.3
-            elif self.mode == "creative":
-                top_k = 10
-                top_p = 0.75
-                self.temprature = 1
-            else:
-                raise ValueError("Invalid mode. Choose from 'precise', 'balanced', 'creative'.")
-
-            logger.info(f"Generating code with mode: {self.mode}, top_k: {top_k}, top_p: {top_p}")
+            generate_options = self.generate_options()
+            logger.info(f"Generating code with mode: {self.mode}, top_k: {generate_options['top_k']}, top_p: {generate_options['top_p']}")
 
             
             # check for valid prompt and language
@@ -97,42 +77,21 @@ class PalmAI:
                 logger.info(f"Generating code for prompt: {code_prompt} in language: {code_language}")
                 
             # Plain and Simple Coding Task Prompt
-            prompt = f"""
-            Task: You're an experienced developer. Your mission is to create a program for {code_prompt} in {code_language} that takes {st.session_state.code_input} as input.
-
-            Your goal is clear: Craft a solution that showcases your expertise as a coder and problem solver.
-
-            Ensure that the program's output contains only the code you've written, with no extraneous information.
-
-            Show your skills and solve this challenge with confidence!
-            
-            And follow the proper coding guidelines and dont add comment unless instructed to do so.
-            {self.guidelines}
-            """
+            prompt = self.build_generate_prompt(code_prompt, code_language)
             
-            palm_completion = palm.generate_text(
-                model=self.model,
-                prompt=prompt,
-                candidate_count=4,
-                temperature=self.temperature,
-                max_output_tokens=self.max_output_tokens,
-                top_k=top_k,
-                top_p=top_p,
-                stop_sequences=[],
-                #safety_settings=[{"category":"HARM_CATEGORY_DEROGATORY","threshold":1},{"category":"HARM_CATEGORY_TOXICITY","threshold":1},{"category":"HARM_CATEGORY_VIOLENCE","threshold":2},{"category":"HARM_CATEGORY_SEXUAL","threshold":2},{"category":"HARM_CATEGORY_MEDICAL","threshold":2},{"category":"HARM_CATEGORY_DANGEROUS","threshold":2}],
-            )
+            palm_completion = self.complete(prompt, **generate_options)
             logger.info("Text generation completed successfully.")
             
             code = None
             if palm_completion:
                 # extract the code from the palm completion
-                code = palm_completion.result
+                code = palm_completion
                 logger.info(f"Palm coder is initialized.")
                 logger.info(f"Generated code: {code[:100]}...")
             
             if palm_completion:
                 # Extracted code from the palm completion
-                extracted_code = self.utils.extract_code(code)
+                extracted_code = self.utils.extract_code(code, code_language)
                 
                 # Check if the code or extracted code is not empty or null
                 if not code or not extracted_code:
@@ -146,6 +105,13 @@ class PalmAI:
             st.toast(f"Error in code generation: {exception}", icon="❌")
             logger.error(f"Error in code generation: {traceback.format_exc()}")
 
+    def generate_options(self):
+        """
+        Define top_k and top_p based on the mode.
+        """
+        # Only the first candidate is used, best-of-n asks for several with acomplete_candidates.
+        return {**sampling_options(self.mode), "candidate_count": 1}
+
     def fix_generated_code(self, code, code_language, fix_instructions=""):
         """
         Function to fix the generated code using the palm API.
@@ -160,53 +126,25 @@ class PalmAI:
             if code and len(code) > 0:
                 logger.info(f"Fixing code {code[:100]}... in language {code_language} and error is {st.session_state.stderr}")
                 
-                # Improved instructions template
-                template = f"""
-                Task: Correct the code snippet provided below in the {code_language} programming language, following the given instructions {fix_instructions}
-
-                {code}
-
-                Instructions for Fixing:
-                1. Identify and rectify any syntax errors, logical issues, or bugs in the code.
-                2. Ensure that the code produces the desired output.
-                3. Comment on each line where you make changes, explaining the nature of the fix.
-                4. Verify that the corrected code is displayed in the output.
-
-                Please make sure that the fixed code is included in the output, along with comments detailing the modifications made.
-                """
-
                 # If there was an error in the previous execution, include it in the prompt
                 if st.session_state.stderr:
                     logger.info(f"Error in previous execution: {st.session_state.stderr}")
                     st.toast(f"Error in previous execution: {st.session_state.stderr}", icon="❌")
-                    template += f"\nFix the following error: {st.session_state.output}"
-                    
-                    # Check if the error indicates a missing or unavailable module
-                    error_message = st.session_state.output.lower()  # Convert to lowercase for case-insensitive matching
-
                 else:
                     st.toast("No error in previous execution.", icon="✅")
                     return code
 
                 # Prompt Templates
-                code_template = template
+                code_template = self.render_prompt("fix", code_language, code=code, fix_instructions=fix_instructions, error=st.session_state.output).text
                 
                 # LLM Chains definition
                 # Create a chain that generates the code
-                palm_completion = palm.generate_text(
-                    model=self.model,
-                    prompt=code_template,
-                    temperature=self.temperature,
-                    max_output_tokens=self.max_output_tokens,
-                    top_k=self.top_k,
-                    top_p=self.top_p,
-                    stop_sequences=[]
-                )
+                palm_completion = self.complete(code_template)
 
                 if palm_completion:
                     # Extracted code from the palm completion
-                    code = palm_completion.result
-                    extracted_code = self.utils.extract_code(code)
+                    code = palm_completion
+                    extracted_code = self.utils.extract_code(code, code_language)
                     
                     # Check if the code or extracted code is not empty or null
                     if not code or not extracted_code:
@@ -236,39 +174,17 @@ class PalmAI:
             if code and len(code) > 0:
                 logger.info(f"Converting code {code[:100]}... to language {code_language}")
                 
-                # Improved instructions template
-                template = f"""
-                Task: Convert the code snippet provided below to the {code_language} programming language, following the given instructions:
-
-                {code}
-
-                Instructions for Conversion:
-                1. Identify the functionality of the original code.
-                2. Translate the code into the {code_language} programming language, maintaining the same functionality.
-                3. Verify that the converted code is displayed in the output.
-
-                Please make sure only the converted code should be included in the output.
-                """
-
                 # Prompt Templates
-                code_template = template
+                code_template = self.render_prompt("convert", code_language, code=code).text
                 
                 # LLM Chains definition
                 # Create a chain that generates the code
-                palm_completion = palm.generate_text(
-                    model=self.model,
-                    prompt=code_template,
-                    temperature=self.temperature,
-                    max_output_tokens=self.max_output_tokens,
-                    top_k=self.top_k,
-                    top_p=self.top_p,
-                    stop_sequences=[]
-                )
+                palm_completion = self.complete(code_template)
 
                 if palm_completion:
                     # Extracted code from the palm completion
-                    code = palm_completion.result
-                    extracted_code = self.utils.extract_code(code)
+                    code = palm_completion
+                    extracted_code = self.utils.extract_code(code, code_language)
                     
                     # Check if the code or extracted code is not empty or null
                     if not code or not extracted_code:
@@ -281,4 +197,62 @@ class PalmAI:
                 logger.error("Error in code conversion: Please enter a valid code and language.")
         except Exception as exception:
             st.toast(f"Error in code conversion: {exception}", icon="❌")
-            logger.error(f"Error in code conversion: {traceback.format_exc()}")
\ No newline at end of file
+            logger.error(f"Error in code conversion: {traceback.format_exc()}")
+
+    def _complete(self, prompt, top_k=None, top_p=None, candidate_count=1, **options):
+        with google_ai_key(self.api_key):
+            palm_completion = palm.generate_text(
+                model=self.model,
+                prompt=prompt,
+                candidate_count=candidate_count,
+                temperature=self.temperature,
+                max_output_tokens=self.max_output_tokens,
+                top_k=top_k or self.top_k,
+                top_p=top_p or self.top_p,
+                stop_sequences=[],
+                #safety_settings=[{"category":"HARM_CATEGORY_DEROGATORY","threshold":1},{"category":"HARM_CATEGORY_TOXICITY","threshold":1},{"category":"HARM_CATEGORY_VIOLENCE","threshold":2},{"category":"HARM_CATEGORY_SEXUAL","threshold":2},{"category":"HARM_CATEGORY_MEDICAL","threshold":2},{"category":"HARM_CATEGORY_DANGEROUS","threshold":2}],
+            )
+        return palm_completion.result if palm_completion else None
+
+    async def acomplete_candidates(self, prompt, count, **options):
+        # Palm returns up to 8 candidates from a single request, larger counts are split into several requests.
+        engine = get_generation_engine()
+        batch_sizes = [min(MAX_CANDIDATE_COUNT, count - start) for start in range(0, count, MAX_CANDIDATE_COUNT)]
+        batches = await engine.gather(
+            *[engine.submit(self._fetch_candidates, prompt, **dict(options, candidate_count=batch_size)) for batch_size in batch_sizes],
+            return_exceptions=True,
+        )
+        candidates = []
+        for batch in batches:
+            if isinstance(batch, Exception):
+                logger.error(f"Error sampling candidates from {self.provider_name}: {batch}")
+            else:
+                candidates.extend(batch)
+        return candidates
+
+    def _fetch_candidates(self, prompt, **options):
+        # The request may be downgraded to a cheaper model when the worst case of all candidates exceeds the budget.
+        candidate_count = options.get("candidate_count", 1)
+        with get_budget_controller().admit(self, prompt, completions=candidate_count) as provider:
+            provider.acquire_rate_limit(prompt, completions=candidate_count)
+            reset_reported_usage()
+            candidates = get_resilience_manager().call(provider.circuit_name, provider._complete_candidates, prompt, **options)
+            # Every candidate is billed as output.
+            provider.record_usage(prompt, "".join(candidates))
+        return candidates
+
+    def _complete_candidates(self, prompt, top_k=None, top_p=None, candidate_count=4, **options):
+        with google_ai_key(self.api_key):
+            palm_completion = palm.generate_text(
+                model=self.model,
+                prompt=prompt,
+                candidate_count=candidate_count,
+                temperature=self.temperature,
+                max_output_tokens=self.max_output_tokens,
+                top_k=top_k or self.top_k,
+                top_p=top_p or self.top_p,
+                stop_sequences=[],
+            )
+        if not palm_completion:
+            return []
+        return [candidate["output"] for candidate in palm_completion.candidates if candidate.get("output")]
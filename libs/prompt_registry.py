@@ -0,0 +1,257 @@
+"""
+Prompt template registry shared by all the providers.
+
+Every prompt used by the providers is registered here once. A template is compiled for each combination of
+task type, code language, coding guidelines (as a bitmask) and input mode: the static part is rendered and
+split into literal segments and the remaining per request fields, then memoized. Rendering a request is a
+single join of those segments, the request values are never parsed so code snippets containing braces are
+safe. Each compiled template has a stable hash which is used as a cache namespace, and each rendered prompt
+reports its hash and token count.
+"""
+import hashlib
+import re
+import threading
+from dataclasses import dataclass
+from libs.logger import logger
+from libs.token_counter import count_tokens
+
+# Order matters, the position of a guideline is its bit in the mask.
+GUIDELINES = (
+    ("modular_code", "- Ensure the method is modular in its approach."),
+    ("exception_handling", "- Integrate robust exception handling."),
+    ("error_handling", "- Add error handling to each module."),
+    ("efficient_code", "- Optimize the code to ensure it runs efficiently."),
+    ("robust_code", "- Ensure the code is robust against potential issues."),
+    ("naming_conventions", "- Follow standard naming conventions."),
+)
+
+INPUT_SECTIONS = {
+    "given": "Given the input for code: {code_input}",
+    "none": "make sure the program doesn't ask for any input from the user",
+}
+
+TEMPLATES = {
+    # Used by Open AI and Vertex AI.
+    "generate": """
+Task: Design a program {code_prompt} in {code_language} with the following guidelines and
+make sure the output is printed on the screen.
+And make sure the output contains only the code and nothing else.
+{input_section}
+
+Guidelines:
+{guidelines}
+""",
+    # Used by Gemini AI and Palm AI.
+    "generate_expert": """
+Task: You're an experienced developer. Your mission is to create a program for {code_prompt} in {code_language} that takes {code_input} as input.
+
+Your goal is clear: Craft a solution that showcases your expertise as a coder and problem solver.
+
+Ensure that the program's output contains only the code you've written, with no extraneous information.
+
+Show your skills and solve this challenge with confidence!
+
+And follow the proper coding guidelines and dont add comment unless instructed to do so.
+{guidelines}
+""",
+    "fix": """
+Task: Correct the code snippet provided below in the {code_language} programming language, following the given instructions {fix_instructions}
+
+{code}
+
+Conversation so far, for context:
+{history}
+
+Instructions for Fixing:
+1. Identify and rectify any syntax errors, logical issues, or bugs in the code.
+2. Ensure that the code produces the desired output.
+3. Comment on each line where you make changes, explaining the nature of the fix.
+4. Verify that the corrected code is displayed in the output.
+
+Please make sure that the fixed code is included in the output, along with comments detailing the modifications made.
+
+Fix the following error: {error}""",
+    "convert": """
+Task: Convert the code snippet provided below to the {code_language} programming language, following the given instructions:
+
+{code}
+
+Conversation so far, for context:
+{history}
+
+Instructions for Conversion:
+1. Identify the functionality of the original code.
+2. Translate the code into the {code_language} programming language, maintaining the same functionality.
+3. Verify that the converted code is displayed in the output.
+
+Please make sure only the converted code should be included in the output.
+""",
+    # Used for one part of a large file, see libs/chunked_pipeline.py.
+    "fix_chunk": """
+Task: Correct part {chunk_number} of {chunk_count} of a larger program in the {code_language} programming language, following the given instructions {fix_instructions}
+
+Imports and signatures of the whole program, for reference only:
+{context}
+
+Part to fix:
+{code}
+
+Instructions for Fixing:
+1. Identify and rectify any syntax errors, logical issues, or bugs in this part only.
+2. Keep the names used by the other parts unchanged.
+3. If this part is not related to the error, return it unchanged.
+
+Please make sure only the code of this part is included in the output.
+
+Fix the following error: {error}""",
+    "convert_chunk": """
+Task: Convert part {chunk_number} of {chunk_count} of a larger program to the {code_language} programming language.
+
+Imports and signatures of the whole program, for reference only, do not convert them:
+{context}
+
+Part to convert:
+{code}
+
+Instructions for Conversion:
+1. Translate only this part into the {code_language} programming language, maintaining the same functionality.
+2. Keep the names used by the other parts and put the imports this part needs at its top.
+
+Please make sure only the converted code of this part is included in the output.
+""",
+    # Used to fold old turns into the rolling summary, see libs/conversation_memory.py.
+    "summarize": """
+Task: Update the summary of a coding conversation with the turns below.
+
+Current summary:
+{summary}
+
+Turns to add:
+{turns}
+
+Keep the requirements, the decisions taken, the errors met and how they were fixed, drop the code itself.
+Reply only with the updated summary in at most {summary_tokens} tokens.
+""",
+    # Used to repair the failing region of a long program, see libs/targeted_repair.py.
+    "repair": """
+Task: Fix the error in the {code_language} program {file_name}, following the given instructions {fix_instructions}
+Only lines {start_line} to {end_line} of the program are shown, the error is in these lines.
+
+{excerpt}
+
+Error: {error}
+
+Reply only with a unified diff of {file_name} which fixes the error, using the line numbers of the whole program, for example:
+--- a/{file_name}
++++ b/{file_name}
+@@ -12,3 +12,3 @@
+ unchanged line
+-old line
++new line
+ unchanged line
+
+Keep the changes as small as possible and don't repeat any code outside the hunks.
+""",
+}
+
+_FIELD_PATTERN = re.compile(r"\{(\w+)\}")
+
+def guideline_mask(coding_guidelines):
+    """Pack the enabled coding guidelines into a bitmask."""
+    coding_guidelines = coding_guidelines or {}
+    return sum(1 << bit for bit, (name, _) in enumerate(GUIDELINES) if coding_guidelines.get(name))
+
+def guidelines_text(mask):
+    return "\n".join(text for bit, (_, text) in enumerate(GUIDELINES) if mask & (1 << bit))
+
+@dataclass(frozen=True)
+class CompiledPrompt:
+    task_type: str
+    segments: tuple
+    fields: tuple
+    static_hash: str
+
+    def render(self, values):
+        # Even positions are literal text, odd positions are field names.
+        return "".join(segment if index % 2 == 0 else str(values.get(segment)) for index, segment in enumerate(self.segments))
+
+@dataclass(frozen=True)
+class RenderedPrompt:
+    text: str
+    prompt_hash: str
+    static_hash: str
+    token_count: int
+
+class PromptRegistry:
+    def __init__(self, templates=None):
+        self._templates = dict(templates or TEMPLATES)
+        self._compiled = {}
+        self._lock = threading.Lock()
+        self.stats = {"compiled": 0, "hits": 0}
+
+    def register(self, task_type, template):
+        with self._lock:
+            self._templates[task_type] = template
+            self._compiled = {key: compiled for key, compiled in self._compiled.items() if key[0] != task_type}
+
+    def get_template(self, task_type):
+        return self._templates[task_type]
+
+    def compile(self, task_type, code_language, mask=0, input_mode="none"):
+        """Return the memoized CompiledPrompt of the combination, compiling it on first use."""
+        key = (task_type, code_language, mask, input_mode)
+        with self._lock:
+            compiled = self._compiled.get(key)
+            if compiled is not None:
+                self.stats["hits"] += 1
+                return compiled
+
+            static_values = {
+                "code_language": code_language,
+                "guidelines": guidelines_text(mask),
+                "input_section": INPUT_SECTIONS[input_mode],
+            }
+            # The input section carries a field of its own, so it is substituted first.
+            template = self._templates[task_type].replace("{input_section}", static_values["input_section"])
+            template = _FIELD_PATTERN.sub(lambda match: static_values.get(match.group(1), match.group(0)), template)
+            segments = tuple(_FIELD_PATTERN.split(template))
+            compiled = CompiledPrompt(
+                task_type=task_type,
+                segments=segments,
+                fields=segments[1::2],
+                static_hash=hashlib.sha256(template.encode("utf-8")).hexdigest(),
+            )
+            self._compiled[key] = compiled
+            self.stats["compiled"] += 1
+            logger.info(f"Compiled {task_type} prompt for {code_language} with guidelines mask {mask} and input mode {input_mode}")
+            return compiled
+
+    def compile_for(self, task_type, code_language, coding_guidelines=None, code_input=None):
+        return self.compile(task_type, code_language, guideline_mask(coding_guidelines), "given" if code_input else "none")
+
+    def render(self, task_type, code_language, coding_guidelines=None, code_input=None, model_name=None, **values):
+        """
+        Render a prompt for one request and return a RenderedPrompt with its hash and token count.
+        """
+        compiled = self.compile_for(task_type, code_language, coding_guidelines, code_input)
+        values["code_input"] = code_input
+        text = compiled.render(values)
+        rendered = RenderedPrompt(
+            text=text,
+            prompt_hash=hashlib.sha256(text.encode("utf-8")).hexdigest(),
+            static_hash=compiled.static_hash,
+            token_count=count_tokens(text, model_name),
+        )
+        logger.info(f"Rendered {task_type} prompt {rendered.prompt_hash[:12]} with {rendered.token_count} tokens")
+        return rendered
+
+_prompt_registry = None
+_prompt_registry_lock = threading.Lock()
+
+def get_prompt_registry():
+    """Return the process wide prompt registry, creating it on first use."""
+    global _prompt_registry
+    with _prompt_registry_lock:
+        if _prompt_registry is None:
+            _prompt_registry = PromptRegistry()
+        return _prompt_registry
@@ -0,0 +1,136 @@
+"""
+Worker process of the warm Python pool, see libs/python_worker_pool.py.
+
+Started with the interpreter the programs are run with, so it only uses the standard library. It imports the
+preloaded modules once and then reads one JSON job per line ({"code", "stdin", "timeout"}) and answers with one
+JSON line ({"output", "timed_out"}). The worker never runs a program itself: it forks once per job and the child
+runs the program like `python main.py` would, with real file descriptors 0, 1 and 2 on temporary files, a fresh
+__main__ module and its own process group. Whatever the program changes (the working directory, builtins, fds,
+imported modules) dies with the child, and the output of subprocesses it starts is captured as well. The output is
+stdout followed by stderr, like the separate pipes of a `subprocess.run` call give. A program running longer than
+its timeout, when the job has one, is killed together with its process group. The protocol runs over duplicates of the original stdin
+and stdout, which the child closes before the program starts.
+"""
+import atexit
+import importlib
+import json
+import linecache
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import types
+
+def run_program(code):
+    """Run the program in this (forked) process and return its exit status, like the interpreter would."""
+    module = types.ModuleType("__main__")
+    module.__file__ = "main.py"
+    sys.modules["__main__"] = module
+    sys.argv = ["main.py"]
+    # The program directory comes first on the path, as for a script run from a temp file.
+    sys.path[0] = tempfile.gettempdir()
+    # Tracebacks show the source lines of the program as they would for a file.
+    linecache.cache["main.py"] = (len(code), None, code.splitlines(True), "main.py")
+    status = 0
+    try:
+        exec(compile(code, "main.py", "exec"), module.__dict__)
+    except SystemExit as exit_request:
+        if exit_request.code is None:
+            status = 0
+        elif isinstance(exit_request.code, int):
+            status = exit_request.code
+        else:
+            print(exit_request.code, file=sys.stderr)
+            status = 1
+    except BaseException:
+        exception_type, exception, exception_traceback = sys.exc_info()
+        # Drop the frame of this function, the traceback starts in the program like it would in its own process.
+        traceback.print_exception(exception_type, exception, exception_traceback.tb_next if exception_traceback else None)
+        status = 1
+    # The interpreter waits for non daemon threads and runs the exit handlers before it exits.
+    for thread in threading.enumerate():
+        if thread is not threading.main_thread() and not thread.daemon:
+            thread.join()
+    atexit._run_exitfuncs()
+    return status
+
+def run_child(code, stdin_file, stdout_file, stderr_file, protocol_fds):
+    os.setsid()
+    for protocol_fd in protocol_fds:
+        os.close(protocol_fd)
+    os.dup2(stdin_file.fileno(), 0)
+    os.dup2(stdout_file.fileno(), 1)
+    os.dup2(stderr_file.fileno(), 2)
+    sys.stdin = sys.__stdin__ = open(0, "r", closefd=False)
+    sys.stdout = sys.__stdout__ = open(1, "w", closefd=False)
+    sys.stderr = sys.__stderr__ = open(2, "w", closefd=False)
+    status = 1
+    try:
+        status = run_program(code)
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except Exception:
+                pass
+        os._exit(status & 0xFF)
+
+def wait_child(pid, timeout):
+    """Wait for the child, kill its process group after the timeout, if any. Returns True when it timed out."""
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    delay = 0.0002
+    while True:
+        finished_pid, _ = os.waitpid(pid, os.WNOHANG)
+        if finished_pid:
+            return False
+        if deadline is not None and time.monotonic() >= deadline:
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            os.waitpid(pid, 0)
+            return True
+        time.sleep(delay)
+        delay = min(delay * 2, 0.01)
+
+def run_job(code, stdin, timeout, protocol_fds):
+    with tempfile.TemporaryFile() as stdin_file, tempfile.TemporaryFile() as stdout_file, tempfile.TemporaryFile() as stderr_file:
+        stdin_file.write(stdin.encode("utf-8"))
+        stdin_file.seek(0)
+        pid = os.fork()
+        if pid == 0:
+            run_child(code, stdin_file, stdout_file, stderr_file, protocol_fds)
+        timed_out = wait_child(pid, timeout)
+        outputs = []
+        for output_file in (stdout_file, stderr_file):
+            output_file.seek(0)
+            outputs.append(output_file.read().decode("utf-8", errors="replace"))
+    return "".join(outputs), timed_out
+
+def main():
+    protocol_in = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    protocol_out = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    null_device = os.open(os.devnull, os.O_RDWR)
+    os.dup2(null_device, 0)
+    os.dup2(null_device, 1)
+    protocol_fds = (protocol_in.fileno(), protocol_out.fileno())
+
+    for module_name in sys.argv[1:]:
+        try:
+            importlib.import_module(module_name)
+        except ImportError:
+            pass
+    protocol_out.write(json.dumps({"ready": True}) + "\n")
+    protocol_out.flush()
+
+    for line in protocol_in:
+        job = json.loads(line)
+        output, timed_out = run_job(job["code"], job.get("stdin") or "", job.get("timeout"), protocol_fds)
+        protocol_out.write(json.dumps({"output": output, "timed_out": timed_out}) + "\n")
+        protocol_out.flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Pool of warm Python worker processes for offline execution.
+
+Running a Python program used to write a temp file and start a fresh interpreter for every execution, which pays
+the interpreter startup and the stdlib imports each time although most programs are short snippets. The pool
+keeps PYTHON_WORKER_POOL_SIZE interpreters running libs/python_worker.py, started ahead of time with the common
+modules already imported, and hands every program to an idle one. The worker forks the warm interpreter once per
+program, so every program starts from the same clean state and behaves like its own `python main.py` process. A
+program running longer than the timeout of its run, if any, is killed by the worker. Workers are replaced after
+PYTHON_WORKER_MAX_RUNS programs and when they stop answering, replacements are started in the background. A pool
+size of 0, or a platform without fork, turns the pool off and every program gets its own interpreter again.
+"""
+import json
+import os
+import queue
+import subprocess
+import threading
+import time
+from libs.logger import logger
+from libs.toolchain_registry import get_toolchain_registry
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python_worker.py")
+# Extra time the worker gets to kill a program and answer before it is given up on.
+ANSWER_GRACE_SECONDS = 10
+# Imported by every worker before its first program.
+DEFAULT_PRELOAD = ("collections", "datetime", "functools", "itertools", "json", "math", "random", "re", "string", "typing")
+
+class WorkerError(Exception):
+    pass
+
+class PythonWorker:
+    def __init__(self, python_path, preload):
+        self.runs = 0
+        self.process = subprocess.Popen(
+            [python_path, "-u", WORKER_SCRIPT, *preload],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, encoding="utf-8",
+        )
+
+    def _read_message(self, timeout):
+        message = []
+        reader = threading.Thread(target=lambda: message.append(self.process.stdout.readline()), daemon=True)
+        reader.start()
+        reader.join(timeout)
+        if reader.is_alive():
+            self.kill()
+            raise TimeoutError
+        if not message or not message[0]:
+            raise WorkerError("The Python worker exited unexpectedly.")
+        return json.loads(message[0])
+
+    def wait_ready(self, timeout):
+        self._read_message(timeout)
+
+    def run(self, code, stdin, timeout):
+        """Return (output, timed out) of the program, the worker kills it after the timeout, if any."""
+        self.runs += 1
+        try:
+            self.process.stdin.write(json.dumps({"code": code, "stdin": stdin, "timeout": timeout}) + "\n")
+            self.process.stdin.flush()
+        except OSError as exception:
+            raise WorkerError(f"The Python worker exited unexpectedly: {exception}")
+        answer = self._read_message(timeout + ANSWER_GRACE_SECONDS if timeout is not None else None)
+        return answer["output"], answer["timed_out"]
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+
+class PythonWorkerPool:
+    def __init__(self, size=2, max_runs=50, preload=DEFAULT_PRELOAD, startup_timeout=30):
+        self.size = size
+        self.max_runs = max_runs
+        self.preload = preload
+        self.startup_timeout = startup_timeout
+        self._idle = queue.Queue()
+        self.stats = {"runs": 0, "timeouts": 0, "crashes": 0, "recycled": 0}
+        self._stats_lock = threading.Lock()
+
+    def start(self):
+        """Start all workers in the background, programs can be submitted right away."""
+        for _ in range(self.size):
+            self._replace()
+        return self
+
+    def _spawn(self):
+        python_path = get_toolchain_registry().get("python").path or "python"
+        started = time.perf_counter()
+        worker = PythonWorker(python_path, self.preload)
+        try:
+            worker.wait_ready(self.startup_timeout)
+        except (TimeoutError, WorkerError, ValueError) as exception:
+            worker.kill()
+            raise WorkerError(f"The Python worker did not start: {exception}")
+        logger.info(f"Started a Python worker in {time.perf_counter() - started:.2f}s")
+        return worker
+
+    def _replace(self):
+        def spawn():
+            try:
+                self._idle.put(self._spawn())
+            except (OSError, WorkerError) as exception:
+                logger.error(f"Error starting a Python worker: {exception}")
+                # Unblocks one waiting run, which then starts its own worker.
+                self._idle.put(None)
+        threading.Thread(target=spawn, name="python-worker-spawn", daemon=True).start()
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def run(self, code, stdin=None, timeout=None):
+        """
+        Run the program on a warm worker, return its stdout followed by its stderr. It is killed after `timeout`
+        seconds, a timeout of None lets it run until it exits. Raises WorkerError when no worker starts.
+        """
+        worker = self._idle.get()
+        if worker is None:
+            try:
+                worker = self._spawn()
+            except (OSError, WorkerError):
+                # Keep the slot, the next run tries again.
+                self._replace()
+                raise
+        self._count("runs")
+        try:
+            output, timed_out = worker.run(code, stdin, timeout)
+        except TimeoutError:
+            self._count("crashes")
+            self._replace()
+            return f"Error: the program did not finish within {timeout} seconds."
+        except (WorkerError, ValueError, KeyError) as exception:
+            self._count("crashes")
+            worker.kill()
+            self._replace()
+            return f"Error: {exception}"
+        if worker.runs >= self.max_runs:
+            self._count("recycled")
+            worker.kill()
+            self._replace()
+        else:
+            self._idle.put(worker)
+        if timed_out:
+            self._count("timeouts")
+            return output + f"\nError: the program did not finish within {timeout} seconds."
+        return output
+
+    def get_stats(self):
+        with self._stats_lock:
+            return {**self.stats, "size": self.size, "idle": self._idle.qsize()}
+
+_python_worker_pool = None
+_python_worker_pool_lock = threading.Lock()
+
+def get_python_worker_pool():
+    """Return the process wide Python worker pool, starting its workers on first use, None when it is turned off."""
+    global _python_worker_pool
+    with _python_worker_pool_lock:
+        if _python_worker_pool is None:
+            size = int(os.getenv("PYTHON_WORKER_POOL_SIZE", 2))
+            # The workers fork once per program, which needs a POSIX system.
+            if size <= 0 or not hasattr(os, "fork"):
+                return None
+            _python_worker_pool = PythonWorkerPool(
+                size=size,
+                max_runs=int(os.getenv("PYTHON_WORKER_MAX_RUNS", 50)),
+            ).start()
+        return _python_worker_pool
@@ -0,0 +1,105 @@
+"""
+Token bucket rate limiting of the provider calls.
+
+Each provider and API key pair gets two buckets, one for requests per minute and one for tokens per minute,
+so a burst of requests queues locally instead of running into the provider 429 responses. The token cost of a
+request is its estimated prompt tokens plus the completion budget (max tokens), as the providers count it.
+Limits are read from RATE_LIMIT_RPM/RATE_LIMIT_TPM and can be overridden per provider, e.g. OPENAI_RATE_LIMIT_RPM.
+"""
+import os
+import threading
+import time
+from libs.logger import logger
+
+class RateLimitTimeout(Exception):
+    """The request could not get its share of the rate limit within the timeout."""
+
+class TokenBucket:
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity or rate_per_minute)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def reserve(self, amount):
+        """
+        Take `amount` tokens and return how many seconds the caller has to wait before they are available.
+        Reservations may drive the bucket negative, so waiters are served in the order they arrived.
+        """
+        # A request larger than the bucket would never fit, it only has to wait for a full bucket.
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def refund(self, amount):
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + min(amount, self.capacity))
+
+class RateLimiter:
+    def __init__(self, requests_per_minute=60, tokens_per_minute=90000, max_wait=120.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_wait = max_wait
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "throttled": 0, "waited_seconds": 0.0}
+
+    def _limits_for(self, provider_name):
+        prefix = f"{provider_name.upper()}_" if provider_name else ""
+        requests_per_minute = float(os.getenv(f"{prefix}RATE_LIMIT_RPM", self.requests_per_minute))
+        tokens_per_minute = float(os.getenv(f"{prefix}RATE_LIMIT_TPM", self.tokens_per_minute))
+        return requests_per_minute, tokens_per_minute
+
+    def _get_buckets(self, provider_name, key):
+        with self._lock:
+            if key not in self._buckets:
+                requests_per_minute, tokens_per_minute = self._limits_for(provider_name)
+                self._buckets[key] = (TokenBucket(requests_per_minute), TokenBucket(tokens_per_minute))
+            return self._buckets[key]
+
+    def acquire(self, provider_name, key, tokens):
+        """
+        Block until one request and `tokens` tokens are available for the key.
+        Raises RateLimitTimeout without consuming anything when the wait would exceed max_wait.
+        """
+        request_bucket, token_bucket = self._get_buckets(provider_name, key)
+        wait = max(request_bucket.reserve(1), token_bucket.reserve(tokens))
+        if wait > self.max_wait:
+            request_bucket.refund(1)
+            token_bucket.refund(tokens)
+            raise RateLimitTimeout(f"Rate limit of {key} would delay the request by {wait:.0f}s.")
+
+        with self._lock:
+            self.stats["requests"] += 1
+            if wait > 0:
+                self.stats["throttled"] += 1
+                self.stats["waited_seconds"] += wait
+        if wait > 0:
+            logger.info(f"Rate limit of {key} reached, waiting {wait:.2f}s")
+            time.sleep(wait)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """Return the process wide rate limiter, creating it on first use."""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(
+                requests_per_minute=float(os.getenv("RATE_LIMIT_RPM", 60)),
+                tokens_per_minute=float(os.getenv("RATE_LIMIT_TPM", 90000)),
+                max_wait=float(os.getenv("RATE_LIMIT_MAX_WAIT", 120)),
+            )
+        return _rate_limiter
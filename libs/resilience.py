@@ -0,0 +1,261 @@
+"""
+Retry and circuit breaker layer for the provider calls and the Code Runner API.
+
+Transient failures (rate limits, timeouts, connection errors and 5xx responses) are retried with full jitter
+exponential backoff, a Retry-After hint from the server is honoured instead of the computed delay.
+Every provider/model has its own circuit breaker: after `failure_threshold` consecutive transient failures
+the circuit opens and calls fail fast with CircuitOpenError until `recovery_timeout` has passed, then a single
+trial call decides whether it closes again. Errors caused by the request itself (bad key, invalid prompt)
+are raised straight away and do not count against the breaker.
+"""
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from libs.logger import logger
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = ("RateLimit", "Timeout", "TimedOut", "ServiceUnavailable", "APIConnectionError", "InternalServerError", "ConnectionError", "TooManyRequests", "ResourceExhausted", "DeadlineExceeded")
+
+class RetryableError(Exception):
+    """A transient failure which is worth retrying, optionally after `retry_after` seconds."""
+
+    def __init__(self, message, retry_after=None, status_code=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+class CircuitOpenError(Exception):
+    """Raised without calling the backend while its circuit is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"Circuit for {name} is open, retry in {retry_after:.0f}s.")
+        self.name = name
+        self.retry_after = retry_after
+
+def get_status_code(exception):
+    for attribute in ("status_code", "code", "http_status"):
+        status_code = getattr(exception, attribute, None)
+        if isinstance(status_code, int):
+            return status_code
+    response = getattr(exception, "response", None)
+    status_code = getattr(response, "status_code", None)
+    return status_code if isinstance(status_code, int) else None
+
+def get_retry_after(exception):
+    """Read the Retry-After hint of an exception in seconds, or None."""
+    retry_after = getattr(exception, "retry_after", None)
+    if retry_after is None:
+        headers = getattr(getattr(exception, "response", None), "headers", None) or {}
+        retry_after = headers.get("Retry-After") or headers.get("retry-after")
+    if retry_after is None:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(exception):
+    if isinstance(exception, RetryableError):
+        return True
+    if isinstance(exception, CircuitOpenError):
+        return False
+    status_code = get_status_code(exception)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    error_name = type(exception).__name__
+    return isinstance(exception, (ConnectionError, TimeoutError)) or any(name in error_name for name in RETRYABLE_ERROR_NAMES)
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """Return True when a call may go through, raise CircuitOpenError otherwise."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            remaining = self.recovery_timeout - (time.monotonic() - self.opened_at)
+            if self.state == self.OPEN and remaining <= 0:
+                logger.info(f"Circuit for {self.name} is half open, sending a trial request.")
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            raise CircuitOpenError(self.name, max(remaining, 0.0))
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit for {self.name} is closed again.")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.error(f"Circuit for {self.name} opened after {self.consecutive_failures} consecutive failures.")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """The call ended with a non transient error, let the next trial go through."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self.recovery_timeout
+
+class ResilienceManager:
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=20.0, max_retry_after=60.0, failure_threshold=5, recovery_timeout=30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "short_circuits": 0}
+
+    def get_breaker(self, name):
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker(name, self.failure_threshold, self.recovery_timeout)
+            return self._breakers[name]
+
+    def is_open(self, name):
+        return self.get_breaker(name).is_open
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """Full jitter exponential backoff, a server supplied Retry-After takes precedence."""
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _handle_failure(self, name, breaker, exception, attempt):
+        """Record a failed attempt and return the delay before the next one, or re-raise the exception."""
+        if not is_retryable(exception):
+            breaker.release()
+            raise exception
+        breaker.record_failure()
+        self._count("failures")
+        retry_after = get_retry_after(exception)
+        if attempt + 1 >= self.max_attempts or (retry_after is not None and retry_after > self.max_retry_after):
+            logger.error(f"Giving up on {name} after {attempt + 1} attempts: {exception}")
+            raise exception
+        delay = self.backoff_delay(attempt, retry_after)
+        logger.warning(f"Retrying {name} in {delay:.2f}s after attempt {attempt + 1} failed: {exception}")
+        self._count("retries")
+        return delay
+
+    def call(self, name, func, *args, **kwargs):
+        """
+        Call func with retries under the circuit breaker of `name` and return its result.
+        """
+        breaker = self.get_breaker(name)
+        self._count("calls")
+        for attempt in range(self.max_attempts):
+            try:
+                breaker.allow_request()
+            except CircuitOpenError:
+                self._count("short_circuits")
+                raise
+            try:
+                result = func(*args, **kwargs)
+            except Exception as exception:
+                time.sleep(self._handle_failure(name, breaker, exception, attempt))
+                continue
+            breaker.record_success()
+            return result
+
+    def stream(self, name, func, *args, **kwargs):
+        """
+        Same as call() for a generator function. Only attempts which failed before yielding are retried,
+        a stream breaking half way is raised since the chunks were already handed out.
+        """
+        breaker = self.get_breaker(name)
+        self._count("calls")
+        for attempt in range(self.max_attempts):
+            try:
+                breaker.allow_request()
+            except CircuitOpenError:
+                self._count("short_circuits")
+                raise
+            started = False
+            chunks = func(*args, **kwargs)
+            try:
+                for chunk in chunks:
+                    started = True
+                    yield chunk
+            except GeneratorExit:
+                # The consumer stopped reading, which says nothing about the backend, but a half open trial has to end.
+                close = getattr(chunks, "close", None)
+                if close:
+                    close()
+                breaker.release()
+                raise
+            except Exception as exception:
+                if started:
+                    if is_retryable(exception):
+                        breaker.record_failure()
+                        self._count("failures")
+                    else:
+                        breaker.release()
+                    raise
+                time.sleep(self._handle_failure(name, breaker, exception, attempt))
+                continue
+            breaker.record_success()
+            return
+
+    def get_stats(self):
+        with self._lock:
+            breakers = {name: {"state": breaker.state, "consecutive_failures": breaker.consecutive_failures} for name, breaker in self._breakers.items()}
+            return {**self.stats, "breakers": breakers}
+
+    def reset(self):
+        with self._lock:
+            self._breakers.clear()
+
+_resilience_manager = None
+_resilience_manager_lock = threading.Lock()
+
+def get_resilience_manager():
+    """Return the process wide resilience manager, creating it on first use."""
+    global _resilience_manager
+    with _resilience_manager_lock:
+        if _resilience_manager is None:
+            _resilience_manager = ResilienceManager(
+                max_attempts=int(os.getenv("RETRY_MAX_ATTEMPTS", 3)),
+                base_delay=float(os.getenv("RETRY_BASE_DELAY", 0.5)),
+                max_delay=float(os.getenv("RETRY_MAX_DELAY", 20)),
+                failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5)),
+                recovery_timeout=float(os.getenv("CIRCUIT_RECOVERY_TIMEOUT", 30)),
+            )
+        return _resilience_manager
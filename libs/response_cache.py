@@ -0,0 +1,167 @@
+"""
+Content addressed response cache for the LLM providers.
+
+Completions are keyed by a hash of the provider, model, sampling settings and the fully rendered prompt,
+which already embeds the code language, enabled coding guidelines and the code input.
+Entries live in an in-memory LRU backed by a SQLite disk tier, both bounded by size and expired by TTL.
+"""
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from libs.logger import logger
+
+_bypass_cache = contextvars.ContextVar("response_cache_bypass", default=False)
+
+@contextmanager
+def bypass_response_cache(enabled=True):
+    """Skip cache lookups for the calls made inside this block, fresh responses are still stored."""
+    token = _bypass_cache.set(enabled)
+    try:
+        yield
+    finally:
+        _bypass_cache.reset(token)
+
+def is_cache_bypassed():
+    return _bypass_cache.get()
+
+class ResponseCache:
+    def __init__(self, db_path="cache/response_cache.db", max_memory_entries=256, max_disk_entries=5000, ttl_seconds=7 * 24 * 3600):
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0, "evictions": 0}
+        self._connection = None
+        self._open_database()
+
+    def _open_database(self):
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+            self._connection.commit()
+            logger.info(f"Response cache opened at {self.db_path}")
+        except sqlite3.Error as exception:
+            # The memory tier keeps working without the disk tier.
+            logger.error(f"Error opening response cache database: {exception}")
+            self._connection = None
+
+    @staticmethod
+    def make_key(**parts):
+        """Build a stable key from the request parts."""
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _is_expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._is_expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self.stats["hits"] += 1
+                    self.stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            if self._connection is not None:
+                try:
+                    row = self._connection.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+                    if row is not None:
+                        value, created_at = row
+                        if not self._is_expired(created_at, now):
+                            self._connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                            self._connection.commit()
+                            self._remember(key, value, created_at)
+                            self.stats["hits"] += 1
+                            self.stats["disk_hits"] += 1
+                            return value
+                        self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                        self._connection.commit()
+                except sqlite3.Error as exception:
+                    logger.error(f"Error reading response cache: {exception}")
+
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key, value):
+        if value is None:
+            return
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._connection is not None:
+                try:
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                        (key, value, now, now),
+                    )
+                    self._evict_disk(now)
+                    self._connection.commit()
+                except sqlite3.Error as exception:
+                    logger.error(f"Error writing response cache: {exception}")
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _evict_disk(self, now):
+        if self.ttl_seconds is not None:
+            self._connection.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        count = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_disk_entries:
+            overflow = count - self.max_disk_entries
+            self._connection.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)", (overflow,)
+            )
+            self.stats["evictions"] += overflow
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._connection is not None:
+                self._connection.execute("DELETE FROM responses")
+                self._connection.commit()
+        logger.info("Response cache cleared.")
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Return the process wide response cache, creating it on first use."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache(
+                db_path=os.getenv("RESPONSE_CACHE_PATH", "cache/response_cache.db"),
+                ttl_seconds=int(os.getenv("RESPONSE_CACHE_TTL", 7 * 24 * 3600)),
+            )
+        return _response_cache
@@ -0,0 +1,46 @@
+"""
+Recording of provider responses for replay.
+
+When RECORD_RESPONSES_PATH is set every completion returned by a provider backend is appended to that JSONL
+file with the hash of its prompt. The mock provider replays such a file (MOCK_RESPONSES_PATH), which turns a
+recorded live session into a reproducible offline benchmark.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from libs.logger import logger
+
+def prompt_hash(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+class ResponseRecorder:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def record(self, provider_name, model_name, prompt, completion):
+        entry = {"prompt_hash": prompt_hash(prompt), "provider": provider_name, "model": model_name, "prompt": prompt, "completion": completion, "timestamp": time.time()}
+        try:
+            with self._lock, open(self.path, "a") as file:
+                file.write(json.dumps(entry) + "\n")
+        except OSError as exception:
+            logger.error(f"Error recording response: {exception}")
+
+_response_recorder = None
+_response_recorder_lock = threading.Lock()
+
+def get_response_recorder():
+    """Return the process wide response recorder, None when recording is not enabled."""
+    global _response_recorder
+    path = os.getenv("RECORD_RESPONSES_PATH")
+    if not path:
+        return None
+    with _response_recorder_lock:
+        if _response_recorder is None or _response_recorder.path != path:
+            _response_recorder = ResponseRecorder(path)
+        return _response_recorder
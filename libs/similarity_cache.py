@@ -0,0 +1,138 @@
+"""
+Near duplicate prompt cache.
+
+Prompts are normalized (casing, whitespace and punctuation) and turned into hashed character shingles.
+A MinHash signature computed with NumPy is bucketed with locality sensitive hashing, so a lookup only
+compares against the prompts sharing at least one band. Candidates are scored with the Jaccard similarity
+of their shingles and the best one above the threshold is returned with its score.
+Everything runs locally, no embedding service is needed.
+"""
+import hashlib
+import json
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+import numpy as np
+from libs.logger import logger
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+@dataclass
+class SimilarityMatch:
+    code: str
+    score: float
+    prompt: str
+
+class SimilarityCache:
+    def __init__(self, threshold=0.75, num_permutations=128, bands=32, shingle_size=4, max_entries=2000, seed=1):
+        if num_permutations % bands != 0:
+            raise ValueError("num_permutations must be a multiple of bands.")
+        self.threshold = threshold
+        self.num_permutations = num_permutations
+        self.bands = bands
+        self.rows = num_permutations // bands
+        self.shingle_size = shingle_size
+        self.max_entries = max_entries
+        random_state = np.random.RandomState(seed)
+        self._a = random_state.randint(1, 1 << 61, size=num_permutations, dtype=np.uint64)
+        self._b = random_state.randint(0, 1 << 61, size=num_permutations, dtype=np.uint64)
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(prompt):
+        """Lowercase the prompt, drop punctuation and collapse whitespace."""
+        prompt = prompt.lower()
+        prompt = re.sub(r"[^\w\s]", " ", prompt)
+        return re.sub(r"\s+", " ", prompt).strip()
+
+    @staticmethod
+    def make_namespace(*parts):
+        """Prompts are only compared with prompts sharing the same provider, model, language, guidelines and input."""
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _shingles(self, normalized_prompt):
+        if len(normalized_prompt) <= self.shingle_size:
+            return {normalized_prompt}
+        return {normalized_prompt[index:index + self.shingle_size] for index in range(len(normalized_prompt) - self.shingle_size + 1)}
+
+    def _signature(self, shingles):
+        hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+        # uint64 wrap around in the multiplication is intended, it is part of the hash.
+        with np.errstate(over="ignore"):
+            permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def _band_keys(self, namespace, signature):
+        return [(namespace, band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def lookup(self, namespace, prompt, threshold=None):
+        """Return the best SimilarityMatch above the threshold or None."""
+        threshold = self.threshold if threshold is None else threshold
+        normalized_prompt = self.normalize(prompt)
+        if not normalized_prompt:
+            return None
+        shingles = self._shingles(normalized_prompt)
+        band_keys = self._band_keys(namespace, self._signature(shingles))
+
+        with self._lock:
+            candidate_ids = set()
+            for band_key in band_keys:
+                candidate_ids.update(self._buckets.get(band_key, ()))
+
+            best_match = None
+            for entry_id in candidate_ids:
+                entry = self._entries[entry_id]
+                score = len(shingles & entry["shingles"]) / len(shingles | entry["shingles"])
+                if score >= threshold and (best_match is None or score > best_match.score):
+                    best_match = SimilarityMatch(code=entry["code"], score=score, prompt=entry["prompt"])
+                    self._entries.move_to_end(entry_id)
+
+        if best_match:
+            logger.info(f"Similar prompt found with score {best_match.score:.2f}: {best_match.prompt[:50]}")
+        return best_match
+
+    def add(self, namespace, prompt, code):
+        normalized_prompt = self.normalize(prompt)
+        if not normalized_prompt or not code:
+            return
+        shingles = self._shingles(normalized_prompt)
+        band_keys = self._band_keys(namespace, self._signature(shingles))
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {"prompt": prompt, "code": code, "shingles": shingles, "band_keys": band_keys}
+            for band_key in band_keys:
+                self._buckets.setdefault(band_key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        for band_key in entry["band_keys"]:
+            bucket = self._buckets.get(band_key)
+            if bucket:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def __len__(self):
+        return len(self._entries)
+
+_similarity_cache = None
+_similarity_cache_lock = threading.Lock()
+
+def get_similarity_cache():
+    """Return the process wide similarity cache, creating it on first use."""
+    global _similarity_cache
+    with _similarity_cache_lock:
+        if _similarity_cache is None:
+            _similarity_cache = SimilarityCache()
+        return _similarity_cache
@@ -0,0 +1,72 @@
+"""
+Single flight coalescing of identical provider calls.
+
+When several sessions send the same request at the same time (or one user double clicks Generate), only
+the first caller reaches the provider. The other callers wait for that call and receive its result, or its
+exception. Requests are identified by their response cache key, so different sampling options or best-of-N
+sample indexes are never collapsed.
+"""
+import threading
+from libs.logger import logger
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+        self.waiters = 0
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Call func unless a call with the same key is already in flight, in which case wait for its result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self.stats["calls"] += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self.stats["coalesced"] += 1
+                leader = False
+
+        if not leader:
+            logger.info(f"Waiting for the in flight request {key[:12]}")
+            call.done.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except Exception as exception:
+            call.exception = exception
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+def get_single_flight():
+    """Return the process wide single flight group, creating it on first use."""
+    global _single_flight
+    with _single_flight_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+        return _single_flight
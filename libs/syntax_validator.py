@@ -0,0 +1,149 @@
+"""
+Early syntax validation of streamed code.
+
+Without it a broken generation is only noticed after the whole response arrived and the program was started. The
+validator is fed the same chunks as the streaming editor and checks the code while it is still coming in:
+
+- Python: every completed top-level unit (a statement, function or class which is followed by the next line at
+  column zero) is parsed with compile() as soon as it is complete, so an error in the first function stops the
+  stream while the model is still writing the rest.
+- C, C++, Java and JavaScript: the program is checked with `gcc/g++ -fsyntax-only`, `javac` or `node --check`
+  as soon as its fence closes, before the prose after it and long before the program would be built and run.
+
+A failure is reported as a SyntaxCheck with diagnostics in the compiler format, so the caller can stop the
+stream and hand the code straight to the repair step. Checkers whose tool is not installed are skipped.
+"""
+import ast
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from dataclasses import dataclass
+from libs.code_fences import FenceParser, matches_language
+from libs.logger import logger
+
+# Lines at column zero which continue the unit above them instead of starting a new one.
+PYTHON_CONTINUATIONS = re.compile(r"^(?:else|elif|except|finally)\b|^[)\]}]")
+# Errors which only mean that the unit is not finished yet, e.g. a string or bracket spanning column zero lines.
+PYTHON_INCOMPLETE = re.compile(r"unterminated triple-quoted|was never closed|unexpected EOF|unexpected end")
+JAVA_CLASS_PATTERN = re.compile(r"public\s+(?:final\s+|abstract\s+)*class\s+(\w+)")
+SYNTAX_CHECK_TIMEOUT = float(os.getenv("SYNTAX_CHECK_TIMEOUT", 10))
+
+@dataclass
+class SyntaxCheck:
+    code: str
+    diagnostics: str
+    # False when the stream was stopped inside the program, so the code is only its beginning.
+    complete: bool
+
+class PythonUnitChecker:
+    def __init__(self):
+        self.checked_length = 0
+        self.checked_lines = 0
+
+    def check(self, code, final=False):
+        """Parse the top-level units of the code which are complete and not checked yet, return the diagnostics of an error."""
+        if not final:
+            code = code[:code.rfind("\n") + 1]
+        lines = code[self.checked_length:].splitlines(keepends=True)
+        boundary = len(lines) if final else self._last_boundary(lines)
+        if not boundary:
+            return None
+        segment = "".join(lines[:boundary])
+        try:
+            compile(segment, "main.py", "exec", flags=ast.PyCF_ONLY_AST, dont_inherit=True)
+        except SyntaxError as exception:
+            if not final and PYTHON_INCOMPLETE.search(exception.msg or ""):
+                return None
+            line = self.checked_lines + (exception.lineno or 1)
+            source_line = (exception.text or "").strip()
+            return f'  File "main.py", line {line}\n    {source_line}\nSyntaxError: {exception.msg}'
+        self.checked_length += len(segment)
+        self.checked_lines += boundary
+        return None
+
+    @staticmethod
+    def _last_boundary(lines):
+        """Index of the last line which starts a new top-level unit, everything before it is complete."""
+        boundary, previous = 0, ""
+        for index, line in enumerate(lines):
+            if not line.strip() or line[0] in " \t#":
+                continue
+            if index and not PYTHON_CONTINUATIONS.match(line) and not previous.startswith("@") and not previous.rstrip().endswith("\\"):
+                boundary = index
+            previous = line
+        return boundary
+
+def _compiler_check(command, code, file_name):
+    """Run a syntax only compiler command on the code saved as file_name, return its diagnostics when it fails."""
+    if not shutil.which(command[0]):
+        logger.info(f"Skipping the early syntax check, {command[0]} is not installed.")
+        return None
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, file_name)
+        with open(path, "w") as file:
+            file.write(code)
+        try:
+            result = subprocess.run(command + [path], capture_output=True, text=True, timeout=SYNTAX_CHECK_TIMEOUT, cwd=directory)
+        except (OSError, subprocess.TimeoutExpired) as exception:
+            logger.warning(f"Early syntax check with {command[0]} failed to run: {exception}")
+            return None
+    if result.returncode == 0:
+        return None
+    return (result.stderr or result.stdout).replace(directory + os.sep, "")
+
+def check_c(code):
+    return _compiler_check(["gcc", "-fsyntax-only", "-std=c11"], code, "main.c")
+
+def check_cpp(code):
+    return _compiler_check(["g++", "-fsyntax-only", "-std=c++17"], code, "main.cpp")
+
+def check_java(code):
+    match = JAVA_CLASS_PATTERN.search(code)
+    with tempfile.TemporaryDirectory() as output_directory:
+        return _compiler_check(["javac", "-d", output_directory], code, f"{match.group(1) if match else 'Main'}.java")
+
+def check_javascript(code):
+    return _compiler_check(["node", "--check"], code, "main.js")
+
+# Checks run on a whole program once its fence has closed.
+PROGRAM_CHECKS = {"C": check_c, "C++": check_cpp, "Java": check_java, "JavaScript": check_javascript}
+
+class StreamingValidator:
+    """Feed it the streamed chunks, feed() returns a SyntaxCheck as soon as the code is known to be broken."""
+
+    def __init__(self, code_language):
+        self.code_language = code_language
+        self.parser = FenceParser()
+        self.python_checker = PythonUnitChecker() if code_language == "Python" else None
+        self.program_check = PROGRAM_CHECKS.get(code_language)
+        self.finished = False
+
+    def _is_program(self, block):
+        return not block.language or matches_language(block.language, self.code_language)
+
+    def feed(self, chunk):
+        if self.finished or not (self.python_checker or self.program_check):
+            return None
+        closed_blocks = self.parser.feed(chunk)
+        program = next((block for block in closed_blocks if self._is_program(block)), None)
+        if program:
+            # Only the program is checked, blocks after it (example output, commands) are not code.
+            self.finished = True
+            return self._check_program(program.code)
+        if self.python_checker and "\n" in chunk:
+            open_block = self.parser.partial_block()
+            if open_block and self._is_program(open_block):
+                diagnostics = self.python_checker.check(open_block.code)
+                if diagnostics:
+                    self.finished = True
+                    return SyntaxCheck(open_block.code, diagnostics, complete=False)
+        return None
+
+    def _check_program(self, code):
+        if self.python_checker:
+            diagnostics = self.python_checker.check(code, final=True)
+        else:
+            diagnostics = self.program_check(code)
+        return SyntaxCheck(code, diagnostics, complete=True) if diagnostics else None
@@ -0,0 +1,156 @@
+"""
+Diff based targeted repair of failing programs.
+
+Instead of sending the whole program back to the model and having it rewrite everything, the failing region is
+located from the line numbers in the compiler or runtime diagnostics. Only that region, with a few lines of
+context around it, is sent together with the error and the model is asked for a unified diff. The diff is
+applied locally: every hunk has to match the program and stay inside the region sent, otherwise the repair is
+rejected and the caller falls back to the whole file fix. The completion is a few lines of diff instead of the
+whole program, so fix rounds of long programs are much faster and cheaper.
+"""
+import os
+import re
+from dataclasses import dataclass
+from libs.generation_engine import get_generation_engine
+from libs.code_fences import parse_code_blocks
+from libs.logger import logger
+
+# Line numbers reported by Python, gcc/clang, javac, go, kotlinc, node, ruby, rustc and csc.
+LINE_PATTERNS = (
+    re.compile(r'File "(?P<file>[^"]*)", line (?P<line>\d+)'),
+    re.compile(r"-->\s*(?P<file>[^\s:]+):(?P<line>\d+):\d+"),
+    re.compile(r"(?P<file>[^\s:()]+\.\w+)\((?P<line>\d+),\d+\)"),
+    re.compile(r"(?P<file>[^\s:()]+\.\w+):(?P<line>\d+)(?::\d+)?"),
+    re.compile(r"\bline (?P<line>\d+)\b"),
+)
+# Frames of the interpreter or of installed packages are never the failing region of the program.
+LIBRARY_PATH_PATTERN = re.compile(r"site-packages|dist-packages|<frozen|/lib/python|node_modules|/usr/lib/|/usr/include/")
+HUNK_HEADER_PATTERN = re.compile(r"^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@")
+
+@dataclass
+class RepairRegion:
+    start_line: int
+    end_line: int
+    error_line: int
+
+def find_error_lines(diagnostics, line_count):
+    """Return the program line numbers mentioned by the diagnostics, in order of appearance."""
+    error_lines = []
+    for diagnostic_line in (diagnostics or "").splitlines():
+        for pattern in LINE_PATTERNS:
+            match = pattern.search(diagnostic_line)
+            if not match:
+                continue
+            file_name = match.groupdict().get("file")
+            line = int(match.group("line"))
+            if (not file_name or not LIBRARY_PATH_PATTERN.search(file_name)) and 1 <= line <= line_count:
+                error_lines.append(line)
+            break
+    return error_lines
+
+def locate_region(code, diagnostics, context_lines=10):
+    """Return the RepairRegion around the reported error, None when the diagnostics name no line of the program."""
+    line_count = len(code.splitlines())
+    error_lines = find_error_lines(diagnostics, line_count)
+    if not error_lines:
+        return None
+    # The innermost frame of a traceback is the last one, compilers report the first error first.
+    error_line = error_lines[-1] if "Traceback" in diagnostics else error_lines[0]
+    return RepairRegion(max(1, error_line - context_lines), min(line_count, error_line + context_lines), error_line)
+
+def parse_hunks(diff):
+    """Parse a unified diff into (old start line, old lines, new lines) hunks."""
+    hunks, current = [], None
+    for line in diff.splitlines():
+        header = HUNK_HEADER_PATTERN.match(line)
+        if header:
+            current = (int(header.group(1)), [], [])
+            hunks.append(current)
+        elif current is None or line.startswith(("---", "+++", "\\")):
+            continue
+        elif line.startswith("-"):
+            current[1].append(line[1:])
+        elif line.startswith("+"):
+            current[2].append(line[1:])
+        else:
+            # Models often drop the leading space of empty context lines.
+            context_line = line[1:] if line.startswith(" ") else line
+            current[1].append(context_line)
+            current[2].append(context_line)
+    return hunks
+
+def _find_block(lines, block, hint):
+    """Return the position of the block in the lines closest to the hint, None when it does not match."""
+    for normalize in (lambda line: line, lambda line: line.strip()):
+        normalized_block = [normalize(line) for line in block]
+        positions = [
+            position for position in range(len(lines) - len(block) + 1)
+            if [normalize(line) for line in lines[position:position + len(block)]] == normalized_block
+        ]
+        if positions:
+            return min(positions, key=lambda position: abs(position - hint))
+    return None
+
+def apply_unified_diff(code, diff, region=None):
+    """
+    Apply the hunks of the diff to the code, matching them by content near their line numbers.
+    Return None when a hunk does not match or touches lines outside the region.
+    """
+    lines = code.splitlines()
+    hunks = parse_hunks(diff)
+    if not hunks:
+        return None
+    offset = 0
+    for old_start, old_lines, new_lines in hunks:
+        hint = max(0, old_start - 1 + offset)
+        position = _find_block(lines, old_lines, hint) if old_lines else min(hint, len(lines))
+        if position is None:
+            logger.warning(f"Hunk at line {old_start} does not match the program.")
+            return None
+        original_position = position - offset
+        if region and (original_position + 1 < region.start_line or original_position + len(old_lines) > region.end_line):
+            logger.warning(f"Hunk at line {old_start} changes lines outside the repair region {region.start_line}-{region.end_line}.")
+            return None
+        lines[position:position + len(old_lines)] = new_lines
+        offset += len(new_lines) - len(old_lines)
+    return "\n".join(lines) + ("\n" if code.endswith("\n") else "")
+
+def extract_diff(completion):
+    """Return the diff of the completion, with or without a fence around it."""
+    if "```" not in completion:
+        return completion
+    blocks = parse_code_blocks(completion)
+    block = next((block for block in blocks if block.language in ("diff", "patch", "udiff")), blocks[0] if blocks else None)
+    return block.code if block else completion
+
+class TargetedRepair:
+    def __init__(self, provider, context_lines=None, min_lines=None):
+        self.provider = provider
+        self.context_lines = context_lines or int(os.getenv("REPAIR_CONTEXT_LINES", 10))
+        # Short programs are cheap to regenerate and give the model the whole picture.
+        self.min_lines = min_lines or int(os.getenv("REPAIR_MIN_LINES", 40))
+
+    async def repair(self, code, code_language, diagnostics, fix_instructions="", file_name="main"):
+        """Return the repaired code, None when the program can't be repaired with a targeted diff."""
+        lines = code.splitlines()
+        if len(lines) < self.min_lines:
+            return None
+        region = locate_region(code, diagnostics, self.context_lines)
+        if region is None:
+            logger.info("Diagnostics name no line of the program, the targeted repair is skipped.")
+            return None
+
+        excerpt = "\n".join(lines[region.start_line - 1:region.end_line])
+        rendered = await get_generation_engine().submit(
+            self.provider.render_prompt, "repair", code_language, excerpt=excerpt, error=diagnostics, fix_instructions=fix_instructions or "",
+            file_name=file_name, start_line=region.start_line, end_line=region.end_line,
+        )
+        completion = await self.provider.acomplete(rendered.text)
+        if not completion:
+            return None
+        repaired_code = apply_unified_diff(code, extract_diff(completion), region)
+        if not repaired_code or repaired_code == code:
+            logger.warning("Targeted repair returned no applicable diff.")
+            return None
+        logger.info(f"Repaired lines {region.start_line}-{region.end_line} around line {region.error_line} with a {len(completion)} characters diff")
+        return repaired_code
@@ -0,0 +1,36 @@
+"""
+Token counting for prompts and completions.
+
+Uses the tiktoken encoding of the model when tiktoken is installed and falls back to the usual estimate of
+four characters per token otherwise, which is close enough for rate limiting and cost estimates.
+"""
+from functools import lru_cache
+from libs.logger import logger
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+CHARACTERS_PER_TOKEN = 4
+
+@lru_cache(maxsize=32)
+def _get_encoding(model_name):
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        # Non OpenAI models have no dedicated encoding, cl100k_base is a reasonable approximation.
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as exception:
+        logger.error(f"Error loading tiktoken encoding for {model_name}: {exception}")
+        return None
+
+def count_tokens(text, model_name=None):
+    """Return the number of tokens of the text for the given model."""
+    if not text:
+        return 0
+    if tiktoken is not None:
+        encoding = _get_encoding(model_name or "gpt-3.5-turbo")
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // CHARACTERS_PER_TOKEN)
@@ -0,0 +1,146 @@
+"""
+Cached toolchain discovery.
+
+Checking the compiler of a language used to spawn `<compiler> --version` before every single run, which costs
+hundreds of milliseconds to seconds of JVM startup for Java, Scala and Kotlin. The registry probes all toolchains
+once, concurrently and in the background when the app starts, and records the path and version of each. Lookups
+are answered from that inventory without spawning anything. It is rediscovered when PATH changes or after
+TOOLCHAIN_TTL seconds, so a compiler installed while the app runs is picked up, and a language whose probe has not
+finished yet is probed on demand.
+"""
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from libs.logger import logger
+
+# The version command of the toolchain of every language code, see libs/lang_codes.py, and of the compilers which
+# are not the toolchain of their language.
+TOOLCHAIN_COMMANDS = {
+    "python": ["python", "--version"],
+    "nodejs": ["node", "--version"],
+    "c": ["gcc", "--version"],
+    "cpp": ["g++", "--version"],
+    "csharp": ["csc", "--version"],
+    "go": ["go", "version"],
+    "ruby": ["ruby", "--version"],
+    "java": ["java", "--version"],
+    "kotlin": ["kotlinc", "-version"],
+    "scala": ["scala", "-version"],
+    "swift": ["swift", "--version"],
+    # Java programs are built by javac, which is versioned separately from the java runtime above.
+    "javac": ["javac", "-version"],
+}
+PROBE_TIMEOUT = 30
+
+@dataclass
+class Toolchain:
+    language_code: str
+    command: str
+    path: str = None
+    version: str = None
+    checked_at: float = 0.0
+
+    @property
+    def available(self):
+        return self.path is not None and self.version is not None
+
+def probe_toolchain(language_code):
+    """Find the toolchain of the language on PATH and ask it for its version."""
+    command = TOOLCHAIN_COMMANDS[language_code]
+    toolchain = Toolchain(language_code, command[0], checked_at=time.time())
+    toolchain.path = shutil.which(command[0])
+    if toolchain.path is None:
+        return toolchain
+    try:
+        result = subprocess.run([toolchain.path] + command[1:], capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+        if result.returncode == 0:
+            # Some toolchains print their version to stderr, e.g. java -version and scala -version.
+            output = (result.stdout.strip() or result.stderr.strip()).splitlines()
+            toolchain.version = output[0] if output else "unknown"
+    except (OSError, subprocess.TimeoutExpired) as exception:
+        logger.warning(f"Probing {command[0]} failed: {exception}")
+    return toolchain
+
+class ToolchainRegistry:
+    def __init__(self, ttl=3600, max_workers=4):
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self._toolchains = {}
+        # The PATH every toolchain was probed with, an entry found with another PATH may point to the wrong binary.
+        self._probed_paths = {}
+        self._path = None
+        self._discovered_at = 0.0
+        self._discovery = None
+        self._lock = threading.Lock()
+
+    def _is_stale(self):
+        return self._path != os.environ.get("PATH") or time.time() - self._discovered_at > self.ttl
+
+    def discover(self):
+        """Probe all toolchains concurrently and replace the inventory."""
+        path = os.environ.get("PATH")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="toolchain-probe") as executor:
+            toolchains = dict(zip(TOOLCHAIN_COMMANDS, executor.map(probe_toolchain, TOOLCHAIN_COMMANDS)))
+        with self._lock:
+            self._toolchains, self._path, self._discovered_at = toolchains, path, time.time()
+            self._probed_paths = dict.fromkeys(toolchains, path)
+        available = [code for code, toolchain in toolchains.items() if toolchain.available]
+        logger.info(f"Discovered toolchains in {time.perf_counter() - started:.2f}s: {', '.join(available) or 'none'}")
+        return toolchains
+
+    def start_background_discovery(self):
+        """Start a discovery on a background thread unless one is running, return the thread."""
+        with self._lock:
+            if self._discovery is None or not self._discovery.is_alive():
+                self._discovery = threading.Thread(target=self.discover, name="toolchain-discovery", daemon=True)
+                self._discovery.start()
+            return self._discovery
+
+    def get(self, language_code):
+        """
+        The toolchain of the language code. An expired inventory is still used while it is rediscovered in the
+        background, after a PATH change or before the first discovery finished the language is probed on demand.
+        """
+        path = os.environ.get("PATH")
+        with self._lock:
+            stale = self._is_stale()
+            toolchain = self._toolchains.get(language_code)
+            if toolchain is not None and self._probed_paths.get(language_code) != path:
+                toolchain = None
+        if stale:
+            self.start_background_discovery()
+        if toolchain is None:
+            toolchain = probe_toolchain(language_code)
+            with self._lock:
+                self._toolchains[language_code] = toolchain
+                self._probed_paths[language_code] = path
+        return toolchain
+
+    def is_available(self, language_code):
+        return language_code in TOOLCHAIN_COMMANDS and self.get(language_code).available
+
+    def inventory(self):
+        """The toolchains discovered so far, by language code."""
+        with self._lock:
+            return dict(self._toolchains)
+
+    def invalidate(self):
+        with self._lock:
+            self._discovered_at = 0.0
+
+_toolchain_registry = None
+_toolchain_registry_lock = threading.Lock()
+
+def get_toolchain_registry():
+    """Return the process wide toolchain registry, starting the discovery on first use."""
+    global _toolchain_registry
+    with _toolchain_registry_lock:
+        if _toolchain_registry is None:
+            _toolchain_registry = ToolchainRegistry(ttl=float(os.getenv("TOOLCHAIN_TTL", 3600)))
+            _toolchain_registry.start_background_discovery()
+        return _toolchain_registry
@@ -0,0 +1,191 @@
+"""
+Usage metering and cost ledger.
+
+Every completion returned by a provider backend is metered: providers report the prompt and completion
+token counts of their response with `report_usage`, otherwise both are counted locally with the tokenizer.
+Usage is priced with a versioned per model price table (OpenAI bills per 1K tokens, the Google models of this
+generation per 1K characters) and appended to a compact SQLite ledger which keeps only counts and cost, never
+prompt text. The ledger answers per session, per model and per day aggregates.
+Cache hits never reach a provider and are not metered.
+"""
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from libs.logger import logger
+from libs.token_counter import count_tokens
+
+PRICE_TABLE_VERSION = "2024-01"
+
+# USD per 1K units of the prompt and the completion.
+PRICE_TABLE = {
+    "gpt-4": {"unit": "token", "input": 0.03, "output": 0.06},
+    "gpt-4-0613": {"unit": "token", "input": 0.03, "output": 0.06},
+    "gpt-4-32k": {"unit": "token", "input": 0.06, "output": 0.12},
+    "gpt-4-32k-0613": {"unit": "token", "input": 0.06, "output": 0.12},
+    "gpt-3.5-turbo": {"unit": "token", "input": 0.0015, "output": 0.002},
+    "gpt-3.5-turbo-0613": {"unit": "token", "input": 0.0015, "output": 0.002},
+    "gpt-3.5-turbo-0301": {"unit": "token", "input": 0.0015, "output": 0.002},
+    "gpt-3.5-turbo-16k": {"unit": "token", "input": 0.003, "output": 0.004},
+    "gpt-3.5-turbo-16k-0613": {"unit": "token", "input": 0.003, "output": 0.004},
+    "text-davinci-003": {"unit": "token", "input": 0.02, "output": 0.02},
+    "code-bison": {"unit": "character", "input": 0.00025, "output": 0.0005},
+    "code-gecko": {"unit": "character", "input": 0.00025, "output": 0.0005},
+    "text-bison-001": {"unit": "character", "input": 0.00025, "output": 0.0005},
+    "chat-bison-001": {"unit": "character", "input": 0.00025, "output": 0.0005},
+    "embedding-gecko-001": {"unit": "character", "input": 0.0002, "output": 0.0},
+    "gemini-pro": {"unit": "character", "input": 0.00025, "output": 0.0005},
+    "gemini-pro-vision": {"unit": "character", "input": 0.00025, "output": 0.0005},
+    "mock-coder": {"unit": "token", "input": 0.0, "output": 0.0},
+}
+
+# Usage reported by the provider for the call running in the current context.
+_reported_usage = contextvars.ContextVar("reported_usage", default=None)
+
+def report_usage(prompt_tokens=None, completion_tokens=None):
+    """Called by a provider backend with the token counts found in its response."""
+    if prompt_tokens is not None or completion_tokens is not None:
+        _reported_usage.set((prompt_tokens, completion_tokens))
+
+def reset_reported_usage():
+    _reported_usage.set(None)
+
+def current_session_id():
+    script_run_ctx = get_script_run_ctx(suppress_warning=True)
+    return script_run_ctx.session_id if script_run_ctx else "headless"
+
+@dataclass
+class Usage:
+    prompt_tokens: int
+    completion_tokens: int
+    prompt_characters: int
+    completion_characters: int
+    source: str = "provider"
+
+    @classmethod
+    def measure(cls, prompt, completion, model_name=None):
+        """Take the usage reported by the provider or count it locally."""
+        reported_usage = _reported_usage.get()
+        prompt_tokens, completion_tokens = reported_usage or (None, None)
+        source = "provider" if reported_usage else "estimate"
+        if prompt_tokens is None:
+            prompt_tokens = count_tokens(prompt, model_name)
+        if completion_tokens is None:
+            completion_tokens = count_tokens(completion, model_name)
+        return cls(prompt_tokens, completion_tokens, len(prompt or ""), len(completion or ""), source)
+
+class PriceTable:
+    def __init__(self, prices=None, version=PRICE_TABLE_VERSION):
+        self.prices = dict(prices or PRICE_TABLE)
+        self.version = version
+
+    @classmethod
+    def load(cls, path=None):
+        """Load the price table from a JSON file ({"version": ..., "models": {...}}) or use the built in one."""
+        if path and os.path.exists(path):
+            try:
+                with open(path) as file:
+                    table = json.load(file)
+                return cls({**PRICE_TABLE, **table["models"]}, table.get("version", PRICE_TABLE_VERSION))
+            except (OSError, ValueError, KeyError) as exception:
+                logger.error(f"Error loading price table {path}: {exception}")
+        return cls()
+
+    def cost(self, model_name, usage):
+        price = self.prices.get(model_name)
+        if price is None:
+            logger.warning(f"No price for model {model_name}, its usage is recorded without cost.")
+            return 0.0
+        if price["unit"] == "character":
+            return (usage.prompt_characters * price["input"] + usage.completion_characters * price["output"]) / 1000
+        return (usage.prompt_tokens * price["input"] + usage.completion_tokens * price["output"]) / 1000
+
+class UsageLedger:
+    AGGREGATE_COLUMNS = {"session": "session_id", "model": "model", "day": "day", "provider": "provider"}
+
+    def __init__(self, db_path="cache/usage_ledger.db", price_table=None):
+        self.db_path = db_path
+        self.price_table = price_table or PriceTable()
+        self._lock = threading.Lock()
+        self._connection = None
+        self._open_database()
+
+    def _open_database(self):
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS usage (timestamp REAL NOT NULL, day TEXT NOT NULL, session_id TEXT NOT NULL, provider TEXT NOT NULL, model TEXT NOT NULL, "
+                "prompt_tokens INTEGER NOT NULL, completion_tokens INTEGER NOT NULL, prompt_characters INTEGER NOT NULL, completion_characters INTEGER NOT NULL, "
+                "cost REAL NOT NULL, price_version TEXT NOT NULL, source TEXT NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS usage_session ON usage (session_id)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS usage_day ON usage (day)")
+            self._connection.commit()
+            logger.info(f"Usage ledger opened at {self.db_path}")
+        except sqlite3.Error as exception:
+            logger.error(f"Error opening usage ledger: {exception}")
+            self._connection = None
+
+    def record(self, provider_name, model_name, usage, session_id=None):
+        """Price the usage, append it to the ledger and return its cost."""
+        cost = self.price_table.cost(model_name, usage)
+        now = time.time()
+        session_id = session_id or current_session_id()
+        logger.info(f"Usage of {provider_name}/{model_name}: {usage.prompt_tokens} prompt and {usage.completion_tokens} completion tokens ({usage.source}), cost {cost:.6f} USD")
+        if self._connection is None:
+            return cost
+        try:
+            with self._lock:
+                self._connection.execute(
+                    "INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (now, time.strftime("%Y-%m-%d", time.gmtime(now)), session_id, provider_name, model_name, usage.prompt_tokens, usage.completion_tokens,
+                     usage.prompt_characters, usage.completion_characters, cost, self.price_table.version, usage.source),
+                )
+                self._connection.commit()
+        except sqlite3.Error as exception:
+            logger.error(f"Error recording usage: {exception}")
+        return cost
+
+    def aggregate(self, group_by="model", session_id=None, day=None):
+        """
+        Return requests, tokens and cost grouped by "session", "model", "day" or "provider", optionally filtered.
+        """
+        if self._connection is None:
+            return []
+        column = self.AGGREGATE_COLUMNS[group_by]
+        conditions, parameters = [], []
+        if session_id:
+            conditions.append("session_id = ?")
+            parameters.append(session_id)
+        if day:
+            conditions.append("day = ?")
+            parameters.append(day)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {column}, COUNT(*), SUM(prompt_tokens), SUM(completion_tokens), SUM(cost) FROM usage {where} GROUP BY {column} ORDER BY {column}",
+                parameters,
+            ).fetchall()
+        return [{group_by: row[0], "requests": row[1], "prompt_tokens": row[2], "completion_tokens": row[3], "cost": row[4]} for row in rows]
+
+    def total_cost(self, session_id=None, day=None):
+        return sum(row["cost"] for row in self.aggregate("provider", session_id, day))
+
+_usage_ledger = None
+_usage_ledger_lock = threading.Lock()
+
+def get_usage_ledger():
+    """Return the process wide usage ledger, creating it on first use."""
+    global _usage_ledger
+    with _usage_ledger_lock:
+        if _usage_ledger is None:
+            price_table = PriceTable.load(os.getenv("PRICE_TABLE_PATH"))
+            _usage_ledger = UsageLedger(os.getenv("USAGE_LEDGER_PATH", "cache/usage_ledger.db"), price_table)
+        return _usage_ledger
@@ -1,7 +1,22 @@
 import streamlit as st
 import os
+import time
+import traceback
 from streamlit_ace import st_ace
 from libs.logger import logger
+from libs.generation_engine import get_generation_engine
+from libs.response_cache import bypass_response_cache
+from libs.similarity_cache import get_similarity_cache
+from libs.syntax_validator import StreamingValidator
+from libs.best_of_n import BestOfNSelector
+from libs.client_registry import get_client_registry
+from libs.hedged_requests import HedgedRequest
+from libs.model_cascade import ModelCascade
+from libs.code_fences import FenceParser
+from libs.conversation_memory import create_memory
+from libs.mock_provider import MockProvider
+from libs.resilience import get_resilience_manager
+from libs.usage_meter import current_session_id, get_usage_ledger
 
 def initialize_session_state():
     if "code_language" not in st.session_state:
@@ -34,8 +49,6 @@ def initialize_session_state():
         st.session_state.download_link = None
     if "download_logs" not in st.session_state:
         st.session_state.download_logs = False
-    if "auto_debug_chain" not in st.session_state:
-        st.session_state.auto_debug_chain = False
     if "code_input" not in st.session_state:
         st.session_state.code_input = None
     if "code_output" not in st.session_state:
@@ -46,8 +59,6 @@ def initialize_session_state():
         st.session_state.gemini_langchain = None
     if "code_fix_instructions" not in st.session_state:
         st.session_state.code_fix_instructions = None
-    if "sequential_chain" not in st.session_state:
-        st.session_state.sequential_chain = None
     if "stderr" not in st.session_state:
         st.session_state.stderr = None
     if "compiler_offline_privacy_shown" not in st.session_state:
@@ -66,6 +77,40 @@ def initialize_session_state():
         st.session_state.general_utils = None
     if "tasks_parser" not in st.session_state:
         st.session_state.tasks_parser = None
+    if "bypass_cache" not in st.session_state:
+        st.session_state.bypass_cache = False
+    if "reuse_similar_prompts" not in st.session_state:
+        st.session_state.reuse_similar_prompts = True
+    if "similarity_threshold" not in st.session_state:
+        st.session_state.similarity_threshold = 0.75
+    if "similarity_match" not in st.session_state:
+        st.session_state.similarity_match = None
+    if "stream_code" not in st.session_state:
+        st.session_state.stream_code = True
+    if "pending_stream" not in st.session_state:
+        st.session_state.pending_stream = None
+    if "early_validation" not in st.session_state:
+        st.session_state.early_validation = True
+    if "best_of_n" not in st.session_state:
+        st.session_state.best_of_n = 1
+    if "hedged_requests" not in st.session_state:
+        st.session_state.hedged_requests = False
+    if "hedge_provider" not in st.session_state:
+        st.session_state.hedge_provider = "Mock AI"
+    if "hedge_percentile" not in st.session_state:
+        st.session_state.hedge_percentile = 95
+    if "fallback_provider" not in st.session_state:
+        st.session_state.fallback_provider = "None"
+    if "session_budget" not in st.session_state:
+        st.session_state.session_budget = 0.0
+    if "budget_policy" not in st.session_state:
+        st.session_state.budget_policy = "downgrade"
+    if "memory" not in st.session_state:
+        st.session_state.memory = create_memory()
+    if "model_cascade" not in st.session_state:
+        st.session_state.model_cascade = False
+    if "cascade_tiers" not in st.session_state:
+        st.session_state.cascade_tiers = ""
 
     # Initialize session state for Vertex AI
     if "vertexai" not in st.session_state:
@@ -161,6 +206,193 @@ def show_privacy_policy(mode) -> bool:
         else :
             return None
 
+# Run a provider coroutine on the shared generation engine honouring the cache bypass setting.
+def run_provider_call(coroutine, bypass_cache=False):
+    with bypass_response_cache(bypass_cache or st.session_state.bypass_cache):
+        return get_generation_engine().run(coroutine)
+
+# Return the provider loaded for an AI option, the mock provider needs no settings.
+def get_provider(ai_option):
+    if ai_option == "Mock AI":
+        return get_client_registry().get_client("mock", MockProvider, model="mock-coder")
+    providers = {
+        "Open AI": st.session_state.openai_langchain,
+        "Vertex AI": st.session_state.vertexai_langchain,
+        "Palm AI": st.session_state.palm_langchain,
+        "Gemini AI": st.session_state.gemini_langchain,
+    }
+    return providers.get(ai_option)
+
+# Return the provider selected in the sidebar.
+def get_selected_provider():
+    return get_provider(st.session_state.ai_option)
+
+# Fall over to the fallback provider while the circuit of the given provider is open.
+def get_available_provider(provider):
+    resilience_manager = get_resilience_manager()
+    if not resilience_manager.is_open(provider.circuit_name):
+        return provider
+    fallback_provider = get_provider(st.session_state.fallback_provider)
+    if fallback_provider is None or fallback_provider is provider or resilience_manager.is_open(fallback_provider.circuit_name):
+        return provider
+    st.toast(f"{provider.provider_name} is unavailable, falling over to {fallback_provider.provider_name}.", icon="⚠️")
+    logger.warning(f"Circuit of {provider.circuit_name} is open, falling over to {fallback_provider.circuit_name}")
+    return fallback_provider
+
+# Generate code, reusing the code of a near duplicate prompt when one was generated before.
+def generate_code_with_similarity_cache(provider, code_prompt, code_language, force_fresh=False):
+    provider = get_available_provider(provider)
+    similarity_cache = get_similarity_cache()
+    namespace = similarity_cache.make_namespace(provider.provider_name, provider.model_name, provider.prompt_namespace(code_language), st.session_state.code_input)
+    st.session_state.similarity_match = None
+
+    if not force_fresh and not st.session_state.bypass_cache and st.session_state.reuse_similar_prompts:
+        similarity_match = similarity_cache.lookup(namespace, code_prompt, st.session_state.similarity_threshold)
+        if similarity_match:
+            logger.info(f"Reusing code of a similar prompt with similarity {similarity_match.score:.2f}")
+            st.session_state.similarity_match = similarity_match
+            return similarity_match.code
+
+    if st.session_state.best_of_n > 1:
+        generated_code = generate_best_of_n(provider, code_prompt, code_language, force_fresh)
+    elif st.session_state.model_cascade:
+        generated_code = generate_cascade(provider, code_prompt, code_language, force_fresh)
+    elif st.session_state.hedged_requests:
+        generated_code = generate_hedged(provider, code_prompt, code_language, force_fresh)
+    elif st.session_state.stream_code:
+        # The tokens are streamed into the code editor area once the page reaches it.
+        st.session_state.pending_stream = {"provider": provider, "code_prompt": code_prompt, "code_language": code_language, "namespace": namespace, "force_fresh": force_fresh}
+        return st.session_state.generated_code
+    else:
+        generated_code = run_provider_call(provider.generate(code_prompt, code_language), bypass_cache=force_fresh)
+        fallback_provider = get_available_provider(provider)
+        if not generated_code and fallback_provider is not provider:
+            # The request which failed just opened the circuit.
+            generated_code = run_provider_call(fallback_provider.generate(code_prompt, code_language), bypass_cache=force_fresh)
+
+    if generated_code:
+        similarity_cache.add(namespace, code_prompt, generated_code)
+        remember_turn("user", f"Generate a program {code_prompt} in {code_language}.", provider)
+        remember_turn("assistant", generated_code, provider)
+    return generated_code
+
+# Record a turn in the conversation memory of the session, old turns are summarized with the provider in the background.
+def remember_turn(role, content, provider=None):
+    st.session_state.memory.add_turn(role, content, summarizer=provider)
+
+# Sample several candidates and keep the one whose output matches the expected output.
+def generate_best_of_n(provider, code_prompt, code_language, force_fresh=False):
+    # Candidates are only executed when the offline compiler license was accepted.
+    execute = bool(st.session_state.compiler_offline_privacy_accepted)
+    selector = BestOfNSelector(st.session_state.general_utils)
+    best_candidate = run_provider_call(selector.generate_best(provider, code_prompt, code_language, st.session_state.best_of_n, st.session_state.code_output, execute, st.session_state.code_input), bypass_cache=force_fresh)
+
+    if not best_candidate:
+        st.toast("Error in code generation: No candidate was generated.", icon="❌")
+        return None
+    if best_candidate.matched:
+        st.toast(f"Candidate {best_candidate.index + 1} of {st.session_state.best_of_n} matched the expected output.", icon="✅")
+    elif execute:
+        st.toast(f"No candidate matched the expected output, using the best ranked candidate {best_candidate.index + 1}.", icon="⚠️")
+    return best_candidate.code
+
+# Generate with the cheapest model tier first and escalate only when the program fails its run.
+def generate_cascade(provider, code_prompt, code_language, force_fresh=False):
+    if not st.session_state.compiler_offline_privacy_accepted:
+        st.toast("Model cascade needs the offline compiler to verify the code, using the selected model only.", icon="⚠️")
+        return run_provider_call(provider.generate(code_prompt, code_language), bypass_cache=force_fresh)
+
+    tiers = [tier.strip() for tier in st.session_state.cascade_tiers.split(",") if tier.strip()]
+    model_cascade = ModelCascade(st.session_state.general_utils, tiers=tiers or None)
+    cascade_result = run_provider_call(model_cascade.generate(provider, code_prompt, code_language, st.session_state.code_output, st.session_state.code_input), bypass_cache=force_fresh)
+    if not cascade_result:
+        st.toast("Error in code generation: No cascade tier generated code.", icon="❌")
+        return None
+    if cascade_result.passed:
+        st.toast(f"Code generated by {cascade_result.model_name} passed its run.", icon="✅")
+    else:
+        st.toast(f"No cascade tier passed its run, using the code of {cascade_result.model_name}.", icon="⚠️")
+    return cascade_result.code
+
+# Race the selected provider against the hedge provider once it is slower than its usual latency.
+def generate_hedged(provider, code_prompt, code_language, force_fresh=False):
+    secondary = get_provider(st.session_state.hedge_provider)
+    if secondary is None or secondary is provider:
+        st.toast(f"Hedge provider '{st.session_state.hedge_provider}' is not initialized, using {provider.provider_name} only.", icon="⚠️")
+        return run_provider_call(provider.generate(code_prompt, code_language), bypass_cache=force_fresh)
+
+    hedged_request = HedgedRequest(percentile=st.session_state.hedge_percentile)
+    hedged_result = run_provider_call(hedged_request.generate(provider, secondary, code_prompt, code_language), bypass_cache=force_fresh)
+    if not hedged_result:
+        st.toast("Error in code generation: Both providers failed.", icon="❌")
+        return None
+    if hedged_result.hedged:
+        st.toast(f"Code generated by the hedge provider {hedged_result.provider_name}.", icon="✅")
+    return hedged_result.code
+
+# Stream the generated code into the code editor area, the full editor is shown once the stream ends.
+def stream_code_to_editor(pending_stream, refresh_interval=0.1):
+    provider = pending_stream["provider"]
+    code_language = pending_stream["code_language"]
+    general_utils = st.session_state.general_utils
+    editor_placeholder = st.empty()
+    fence_parser = FenceParser()
+    validator = StreamingValidator(code_language) if st.session_state.early_validation else None
+    syntax_check = None
+    completion = ""
+    last_refresh = 0.0
+
+    try:
+        with bypass_response_cache(pending_stream["force_fresh"] or st.session_state.bypass_cache):
+            stream = provider.generate_code_stream(pending_stream["code_prompt"], code_language)
+            for chunk in stream:
+                completion += chunk
+                fence_parser.feed(chunk)
+                syntax_check = validator.feed(chunk) if validator else None
+                if syntax_check:
+                    # Stop paying for the rest of a broken answer, the unfinished stream is not cached.
+                    stream.close()
+                    break
+                now = time.monotonic()
+                if now - last_refresh >= refresh_interval:
+                    partial_code = fence_parser.current_code(code_language)
+                    editor_placeholder.code(completion if partial_code is None else partial_code, language=code_language.lower())
+                    last_refresh = now
+    except Exception as exception:
+        st.toast(f"Error in code generation: {exception}", icon="❌")
+        logger.error(f"Error in code streaming: {traceback.format_exc()}")
+        return st.session_state.generated_code
+    finally:
+        editor_placeholder.empty()
+
+    if syntax_check:
+        generated_code = repair_syntax_error(provider, syntax_check, code_language)
+    else:
+        generated_code = general_utils.extract_code(completion, code_language)
+    if generated_code:
+        get_similarity_cache().add(pending_stream["namespace"], pending_stream["code_prompt"], generated_code)
+        remember_turn("user", f"Generate a program {pending_stream['code_prompt']} in {code_language}.", provider)
+        remember_turn("assistant", generated_code, provider)
+    logger.info(f"Code streamed successfully: {completion[:100]}...")
+    return generated_code
+
+# Repair the code of a stream stopped by the early syntax validation.
+def repair_syntax_error(provider, syntax_check, code_language):
+    logger.warning(f"Stopped the stream early, the code does not parse: {syntax_check.diagnostics}")
+    st.toast("The generated code has a syntax error, stopped the generation early to repair it.", icon="❌")
+    st.session_state.stderr = syntax_check.diagnostics
+    st.session_state.output = syntax_check.diagnostics
+    try:
+        if syntax_check.complete:
+            return st.session_state.general_utils.repair_code(provider, syntax_check.code, code_language, syntax_check.diagnostics)
+        # Only the beginning of the program has arrived, so the fix has to write the rest as well.
+        fix_instructions = " ".join(filter(None, [st.session_state.code_fix_instructions, "The program is cut off, complete it."]))
+        return get_generation_engine().run(provider.fix(syntax_check.code, code_language, fix_instructions))
+    except Exception as exception:
+        st.toast(f"Error in code repair: {exception}", icon="❌")
+        logger.error(f"Error in early syntax repair: {traceback.format_exc()}")
+        return syntax_check.code
+
 # Load the CSS files
 def load_css(file_name):
     with open(file_name) as f:
@@ -185,6 +417,20 @@ def display_code_editor(font_size, tab_size, theme, keybinding, show_gutter, sho
     elif st.session_state.generated_code and st.session_state.compiler_mode == "Online":
         st.components.v1.html(st.session_state.output,width=720, height=800, scrolling=True)
 
+# Display the metered token usage and cost of the session per model, and the total of the day.
+def display_usage_cost():
+    usage_ledger = get_usage_ledger()
+    session_usage = usage_ledger.aggregate("model", session_id=current_session_id())
+    if not session_usage:
+        st.info("No provider usage recorded in this session yet.")
+        return
+    st.table([
+        {"Model": row["model"], "Requests": row["requests"], "Prompt Tokens": row["prompt_tokens"], "Completion Tokens": row["completion_tokens"], "Cost": f"{row['cost']:.6f} USD"}
+        for row in session_usage
+    ])
+    today = time.strftime("%Y-%m-%d", time.gmtime())
+    st.caption(f"Session cost: {sum(row['cost'] for row in session_usage):.6f} USD | Today: {usage_ledger.total_cost(day=today):.6f} USD | Price table {usage_ledger.price_table.version}")
+
 def display_support():
     st.markdown("<div style='text-align: center;'>Share and Support</div>", unsafe_allow_html=True)
     
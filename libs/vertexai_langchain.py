@@ -1,4 +1,3 @@
-import re
 import traceback
 from langchain import LLMChain, PromptTemplate
 from langchain.llms import VertexAI
@@ -7,8 +6,11 @@ import streamlit as st
 from google.oauth2 import service_account
 from langchain.prompts import ChatPromptTemplate
 import libs.general_utils
+from libs.llm_provider import LLMProvider
+
+class VertexAILangChain(LLMProvider):
+    provider_name = "vertexai"
 
-class VertexAILangChain:
     def __init__(self, project="", location="us-central1", model_name="code-bison", max_tokens=256, temperature:float=0.3, credentials_file_path=None):
         self.project = project
         self.location = location
@@ -19,6 +21,11 @@ class VertexAILangChain:
         self.vertexai_llm = None
         self.utils = libs.general_utils.GeneralUtils()
 
+    @property
+    def rate_limit_key(self):
+        # Vertex AI quotas are enforced per project and region.
+        return f"{self.provider_name}/{self.project}/{self.location}"
+
     def load_model(self, model_name, max_tokens, temperature):
         try:
             logger.info(f"Loading model... with project: {self.project} and location: {self.location}")
@@ -43,8 +50,6 @@ class VertexAILangChain:
 
     def generate_code(self, code_prompt, code_language):
         try:
-            # Dynamically construct guidelines based on session state
-            guidelines_list = []
             logger.info(f"Generating code with parameters: {code_prompt}, {code_language}")
             
             # Check for empty or null code prompt and code language
@@ -53,81 +58,28 @@ class VertexAILangChain:
                 st.toast("Code prompt is empty or null.", icon="❌")
                 return None
             
-            if st.session_state["coding_guidelines"]["modular_code"]:
-                logger.info("Modular code is enabled.")
-                guidelines_list.append("- Ensure the method is modular in its approach.")
-            if st.session_state["coding_guidelines"]["exception_handling"]:
-                logger.info("Exception handling is enabled.")
-                guidelines_list.append("- Integrate robust exception handling.")
-            if st.session_state["coding_guidelines"]["error_handling"]:
-                logger.info("Error handling is enabled.")
-                guidelines_list.append("- Add error handling to each module.")
-            if st.session_state["coding_guidelines"]["efficient_code"]:
-                logger.info("Efficient code is enabled.")
-                guidelines_list.append("- Optimize the code to ensure it runs efficiently.")
-            if st.session_state["coding_guidelines"]["robust_code"]:
-                logger.info("Robust code is enabled.")
-                guidelines_list.append("- Ensure the code is robust against potential issues.")
-            if st.session_state["coding_guidelines"]["naming_conventions"]:
-                logger.info("Naming conventions is enabled.")
-                guidelines_list.append("- Follow standard naming conventions.")
-            
-            logger.info("Guidelines: " + str(guidelines_list))
-
-            # Convert the list to a string
-            guidelines = "\n".join(guidelines_list)
-
-            # Setting Prompt Template.
-            input_section = f"Given the input for code: {st.session_state.code_input}" if st.session_state.code_input else "make sure the program doesn't ask for any input from the user"
-
-            template = f"""
-            Task: Design a program {{code_prompt}} in {{code_language}} with the following guidelines and
-            make sure the output is printed on the screen.
-            And make sure the output contains only the code and nothing else.
-            {input_section}
-
-            Guidelines:
-            {guidelines}
-            """
-            
-            prompt = PromptTemplate(template=template,input_variables=["code_prompt", "code_language"])
-            formatted_prompt = prompt.format(code_prompt=code_prompt, code_language=code_language)
+            formatted_prompt = self.build_generate_prompt(code_prompt, code_language)
             logger.info(f"Formatted prompt: {formatted_prompt}")
             
-            logger.info("Setting up LLMChain...")
-            llm_chain = LLMChain(prompt=prompt, llm=self.vertexai_llm)
-            logger.info("LLMChain setup successfully.")
-            
-            # Pass the required inputs as a dictionary to the chain
-            logger.info("Running LLMChain...")
-            response = llm_chain.run({"code_prompt": code_prompt, "code_language": code_language})
+            logger.info("Running Vertex AI model...")
+            response = self.complete(formatted_prompt)
             if response or len(response) > 0:
                 logger.info(f"Code generated successfully: {response}")
                 
-                # Extract text inside code block
-                if response.startswith("```") or response.endswith("```"):
-                    try:
-                        generated_code = re.search('```(.*)```', response, re.DOTALL).group(1)
-                    except AttributeError:
-                        generated_code = response
+                # Extract the block written in the requested language.
+                if "```" in response:
+                    response = self.utils.extract_code(response, code_language)
+                    logger.info(f"Code generated successfully: {response}")
                 else:
                     st.toast(f"Error extracting code", icon="❌")
                     return response
-                    
-                if generated_code:
-                    # Skip the language name in the first line.
-                    response = generated_code.split("\n", 1)[1]
-                    logger.info(f"Code generated successfully: {response}")
-                else:
-                    logger.error(f"Error generating code: {response}")
-                    st.toast(f"Error generating code: {response}", icon="❌")
             return response
         except Exception as exception:
             stack_trace = traceback.format_exc()
             logger.error(f"Error generating code: {str(exception)} stack trace: {stack_trace}")
             st.toast(f"Error generating code: {str(exception)} stack trace: {stack_trace}", icon="❌")
 
-    def generate_code_completion(self, code_prompt, code_language):
+    def generate_code_completion(self, code_prompt, code_language, max_tokens=None, temperature=None):
         try:
             if not code_prompt or len(code_prompt) == 0:
                 logger.error("Code prompt is empty or null.")
@@ -138,8 +90,8 @@ class VertexAILangChain:
             template = f"Complete the following {{code_language}} code: {{code_prompt}}"
             prompt_obj = PromptTemplate(template=template, input_variables=["code_language", "code_prompt"])
             
-            max_tokens = st.session_state["vertexai"]["max_tokens"]
-            temprature = st.session_state["vertexai"]["temperature"]
+            max_tokens = max_tokens or self.max_tokens
+            temprature = temperature if temperature is not None else self.temperature
             
             # Check the maximum number of tokens of Gecko model i.e 65
             if max_tokens > 65:
@@ -147,10 +99,11 @@ class VertexAILangChain:
                 logger.info(f"Maximum number of tokens for Model Gecko can't exceed 65. Setting max_tokens to 65.")
                 st.toast(f"Maximum number of tokens for Model Gecko can't exceed 65. Setting max_tokens to 65.", icon="⚠️")
                 
-            self.model_name = "code-gecko" # Define the code completion model name.
-            self.llm = VertexAI(model_name=self.model_name,max_output_tokens=max_tokens, temperature=temprature)
-            logger.info(f"Initialized VertexAI with model: {self.model_name}")
-            llm_chain = LLMChain(prompt=prompt_obj, llm=self.llm)
+            # The completion model is local to the call, the client is shared across sessions by the registry.
+            completion_model_name = "code-gecko"
+            completion_llm = VertexAI(model_name=completion_model_name, max_output_tokens=max_tokens, temperature=temprature)
+            logger.info(f"Initialized VertexAI with model: {completion_model_name}")
+            llm_chain = LLMChain(prompt=prompt_obj, llm=completion_llm)
             response = llm_chain.run({"code_prompt": code_prompt, "code_language": code_language})
             
             if response:
@@ -180,5 +133,10 @@ class VertexAILangChain:
         # call load_model to reload the model with the new model_name and rest values should be same
         self.load_model(self.model_name, self.max_tokens, self.temperature)
 
+    def _complete(self, prompt, **options):
+        return self.vertexai_llm.predict(prompt)
 
-
+    def _stream_complete(self, prompt, **options):
+        # Uses the streaming predict endpoint of the Vertex AI model.
+        for chunk in self.vertexai_llm.stream(prompt):
+            yield chunk
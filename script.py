@@ -22,11 +22,56 @@ from libs.general_utils import GeneralUtils
 from libs.lang_codes import get_language_codes
 from libs.openai_langchain import OpenAILangChain
 from libs.logger import logger
+from libs.response_cache import get_response_cache
+from libs.client_registry import get_client_registry
+from libs.resilience import get_resilience_manager
+from libs.rate_limiter import get_rate_limiter
+from libs.single_flight import get_single_flight
+from libs.budget import get_budget_controller
+from libs.model_cascade import get_tier_stats
+from libs.toolchain_registry import get_toolchain_registry
+from libs.compile_cache import get_compile_cache
+from libs.python_worker_pool import get_python_worker_pool
 from libs.utils import *
 from streamlit_ace import st_ace
 
 st.session_state.general_utils = None
 
+# Provider clients are taken from the process wide registry so reruns reuse warm clients.
+def load_openai_client(api_key):
+    settings = st.session_state["openai"]
+    return get_client_registry().get_client(
+        "openai", lambda: OpenAILangChain(api_key, st.session_state.code_language, settings["temperature"], settings["max_tokens"], settings["model_name"], st.session_state.proxy_api),
+        model=settings["model_name"], temperature=settings["temperature"], max_tokens=settings["max_tokens"], credentials=[api_key, st.session_state.proxy_api])
+
+def load_palm_client(api_key):
+    settings = st.session_state["palm"]
+    return get_client_registry().get_client(
+        "palm", lambda: PalmAI(api_key, model=settings["model_name"], temperature=settings["temperature"], max_output_tokens=settings["max_tokens"]),
+        model=settings["model_name"], temperature=settings["temperature"], max_tokens=settings["max_tokens"], credentials=[api_key])
+
+def load_gemini_client(api_key):
+    settings = st.session_state["gemini"]
+    return get_client_registry().get_client(
+        "gemini", lambda: GeminiAI(api_key, model=settings["model_name"], temperature=settings["temperature"], max_output_tokens=settings["max_tokens"]),
+        model=settings["model_name"], temperature=settings["temperature"], max_tokens=settings["max_tokens"], credentials=[api_key])
+
+def load_vertexai_client(credentials_file_path):
+    settings = st.session_state["vertexai"]
+
+    def create_client():
+        client = VertexAILangChain(project=st.session_state.project, location=st.session_state.region, model_name=settings["model_name"], max_tokens=settings["max_tokens"], temperature=settings["temperature"], credentials_file_path=credentials_file_path)
+        # A client which failed to load is not registered, so the next rerun tries again.
+        if not client.load_model(settings["model_name"], settings["max_tokens"], settings["temperature"]):
+            raise RuntimeError("Vertex AI model could not be loaded.")
+        return client
+
+    # The credentials file is deleted after 60 seconds, its content identifies the credentials.
+    return get_client_registry().get_client(
+        "vertexai", create_client,
+        model=settings["model_name"], temperature=settings["temperature"], max_tokens=settings["max_tokens"],
+        credentials=[st.session_state.project, st.session_state.region, st.session_state.uploaded_file.getvalue()])
+
 def main():
 
     # set the streamlit app to full width and dark theme
@@ -43,6 +88,10 @@ def main():
         initialize_session_state()
         st.session_state.initialize_sessions = True
         logger.info("Session state initialized successfully.")
+
+    # Discover the compilers and start the Python workers in the background before the first run needs them.
+    get_toolchain_registry()
+    get_python_worker_pool()
     
     # Initialize classes
     code_language = st.session_state.get("code_language", "Python")
@@ -77,6 +126,45 @@ def main():
         with st.expander("General Settings", expanded=False):
             st.session_state.display_cost = st.checkbox("Display Cost/API", value=False)
             st.session_state.download_logs = st.checkbox("Download Logs", value=False)
+            st.session_state.bypass_cache = st.checkbox("Bypass Cache", value=st.session_state.bypass_cache)
+            st.session_state.stream_code = st.checkbox("Stream Code", value=st.session_state.stream_code)
+            if st.session_state.stream_code:
+                st.session_state.early_validation = st.checkbox("Early Syntax Validation", value=st.session_state.early_validation, help="Check the code while it streams and stop a broken generation early to repair it.")
+            st.session_state.best_of_n = st.slider("Best of N", min_value=1, max_value=8, value=st.session_state.best_of_n, step=1, help="Sample N candidates and keep the one matching the expected output.")
+            st.session_state.hedged_requests = st.checkbox("Hedged Requests", value=st.session_state.hedged_requests, help="Send the request to a second provider when the selected one is slower than usual.")
+            if st.session_state.hedged_requests:
+                hedge_options = [option for option in ["Mock AI", "Open AI", "Vertex AI", "Palm AI", "Gemini AI"] if option != st.session_state.ai_option]
+                hedge_index = hedge_options.index(st.session_state.hedge_provider) if st.session_state.hedge_provider in hedge_options else 0
+                st.session_state.hedge_provider = st.selectbox("Hedge Provider", hedge_options, index=hedge_index)
+                st.session_state.hedge_percentile = st.slider("Hedge Percentile", min_value=50, max_value=99, value=st.session_state.hedge_percentile, step=1)
+            st.session_state.model_cascade = st.checkbox("Model Cascade", value=st.session_state.model_cascade, help="Generate with the cheapest model first and escalate only when the code fails its run.")
+            if st.session_state.model_cascade:
+                st.session_state.cascade_tiers = st.text_input("Cascade Tiers", value=st.session_state.cascade_tiers, placeholder="gpt-3.5-turbo, gpt-4", help="Models from cheapest to most expensive, empty uses the defaults.")
+                tier_stats = get_tier_stats().get_stats()
+                if tier_stats:
+                    st.caption(" | ".join(f"{name}: {stats['successes']}/{stats['attempts']}" for name, stats in tier_stats.items()))
+            fallback_options = ["None"] + [option for option in ["Mock AI", "Open AI", "Vertex AI", "Palm AI", "Gemini AI"] if option != st.session_state.ai_option]
+            fallback_index = fallback_options.index(st.session_state.fallback_provider) if st.session_state.fallback_provider in fallback_options else 0
+            st.session_state.fallback_provider = st.selectbox("Fallback Provider", fallback_options, index=fallback_index, help="Used while the selected provider is failing.")
+            resilience_stats = get_resilience_manager().get_stats()
+            open_circuits = [name for name, breaker in resilience_stats["breakers"].items() if breaker["state"] != "closed"]
+            st.caption(f"Retries: {resilience_stats['retries']} | Failures: {resilience_stats['failures']} | Open circuits: {', '.join(open_circuits) or 'none'}")
+            rate_limit_stats = get_rate_limiter().get_stats()
+            st.caption(f"Coalesced requests: {get_single_flight().stats['coalesced']} | Throttled: {rate_limit_stats['throttled']} ({rate_limit_stats['waited_seconds']:.0f}s)")
+            st.session_state.session_budget = st.number_input("Session Budget (USD)", min_value=0.0, value=st.session_state.session_budget, step=0.1, help="0 means unlimited.")
+            budget_policies = ["downgrade", "reject"]
+            st.session_state.budget_policy = st.radio("Over Budget", budget_policies, index=budget_policies.index(st.session_state.budget_policy), format_func=lambda policy: "Use a cheaper model" if policy == "downgrade" else "Reject the request", horizontal=True)
+            budget_controller = get_budget_controller()
+            budget_controller.configure_session(current_session_id(), st.session_state.session_budget or None, st.session_state.budget_policy)
+            session_remaining, global_remaining = budget_controller.remaining(current_session_id())
+            if session_remaining is not None or global_remaining is not None:
+                st.caption(" | ".join(f"{name} budget left: {remaining:.4f} USD" for name, remaining in (("Session", session_remaining), ("Daily", global_remaining)) if remaining is not None))
+            cache_stats = get_response_cache().get_stats()
+            st.caption(f"Cache hits: {cache_stats['hits']} | Misses: {cache_stats['misses']} | Hit rate: {cache_stats['hit_rate']:.0%}")
+            compile_stats = get_compile_cache().get_stats()
+            st.caption(f"Compile cache hits: {compile_stats['hits']} | Builds: {compile_stats['builds']} | Compile time saved: {compile_stats['build_seconds_saved']:.1f}s")
+            st.session_state.reuse_similar_prompts = st.checkbox("Reuse Similar Prompts", value=st.session_state.reuse_similar_prompts)
+            st.session_state.similarity_threshold = st.slider("Similarity Threshold", min_value=0.5, max_value=1.0, value=st.session_state.similarity_threshold, step=0.05)
             # Display the logs
             if st.session_state.download_logs:
                 logs_filename = "langchain-coder.log"
@@ -86,6 +174,19 @@ def main():
                     # download the logs
                     file_format = "text/plain"
                     st.session_state.download_link = st.session_state.general_utils.generate_download_link(logs_data, logs_filename, file_format,True)
+
+        # Compilers found on this machine, discovered once in the background.
+        with st.expander("Toolchains", expanded=False):
+            toolchain_registry = get_toolchain_registry()
+            toolchains = toolchain_registry.inventory()
+            if not toolchains:
+                st.caption("Discovering compilers...")
+            for language_code, toolchain in sorted(toolchains.items()):
+                st.caption(f"{'✅' if toolchain.available else '❌'} {language_code}: {toolchain.version or 'not found'}" + (f" ({toolchain.path})" if toolchain.path else ""))
+            if st.button("Rediscover Toolchains"):
+                toolchain_registry.invalidate()
+                toolchain_registry.discover()
+                st.rerun()
                 
         # Setting options for Open AI
         api_key = None
@@ -112,7 +213,7 @@ def main():
                         logger.info("OpenAI API key is initialized from user input.")
                     
                     st.session_state.proxy_api = st.text_input("Proxy API", value="",placeholder="http://myproxy-api.replit.co/")
-                    st.session_state.openai_langchain = OpenAILangChain(api_key,st.session_state.code_language, st.session_state["openai"]["temperature"], st.session_state["openai"]["max_tokens"], st.session_state["openai"]["model_name"])
+                    st.session_state.openai_langchain = load_openai_client(api_key)
                     st.toast("Open AI initialized successfully.", icon="✅")
                 except Exception as exception:
                     st.toast(f"Error loading Open AI: {str(exception)}", icon="❌")
@@ -152,9 +253,9 @@ def main():
                     if st.session_state.project and st.session_state.region and st.session_state.uploaded_file:
                         try:
                             # Initialize vertex ai model
+                            st.session_state.vertexai_langchain = load_vertexai_client(credentials_file_path)
                             if not st.session_state.vertex_ai_loaded:
-                                st.session_state.vertexai_langchain= VertexAILangChain(project=st.session_state.project, location=st.session_state.region, model_name=st.session_state["vertexai"]["model_name"], max_tokens=st.session_state["vertexai"]["max_tokens"], temperature=st.session_state["vertexai"]["temperature"], credentials_file_path=credentials_file_path)
-                                st.session_state.vertex_ai_loaded = st.session_state.vertexai_langchain.load_model(st.session_state["vertexai"]["model_name"],st.session_state["vertexai"]["max_tokens"],st.session_state["vertexai"]["temperature"])
+                                st.session_state.vertex_ai_loaded = True
                                 st.toast("Vertex AI initialized successfully.", icon="✅")
                         except Exception as exception:
                             st.toast(f"Error loading Vertex AI: {str(exception)}", icon="❌")
@@ -204,7 +305,7 @@ def main():
                         logger.info("Palm API key is initialized from user input.")
 
                     try:
-                        st.session_state.palm_langchain = PalmAI(api_key, model=st.session_state["palm"]["model_name"], temperature=st.session_state["palm"]["temperature"], max_output_tokens=st.session_state["palm"]["max_tokens"])
+                        st.session_state.palm_langchain = load_palm_client(api_key)
                     except Exception as exception:
                         st.toast(f"Error initializing PalmAI: {str(exception)}", icon="❌")
                         logger.error(f"Error initializing PalmAI: {str(exception)}")
@@ -236,7 +337,7 @@ def main():
                         logger.info("Gemini API key is initialized from user input.")
 
                     try:
-                        st.session_state.gemini_langchain = GeminiAI(api_key, model=st.session_state["gemini"]["model_name"], temperature=st.session_state["gemini"]["temperature"], max_output_tokens=st.session_state["gemini"]["max_tokens"])
+                        st.session_state.gemini_langchain = load_gemini_client(api_key)
                     except Exception as exception:
                         st.toast(f"Error initializing Gemini AI: {str(exception)}", icon="❌")
                         logger.error(f"Error initializing Gemini AI: {str(exception)}")
@@ -311,14 +412,14 @@ def main():
             if generate_submitted:
                 if st.session_state.ai_option == "Open AI":
                     if st.session_state.openai_langchain:
-                        st.session_state.generated_code = st.session_state.openai_langchain.generate_code(st.session_state.code_prompt, code_language)
+                        st.session_state.generated_code = generate_code_with_similarity_cache(st.session_state.openai_langchain, st.session_state.code_prompt, code_language)
                     else:# Reinitialize the chain
                         if api_key == None:
                             st.toast("Open AI API key is not initialized.", icon="❌")
                             logger.error("Open AI API key is not initialized.")
                         else:
-                            st.session_state.openai_langchain = OpenAILangChain(api_key,st.session_state.code_language,st.session_state["openai"]["temperature"],st.session_state["openai"]["max_tokens"],st.session_state["openai"]["model_name"])
-                            st.session_state.generated_code = st.session_state.openai_langchain.generate_code(st.session_state.code_prompt, code_language)
+                            st.session_state.openai_langchain = load_openai_client(api_key)
+                            st.session_state.generated_code = generate_code_with_similarity_cache(st.session_state.openai_langchain, st.session_state.code_prompt, code_language)
                 elif st.session_state.ai_option == "Vertex AI":
                     if st.session_state.vertexai_langchain:
                         if not st.session_state.vertex_ai_loaded:
@@ -326,35 +427,35 @@ def main():
                             logger.error("Vetex AI is not initialized.")
                             return
                         if st.session_state["vertexai"]["model_name"] == "code-bison":
-                            st.session_state.generated_code = st.session_state.vertexai_langchain.generate_code(st.session_state.code_prompt, code_language)
+                            st.session_state.generated_code = generate_code_with_similarity_cache(st.session_state.vertexai_langchain, st.session_state.code_prompt, code_language)
                         else:
-                            st.session_state.generated_code = st.session_state.vertexai_langchain.generate_code_completion(st.session_state.code_prompt, code_language)
+                            st.session_state.generated_code = st.session_state.vertexai_langchain.generate_code_completion(st.session_state.code_prompt, code_language, st.session_state["vertexai"]["max_tokens"], st.session_state["vertexai"]["temperature"])
                     else: # Reinitalize the chain
-                        st.session_state.vertexai_langchain= VertexAILangChain(project=st.session_state.project, location=st.session_state.region, model_name=st.session_state["vertexai"]["model_name"], max_tokens=st.session_state["vertexai"]["max_tokens"], temperature=st.session_state["vertexai"]["temperature"], credentials_file_path=credentials_file_path)
-                        st.session_state.vertex_ai_loaded = st.session_state.vertexai_langchain.load_model(st.session_state["vertexai"]["model_name"],st.session_state["vertexai"]["max_tokens"],st.session_state["vertexai"]["temperature"])
-                        st.session_state.generated_code = st.session_state.vertexai_langchain.generate_code(st.session_state.code_prompt, code_language)
+                        st.session_state.vertexai_langchain = load_vertexai_client(credentials_file_path)
+                        st.session_state.vertex_ai_loaded = True
+                        st.session_state.generated_code = generate_code_with_similarity_cache(st.session_state.vertexai_langchain, st.session_state.code_prompt, code_language)
                 
                 elif st.session_state.ai_option == "Palm AI":
                     if st.session_state.palm_langchain:
-                        st.session_state.generated_code = st.session_state.palm_langchain.generate_code(st.session_state.code_prompt, code_language)
+                        st.session_state.generated_code = generate_code_with_similarity_cache(st.session_state.palm_langchain, st.session_state.code_prompt, code_language)
                     else:# Reinitialize the chain
                         if api_key == None:
                             st.toast("Palm AI API key is not initialized.", icon="❌")
                             logger.error("Palm AI API key is not initialized.")
                         else:
-                            st.session_state.palm_langchain = PalmAI(api_key, model=st.session_state["palm"]["model_name"], temperature=st.session_state["palm"]["temperature"], max_output_tokens=st.session_state["palm"]["max_tokens"])
-                            st.session_state.generated_code = st.session_state.palm_langchain.generate_code(st.session_state.code_prompt, code_language)
+                            st.session_state.palm_langchain = load_palm_client(api_key)
+                            st.session_state.generated_code = generate_code_with_similarity_cache(st.session_state.palm_langchain, st.session_state.code_prompt, code_language)
             
                 elif st.session_state.ai_option == "Gemini AI":
                     if st.session_state.gemini_langchain:
-                        st.session_state.generated_code = st.session_state.gemini_langchain.generate_code(st.session_state.code_prompt, code_language)
+                        st.session_state.generated_code = generate_code_with_similarity_cache(st.session_state.gemini_langchain, st.session_state.code_prompt, code_language)
                     else:# Reinitialize the chain
                         if api_key == None:
                             st.toast("Gemini AI API key is not initialized.", icon="❌")
                             logger.error("Gemini AI API key is not initialized.")
                         else:
-                            st.session_state.gemini_langchain = GeminiAI(api_key, model=st.session_state["gemini"]["model_name"], temperature=st.session_state["gemini"]["temperature"], max_output_tokens=st.session_state["gemini"]["max_tokens"])
-                            st.session_state.generated_code = st.session_state.gemini_langchain.generate_code(st.session_state.code_prompt, code_language)
+                            st.session_state.gemini_langchain = load_gemini_client(api_key)
+                            st.session_state.generated_code = generate_code_with_similarity_cache(st.session_state.gemini_langchain, st.session_state.code_prompt, code_language)
                 
                 else:
                     st.toast(f"Please select a valid AI option selected '{st.session_state.ai_option}' option", icon="❌")
@@ -383,7 +484,9 @@ def main():
                     logger.info("Setting Stderr from input to Debug instructions.")
                     
                 logger.info(f"Fixing code with instructions: {st.session_state.code_fix_instructions}")
-                st.session_state.generated_code = ai_llm_selected.fix_generated_code(st.session_state.generated_code, st.session_state.code_language,st.session_state.code_fix_instructions)
+                st.session_state.generated_code = run_provider_call(ai_llm_selected.fix(st.session_state.generated_code, st.session_state.code_language,st.session_state.code_fix_instructions))
+                remember_turn("user", f"Fix the code: {st.session_state.code_fix_instructions or st.session_state.stderr}", ai_llm_selected)
+                remember_turn("assistant", st.session_state.generated_code, ai_llm_selected)
 
         # Debug Code button in the fourth column
         with convert_code_col:
@@ -399,7 +502,9 @@ def main():
                     ai_llm_selected = st.session_state.openai_langchain
                     
                 logger.info(f"Converting code with instructions: {st.session_state.code_fix_instructions}")
-                st.session_state.generated_code = ai_llm_selected.convert_generated_code(st.session_state.generated_code, st.session_state.code_language)
+                st.session_state.generated_code = run_provider_call(ai_llm_selected.convert(st.session_state.generated_code, st.session_state.code_language))
+                remember_turn("user", f"Convert the code to {st.session_state.code_language}.", ai_llm_selected)
+                remember_turn("assistant", st.session_state.generated_code, ai_llm_selected)
 
 
         # Run Code button in the fourth column
@@ -410,7 +515,7 @@ def main():
                 privacy_accepted = st.session_state.get(f'compiler_{st.session_state.compiler_mode.lower()}_privacy_accepted', False)
     
                 if privacy_accepted:
-                    st.session_state.output = st.session_state.general_utils.execute_code(st.session_state.compiler_mode)
+                    st.session_state.output = st.session_state.general_utils.execute_code(st.session_state.compiler_mode, get_selected_provider())
                 else:
                     st.toast(f"You didn't accept the privacy policy for {st.session_state.compiler_mode} compiler.", icon="❌")
                     logger.error(f"You didn't accept the privacy policy for {st.session_state.compiler_mode} compiler.")
@@ -427,9 +532,31 @@ def main():
                 st.toast(f"Example code loaded successfully. Task name: {task_name}, Task input: {task_input}, Task output: {task_output}", icon="✅")
                 st.rerun()
 
+    # Let the user accept the code reused from a similar prompt or force a fresh generation.
+    if st.session_state.similarity_match:
+        similarity_match = st.session_state.similarity_match
+        st.info(f"Reused code generated for a similar prompt (similarity {similarity_match.score:.0%}): '{similarity_match.prompt[:100]}'")
+        accept_col, regenerate_col = st.columns(2)
+        with accept_col:
+            if st.button("Accept Code"):
+                st.session_state.similarity_match = None
+                st.rerun()
+        with regenerate_col:
+            if st.button("Generate Fresh"):
+                provider = get_selected_provider()
+                if provider:
+                    st.session_state.generated_code = generate_code_with_similarity_cache(provider, st.session_state.code_prompt, st.session_state.code_language, force_fresh=True)
+                st.rerun()
+
     # Show the privacy policy for compilers.
     handle_privacy_policy(st.session_state.compiler_mode)
     
+    # Stream the pending generation into the code editor area.
+    if st.session_state.pending_stream:
+        pending_stream = st.session_state.pending_stream
+        st.session_state.pending_stream = None
+        st.session_state.generated_code = stream_code_to_editor(pending_stream)
+
     # Save and Run Code
     if st.session_state.generated_code:
         # Sidebar for settings
@@ -470,60 +597,9 @@ def main():
                 else:
                     st.code(st.session_state.output, language=st.session_state.code_language.lower())
 
-        # Display the price of the generated code.
-        if st.session_state.generated_code and st.session_state.display_cost:
-            if st.session_state.ai_option == "Open AI":
-                selected_model = st.session_state["openai"]["model_name"]
-                if selected_model == "gpt-3":
-                    cost, cost_per_whole_string, total_cost = st.session_state.general_utils.gpt_3_generation_cost(st.session_state.generated_code)
-                    st.table([["Cost/1K Token", f"{cost} USD"], ["Cost/Whole String", f"{cost_per_whole_string} USD"], ["Total Cost", f"{total_cost} USD"]])
-                elif selected_model == "gpt-4":
-                    cost, cost_per_whole_string, total_cost = st.session_state.general_utils.gpt_4_generation_cost(st.session_state.generated_code)
-                    st.table([["Cost/1K Token", f"{cost} USD"], ["Cost/Whole String", f"{cost_per_whole_string} USD"], ["Total Cost", f"{total_cost} USD"]])
-                elif selected_model == "text-davinci-003":
-                    cost, cost_per_whole_string, total_cost = st.session_state.general_utils.gpt_text_davinci_generation_cost(st.session_state.generated_code)
-                    st.table([["Cost/1K Token", f"{cost} USD"], ["Cost/Whole String", f"{cost_per_whole_string} USD"], ["Total Cost", f"{total_cost} USD"]])
-            
-            elif st.session_state.ai_option == "Vertex AI":
-                selected_model = st.session_state["vertexai"]["model_name"]
-                if selected_model == "code-bison" or selected_model == "code-gecko":
-                    cost, cost_per_whole_string, total_cost = st.session_state.general_utils.codey_generation_cost(st.session_state.generated_code)
-                    st.table([["Cost/1K Token", f"{cost} USD"], ["Cost/Whole String", f"{cost_per_whole_string} USD"], ["Total Cost", f"{total_cost} USD"]])
-            
-            elif st.session_state.ai_option == "Palm AI":
-                selected_model = st.session_state["palm"]["model_name"]
-                if selected_model == "text-bison-001":
-                    cost = 0.00025  # Cost per 1K input characters for online requests
-                    cost_per_whole_string = 0.0005  # Cost per 1K output characters for online requests
-                    total_cost = st.session_state.general_utils.palm_text_bison_generation_cost(st.session_state.generated_code)
-                    st.table([["Cost/1K Token", f"{cost} USD"], ["Cost/Whole String", f"{cost_per_whole_string} USD"], ["Total Cost", f"{total_cost} USD"]])
-                elif selected_model == "chat-bison-001":
-                    cost = 0.00025  # Cost per 1K input characters for online requests
-                    cost_per_whole_string = 0.0005  # Cost per 1K output characters for online requests
-                    total_cost = st.session_state.general_utils.palm_chat_bison_generation_cost(st.session_state.generated_code)
-                    st.table([["Cost/1K Token", f"{cost} USD"], ["Cost/Whole String", f"{cost_per_whole_string} USD"], ["Total Cost", f"{total_cost} USD"]])
-                elif selected_model == "embedding-gecko-001":
-                    cost = 0.0002  # Cost per 1K characters input for generating embeddings using text as an input
-                    cost_per_whole_string = 0.0002  # Assuming the same cost for output characters
-                    total_cost = st.session_state.general_utils.palm_embedding_gecko_generation_cost(st.session_state.generated_code)
-                    st.table([["Cost/1K Token", f"{cost} USD"], ["Cost/Whole String", f"{cost_per_whole_string} USD"], ["Total Cost", f"{total_cost} USD"]])
-
-            elif st.session_state.ai_option == "Gemini AI":
-                selected_model = st.session_state["gemini"]["model_name"]
-                
-                if selected_model == "gemini-pro":
-                    cost_per_input_char = 0.00025  # Cost per 1K input characters for online requests
-                    cost_per_output_char = 0.0005  # Cost per 1K output characters for online requests
-                    total_cost = st.session_state.general_utils.gemini_pro_generation_cost(st.session_state.generated_code)
-                    st.table([["Cost/1K Input Token", f"{cost_per_input_char} USD"], ["Cost/1K Output Token", f"{cost_per_output_char} USD"], ["Total Cost", f"{total_cost} USD"]])
-                
-                elif selected_model == "gemini-pro-vision":
-                    cost_per_image = 0.0025  # Cost per image for online requests
-                    cost_per_second = 0.002  # Cost per second for online requests
-                    cost_per_input_char = 0.00025  # Cost per 1K input characters for online requests
-                    cost_per_output_char = 0.0005  # Cost per 1K output characters for online requests
-                    total_cost = st.session_state.general_utils.gemini_pro_vision_generation_cost(st.session_state.generated_code)
-                    st.table([["Cost/Image", f"{cost_per_image} USD"], ["Cost/Second", f"{cost_per_second} USD"], ["Cost/1K Input Token", f"{cost_per_input_char} USD"], ["Cost/1K Output Token", f"{cost_per_output_char} USD"], ["Total Cost", f"{total_cost} USD"]])
+        # Display the metered usage and cost of the session.
+        if st.session_state.display_cost:
+            display_usage_cost()
                 
     # Expander for coding guidelines
     with st.sidebar.expander("Coding Guidelines"):
@@ -0,0 +1,38 @@
+"""
+# LangChain Coder - HTTP service
+Serves generate, fix, convert, complete and execute over HTTP for IDE plugins and CI, see libs/coder_service.py.
+
+Usage:
+    python serve.py --port 8765 --default-provider mock --allow-execution
+    curl -s localhost:8765/v1/generate -d '{"code_prompt": "hello world", "code_language": "Python"}'
+"""
+import argparse
+import asyncio
+import os
+from dotenv import load_dotenv
+from libs.coder_service import CoderService
+from libs.logger import logger
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Run the LangChain Coder HTTP service.")
+    parser.add_argument("--host", default=os.getenv("SERVICE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVICE_PORT", 8765)))
+    parser.add_argument("--execution-workers", type=int, default=int(os.getenv("SERVICE_EXECUTION_WORKERS", 4)), help="Maximum number of programs running at once.")
+    parser.add_argument("--timeout", type=float, default=float(os.getenv("SERVICE_REQUEST_TIMEOUT", 120)), help="Default request timeout in seconds.")
+    parser.add_argument("--default-provider", default=os.getenv("SERVICE_DEFAULT_PROVIDER", "mock"), help="Provider used when a request names none, mock runs offline.")
+    parser.add_argument("--allow-execution", action="store_true", default=os.getenv("SERVICE_ALLOW_EXECUTION") == "1",
+                        help="Allow /v1/execute to run the submitted code on this machine.")
+    return parser.parse_args()
+
+def main():
+    load_dotenv()
+    arguments = parse_arguments()
+    service = CoderService(arguments.host, arguments.port, arguments.execution_workers, arguments.timeout,
+                           default_provider=arguments.default_provider, allow_execution=arguments.allow_execution)
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        logger.info("Coder service stopped.")
+
+if __name__ == "__main__":
+    main()
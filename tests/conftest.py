@@ -0,0 +1,38 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# The process wide caches and ledgers are created on first use, point them away from the cache/ of the app.
+_test_directory = tempfile.mkdtemp(prefix="langchain-coder-tests-")
+os.environ.setdefault("RESPONSE_CACHE_PATH", os.path.join(_test_directory, "response_cache.db"))
+os.environ.setdefault("USAGE_LEDGER_PATH", os.path.join(_test_directory, "usage_ledger.db"))
+os.environ.setdefault("RATE_LIMIT_RPM", "100000")
+os.environ.setdefault("RATE_LIMIT_TPM", "100000000")
+# The mock provider answers right away unless a test asks for a latency.
+os.environ.setdefault("MOCK_LATENCY", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs.llm_provider import LLMProvider
+
+class EchoProvider(LLMProvider):
+    """Provider answering every prompt with a Python program printing it, and recording its backend calls."""
+    provider_name = "echo"
+
+    def __init__(self, model_name, max_tokens=100):
+        import libs.general_utils
+        self.model_name = model_name
+        self.temperature = 0.0
+        self.max_tokens = max_tokens
+        self.calls = []
+        self.utils = libs.general_utils.GeneralUtils()
+
+    def _complete(self, prompt, **options):
+        self.calls.append((prompt, options))
+        return f"```python\nprint({prompt!r})\n```"
+
+@pytest.fixture
+def echo_provider(request):
+    # A model per test, so the shared response cache never answers from another test.
+    return EchoProvider(f"echo-{request.node.nodeid}")
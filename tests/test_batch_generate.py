@@ -0,0 +1,80 @@
+import json
+import os
+import sys
+import batch_generate
+from batch_generate import BatchGenerator, load_completed, load_tasks
+from libs.generation_engine import get_generation_engine
+from libs.mock_provider import MockProvider
+
+def _write_tasks(path, tasks):
+    path.write_text("".join(json.dumps(task) + "\n" for task in tasks))
+    return str(path)
+
+def _read_results(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+def test_tasks_are_loaded_from_json_and_jsonl(tmp_path):
+    tasks = load_tasks(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "coding_tasks.json"))
+    task_id, task, task_input, task_output = tasks[0]
+    assert (task, task_input, task_output) == ("Find the factorial of a number", 5, "5! = 120")
+    assert len(task_id) == 12
+    path = _write_tasks(tmp_path / "tasks.jsonl", [{"id": 7, "task": "Reverse a string", "input": "hello"}])
+    assert load_tasks(path) == [("7", "Reverse a string", "hello", None)]
+
+def test_only_successful_results_count_as_completed(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text(
+        json.dumps({"task_id": "1", "provider": "mock", "language": "Python", "status": "ok"}) + "\n"
+        + json.dumps({"task_id": "2", "provider": "mock", "language": "Python", "status": "error"}) + "\n"
+        + '{"task_id": "3", "provi'
+    )
+    assert load_completed(str(path)) == {("1", "mock", "Python")}
+    assert load_completed(str(tmp_path / "missing.jsonl")) == set()
+
+def test_every_task_provider_and_language_is_generated(tmp_path, request):
+    output_path = tmp_path / "results.jsonl"
+    tasks = [(str(number), f"task {number} of {request.node.nodeid}", None, None) for number in range(3)]
+    generator = BatchGenerator([MockProvider(latency=0)], ["Python", "C"], str(output_path), concurrency=2)
+    stats = get_generation_engine().run(generator.run(tasks))
+    assert stats == {"ok": 6, "error": 0, "cached": 0, "skipped": 0}
+    results = _read_results(output_path)
+    assert sorted((result["task_id"], result["language"]) for result in results) == [(str(number), language) for number in range(3) for language in ("C", "Python")]
+    python_result = next(result for result in results if result["language"] == "Python")
+    assert python_result["code"] == 'print("Hello, World!")'
+    assert python_result["model"] == "mock-coder" and python_result["prompt_tokens"] > 0 and python_result["cost"] == 0
+
+def test_interrupted_run_resumes_and_reuses_the_cache(tmp_path, request):
+    output_path = tmp_path / "results.jsonl"
+    tasks = [(str(number), f"task {number} of {request.node.nodeid}", None, None) for number in range(2)]
+    provider = MockProvider(latency=0)
+    get_generation_engine().run(BatchGenerator([provider], ["Python"], str(output_path)).run(tasks[:1]))
+    stats = get_generation_engine().run(BatchGenerator([provider], ["Python"], str(output_path)).run(tasks))
+    assert stats == {"ok": 1, "error": 0, "cached": 0, "skipped": 1}
+    # A new output file generates everything again, from the response cache.
+    stats = get_generation_engine().run(BatchGenerator([provider], ["Python"], str(tmp_path / "again.jsonl")).run(tasks))
+    assert stats["cached"] == 2
+    assert all(result["cached"] and result["cost"] == 0 for result in _read_results(tmp_path / "again.jsonl"))
+
+def test_failures_are_recorded_and_retried_on_the_next_run(tmp_path, request, monkeypatch):
+    output_path = tmp_path / "results.jsonl"
+    tasks = [("1", f"task of {request.node.nodeid}", None, None)]
+    provider = MockProvider(latency=0)
+    def fail(prompt, **options):
+        raise ValueError("invalid prompt")
+    monkeypatch.setattr(provider, "_complete", fail)
+    stats = get_generation_engine().run(BatchGenerator([provider], ["Python"], str(output_path)).run(tasks))
+    assert stats["error"] == 1
+    assert _read_results(output_path)[0]["error"] == "invalid prompt"
+    stats = get_generation_engine().run(BatchGenerator([MockProvider(latency=0)], ["Python"], str(output_path)).run(tasks))
+    assert (stats["ok"], stats["skipped"]) == (1, 0)
+
+def test_command_line(tmp_path, request, monkeypatch, capsys):
+    monkeypatch.setenv("MOCK_LATENCY", "0")
+    tasks_path = _write_tasks(tmp_path / "tasks.jsonl", [{"id": "a", "task": f"task of {request.node.nodeid}"}, {"id": "b", "task": "unused"}])
+    output_path = tmp_path / "out" / "results.jsonl"
+    monkeypatch.setattr(sys, "argv", ["batch_generate.py", "--tasks", tasks_path, "--providers", "mock", "--languages", "Python,Ruby", "--limit", "1", "--output", str(output_path)])
+    batch_generate.main()
+    assert [(result["task_id"], result["language"], result["status"]) for result in _read_results(output_path)] in (
+        [("a", "Python", "ok"), ("a", "Ruby", "ok")], [("a", "Ruby", "ok"), ("a", "Python", "ok")]
+    )
+    assert "Done in" in capsys.readouterr().out
@@ -0,0 +1,82 @@
+import itertools
+import threading
+from conftest import EchoProvider
+from libs.best_of_n import BestOfNSelector
+from libs.general_utils import GeneralUtils
+from libs.generation_engine import get_generation_engine
+
+class SamplingProvider(EchoProvider):
+    """Provider answering every call with another program."""
+    def __init__(self, model_name):
+        super().__init__(model_name)
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def _complete(self, prompt, **options):
+        with self._lock:
+            self.calls.append((prompt, options))
+            number = next(self._counter)
+        return f"```python\nprint({number})\n```"
+
+class FakeUtils(GeneralUtils):
+    """Returns the output listed for each program instead of running it."""
+    def __init__(self, outputs):
+        self.outputs = outputs
+
+    def run_code(self, code, code_language, code_input=None, timeout=None):
+        return self.outputs[code]
+
+def test_candidates_are_sampled_separately_and_cached(request):
+    provider = SamplingProvider(f"sampling-{request.node.nodeid}")
+    candidates = get_generation_engine().run(provider.acomplete_candidates("prompt", 3, top_k=20))
+    assert sorted(candidates) == [f"```python\nprint({number})\n```" for number in range(3)]
+    # The sample index only tells the cache entries apart, it never reaches the backend.
+    assert [options for _, options in provider.calls] == [{"top_k": 20}] * 3
+    assert sorted(get_generation_engine().run(provider.acomplete_candidates("prompt", 3, top_k=20))) == sorted(candidates)
+    assert len(provider.calls) == 3
+    # The first sample is the plain completion of the prompt.
+    assert provider.complete("prompt", top_k=20) in candidates
+    assert len(provider.calls) == 3
+
+def test_generate_candidates_extracts_the_code(request, monkeypatch):
+    provider = SamplingProvider(f"sampling-{request.node.nodeid}")
+    monkeypatch.setattr(SamplingProvider, "build_generate_prompt", lambda self, code_prompt, code_language: code_prompt)
+    candidates = get_generation_engine().run(provider.generate_candidates("hello", "Python", 2))
+    assert sorted(candidates) == ["print(0)", "print(1)"]
+
+def test_matching_candidate_wins():
+    selector = BestOfNSelector(FakeUtils({"a": "1\n", "b": "2\n", "c": "3\n"}))
+    result = selector.select(["a", "b", "c"], "Python", expected_output="2")
+    assert (result.code, result.index, result.matched, result.score) == ("b", 1, True, 1.0)
+
+def test_without_a_match_the_closest_output_wins():
+    selector = BestOfNSelector(FakeUtils({"a": "Error: division by zero", "b": "hello world", "c": "hello"}))
+    result = selector.select(["a", "b", "c"], "Python", expected_output="hello world!")
+    assert (result.code, result.matched) == ("b", False)
+    assert 0.5 < result.score < 1.0
+
+def test_without_expected_output_the_first_program_running_cleanly_wins():
+    selector = BestOfNSelector(FakeUtils({"a": "Traceback: Exception", "b": "", "c": "output", "d": "output"}))
+    assert selector.select(["a", "b", "c", "d"], "Python").code == "c"
+    assert selector.select([], "Python") is None
+
+def test_generate_best_without_execution_returns_the_first_candidate(request, monkeypatch):
+    provider = SamplingProvider(f"sampling-{request.node.nodeid}")
+    monkeypatch.setattr(SamplingProvider, "build_generate_prompt", lambda self, code_prompt, code_language: code_prompt)
+    selector = BestOfNSelector(FakeUtils({}))
+    result = get_generation_engine().run(selector.generate_best(provider, "hello", "Python", 2, execute=False))
+    assert result.code in ("print(0)", "print(1)")
+    assert not result.matched
+
+def test_palm_splits_large_candidate_counts(monkeypatch):
+    from libs.palmai import PalmAI
+    provider = PalmAI("test-key", model="text-bison-001", max_output_tokens=100)
+    requests, charges = [], []
+    monkeypatch.setattr(provider, "_complete_candidates", lambda prompt, candidate_count=1, **options: requests.append(candidate_count) or [f"candidate {index}" for index in range(candidate_count)])
+    monkeypatch.setattr(provider, "acquire_rate_limit", lambda prompt, completions=1: charges.append(completions))
+    candidates = get_generation_engine().run(provider.acomplete_candidates("prompt", 11))
+    assert len(candidates) == 11
+    assert sorted(requests) == [3, 8]
+    # Every request is charged for the completion budget of all its candidates.
+    assert sorted(charges) == [3, 8]
+    assert provider.estimate_request_tokens("", completions=8) == 800
@@ -0,0 +1,80 @@
+import copy
+import pytest
+from conftest import EchoProvider
+from libs.budget import BudgetController, BudgetExceededError
+from libs.usage_meter import Usage, UsageLedger
+
+class FamilyProvider(EchoProvider):
+    """Provider able to switch to another model of its family."""
+    def with_model(self, model_name):
+        variant = copy.copy(self)
+        variant.model_name = model_name
+        variant.calls = []
+        return variant
+
+@pytest.fixture
+def ledger(tmp_path):
+    return UsageLedger(str(tmp_path / "usage_ledger.db"))
+
+def _controller(ledger, **options):
+    return BudgetController(usage_ledger=ledger, **options)
+
+def test_worst_case_covers_the_whole_completion_budget(ledger):
+    controller = _controller(ledger)
+    worst_case = controller.estimate_worst_case("gpt-4", "", 1000)
+    assert worst_case == pytest.approx(0.06)
+    assert controller.estimate_worst_case("gpt-4", "", 1000, completions=4) == pytest.approx(0.24)
+    # Character priced models count four characters per token.
+    assert controller.estimate_worst_case("gemini-pro", "", 1000) == pytest.approx(0.002)
+
+def test_unlimited_budget_admits_everything(ledger):
+    provider = FamilyProvider("gpt-4", max_tokens=100000)
+    with _controller(ledger).admit(provider, "prompt") as admitted_provider:
+        assert admitted_provider is provider
+
+def test_request_over_the_budget_is_downgraded(ledger):
+    controller = _controller(ledger, session_budget=0.01)
+    with controller.admit(FamilyProvider("gpt-4", max_tokens=1000), "prompt") as admitted_provider:
+        assert admitted_provider.model_name == "gpt-3.5-turbo-16k"
+    assert controller.stats == {"admitted": 1, "downgraded": 1, "rejected": 0}
+
+def test_request_over_the_budget_is_rejected(ledger):
+    controller = _controller(ledger, session_budget=0.01, policy=BudgetController.REJECT)
+    with pytest.raises(BudgetExceededError):
+        with controller.admit(FamilyProvider("gpt-4", max_tokens=1000), "prompt"):
+            pass
+    # Providers without cheaper models are rejected under the downgrade policy too.
+    controller.configure_session("headless", policy=BudgetController.DOWNGRADE)
+    with pytest.raises(BudgetExceededError):
+        with controller.admit(FamilyProvider("gemini-pro", max_tokens=100000), "prompt"):
+            pass
+    assert controller.stats["rejected"] == 2
+
+def test_recorded_usage_and_requests_in_flight_count_against_the_budget(ledger):
+    controller = _controller(ledger, global_budget=0.1, policy=BudgetController.REJECT)
+    provider = FamilyProvider("gpt-4", max_tokens=1000)
+    with controller.admit(provider, ""):
+        assert controller.remaining("headless") == (None, pytest.approx(0.04))
+        with pytest.raises(BudgetExceededError):
+            with controller.admit(provider, ""):
+                pass
+    assert controller.remaining("headless") == (None, pytest.approx(0.1))
+    ledger.record("openai", "gpt-4", Usage(0, 1000, 0, 0), session_id="other")
+    assert controller.remaining("headless") == (None, pytest.approx(0.04))
+
+def test_session_budgets_are_configured_per_session(ledger):
+    controller = _controller(ledger, session_budget=1.0)
+    controller.configure_session("headless", budget=0.5)
+    ledger.record("openai", "gpt-4", Usage(0, 1000, 0, 0), session_id="headless")
+    assert controller.remaining("headless")[0] == pytest.approx(0.44)
+    assert controller.remaining("other")[0] == pytest.approx(1.0)
+
+def test_downgraded_completion_reaches_the_cheaper_model(ledger, monkeypatch, request):
+    controller = _controller(ledger, session_budget=0.01)
+    monkeypatch.setattr("libs.llm_provider.get_budget_controller", lambda: controller)
+    provider = FamilyProvider("gpt-4", max_tokens=1000)
+    prompt = f"prompt of {request.node.nodeid}"
+    assert provider.complete(prompt) == f"```python\nprint({prompt!r})\n```"
+    assert provider.calls == []
+    assert [row["model"] for row in ledger.aggregate("model")] == []
+    assert controller.stats["downgraded"] == 1
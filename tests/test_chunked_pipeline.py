@@ -0,0 +1,100 @@
+import re
+from conftest import EchoProvider
+from libs.chunked_pipeline import ChunkedPipeline, chunks_touched, merge_chunks, split_blocks, split_source
+from libs.generation_engine import get_generation_engine
+from libs.prompt_registry import RenderedPrompt
+
+def _function(name, body_lines=30):
+    return f"def {name}():\n" + "".join(f"    value_{index} = {index}\n" for index in range(body_lines)) + f"    return '{name}'\n"
+
+PROGRAM = '"""Module docstring."""\nimport os\nimport sys\n\n' + "\n".join(_function(name) for name in ("first", "second", "third"))
+
+class ChunkProvider(EchoProvider):
+    """Answers each chunk prompt with its chunk renamed, or with no code as many times as `failures` says for the chunk."""
+    def __init__(self, model_name, failures=None):
+        super().__init__(model_name, max_tokens=None)
+        self.failures = dict(failures or {})
+
+    def _complete(self, prompt, **options):
+        self.calls.append((prompt, options))
+        number = int(re.search(r"part (\d+) of", prompt).group(1))
+        if self.failures.get(number):
+            self.failures[number] -= 1
+            # An empty block is cached like any completion, but has no code.
+            return "```python\n```"
+        code = prompt.split("CODE:\n", 1)[1]
+        return f"```python\n{code.replace('value_', 'fixed_')}\n```"
+
+def _render(task_type, code_language, code, chunk_number, chunk_count, **values):
+    return RenderedPrompt(f"{task_type} part {chunk_number} of {chunk_count}\nCODE:\n{code}", "", "", 0)
+
+def _run(provider, task_type, code=PROGRAM, **values):
+    pipeline = ChunkedPipeline(provider, max_chunk_tokens=200, render=_render)
+    return get_generation_engine().run(pipeline.run(task_type, code, "Python", **values))
+
+def test_blocks_are_split_at_top_level_definitions():
+    preamble, blocks = split_blocks(PROGRAM)
+    assert preamble == '"""Module docstring."""\nimport os\nimport sys'
+    assert [block.splitlines()[0] for block in blocks] == ["def first():", "def second():", "def third():"]
+
+def test_chunks_know_their_lines_and_signatures():
+    preamble, chunks = split_source(PROGRAM, 200)
+    lines = PROGRAM.splitlines()
+    assert len(chunks) == 3
+    assert chunks[0].start_line == 1 and chunks[0].code.startswith('"""Module docstring."""\nimport os')
+    for chunk, name in zip(chunks, ("first", "second", "third")):
+        assert lines[chunk.start_line - 1] in (f"def {name}():", '"""Module docstring."""')
+        assert f"    return '{name}'" in lines[chunk.end_line - 2:chunk.end_line]
+        assert chunk.signatures == (f"def {name}():",)
+    assert chunks[-1].end_line == len(lines)
+
+def test_imports_are_merged_at_the_top():
+    merged = merge_chunks(['"""Doc."""\nimport os\n\ndef a():\n    pass', "import os\nimport re\n\ndef b():\n    pass"])
+    assert merged == '"""Doc."""\n\nimport os\nimport re\n\ndef a():\n    pass\n\ndef b():\n    pass\n'
+
+def test_small_files_are_not_chunked(echo_provider):
+    assert ChunkedPipeline(echo_provider, max_chunk_tokens=200, render=_render).plan("print(1)\n") is None
+
+def test_convert_maps_every_chunk(request):
+    provider = ChunkProvider(f"chunks-{request.node.nodeid}")
+    converted = _run(provider, "convert_chunk")
+    assert len(provider.calls) == 3
+    assert "value_" not in converted
+    assert converted.index("def first") < converted.index("def second") < converted.index("def third")
+
+def test_fix_only_sends_the_chunks_touched_by_the_error(request):
+    provider = ChunkProvider(f"chunks-{request.node.nodeid}")
+    _, chunks = split_source(PROGRAM, 200)
+    error = f'Traceback (most recent call last):\n  File "main.py", line {chunks[1].start_line + 3}, in second\nNameError'
+    fixed = _run(provider, "fix_chunk", error=error, fix_instructions="")
+    assert [re.search(r"part (\d+)", prompt).group(1) for prompt, _ in provider.calls] == ["2"]
+    second = fixed[fixed.index("def second"):fixed.index("def third")]
+    assert "fixed_" in second and "value_" not in second
+    assert fixed.count("value_") == 60
+
+def test_fix_without_line_numbers_sends_every_chunk(request):
+    provider = ChunkProvider(f"chunks-{request.node.nodeid}")
+    _run(provider, "fix_chunk", error="The output is wrong.", fix_instructions="")
+    assert len(provider.calls) == 3
+    _, chunks = split_source(PROGRAM, 200)
+    assert chunks_touched(chunks, "line 9999", len(PROGRAM.splitlines())) == chunks
+
+def test_failed_chunk_is_retried_without_the_cache(request):
+    provider = ChunkProvider(f"chunks-{request.node.nodeid}", failures={2: 1})
+    converted = _run(provider, "convert_chunk")
+    assert len(provider.calls) == 4
+    assert "value_" not in converted
+
+def test_fix_chunk_failing_twice_keeps_its_original_code(request):
+    provider = ChunkProvider(f"chunks-{request.node.nodeid}", failures={3: 2})
+    fixed = _run(provider, "fix_chunk", error="The output is wrong.", fix_instructions="")
+    # Chunk 3 was sent twice, the fixes of chunks 1 and 2 are kept.
+    assert len(provider.calls) == 4
+    third = fixed[fixed.index("def third"):]
+    assert "value_" in third and "fixed_" not in third
+    assert "value_" not in fixed[:fixed.index("def third")]
+
+def test_convert_chunk_failing_twice_fails_the_run(request):
+    provider = ChunkProvider(f"chunks-{request.node.nodeid}", failures={1: 2})
+    assert _run(provider, "convert_chunk") is None
+    assert len(provider.calls) == 4
@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+import pytest
+import libs.client_registry
+from libs.client_registry import ClientRegistry
+
+def test_clients_are_reused_for_the_same_settings():
+    registry = ClientRegistry()
+    built = []
+    factory = lambda: built.append(object()) or built[-1]
+    first = registry.get_client("openai", factory, model="gpt-4", temperature=0.1, max_tokens=100, credentials=["key"])
+    second = registry.get_client("openai", factory, model="gpt-4", temperature=0.1, max_tokens=100, credentials=["key"])
+    assert first is second
+    assert len(built) == 1
+    assert registry.stats == {"hits": 1, "misses": 1, "evictions": 0}
+
+def test_every_setting_is_part_of_the_key():
+    registry = ClientRegistry()
+    settings = {"model": "gpt-4", "temperature": 0.1, "max_tokens": 100, "credentials": ["key"]}
+    registry.get_client("openai", object, **settings)
+    for name, value in (("model", "gpt-3.5-turbo"), ("temperature", 0.2), ("max_tokens", 200), ("credentials", ["other key"])):
+        registry.get_client("openai", object, **dict(settings, **{name: value}))
+    registry.get_client("palm", object, **settings)
+    assert len(registry) == 6
+    assert registry.stats["hits"] == 0
+
+def test_credentials_are_hashed():
+    fingerprint = ClientRegistry.fingerprint(["sk-secret"])
+    assert "sk-secret" not in fingerprint
+    assert fingerprint == ClientRegistry.fingerprint(["sk-secret"])
+    assert ClientRegistry.fingerprint(None) == "environment"
+
+def test_idle_clients_are_evicted(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(libs.client_registry, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    registry = ClientRegistry(idle_timeout=60)
+    first = registry.get_client("gemini", object, model="gemini-pro")
+    now[0] += 61
+    assert registry.get_client("gemini", object, model="gemini-pro") is not first
+    assert registry.stats["evictions"] == 1
+
+def test_least_recently_used_client_is_evicted_on_overflow(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(libs.client_registry, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    registry = ClientRegistry(max_clients=2)
+    clients = {}
+    for model in ("a", "b", "a", "c"):
+        now[0] += 1
+        clients[model] = registry.get_client("openai", object, model=model)
+    assert len(registry) == 2
+    # "b" was used least recently, "a" survives.
+    assert registry.get_client("openai", object, model="a") is clients["a"]
+    assert registry.get_client("openai", object, model="b") is not clients["b"]
+
+def test_failing_factory_registers_nothing():
+    registry = ClientRegistry()
+    def factory():
+        raise RuntimeError("model could not be loaded")
+    with pytest.raises(RuntimeError):
+        registry.get_client("vertexai", factory, model="code-bison")
+    assert len(registry) == 0
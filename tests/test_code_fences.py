@@ -0,0 +1,68 @@
+from libs.code_fences import FenceParser, extract_code, parse_code_blocks
+
+RESPONSE = (
+    "Here is the program:\n"
+    "```python\n"
+    "def main():\n"
+    "    print('hi')\n"
+    "\n"
+    "main()\n"
+    "```\n"
+    "It prints:\n"
+    "```\n"
+    "hi\n"
+    "```\n"
+)
+
+def _feed_in_chunks(text, chunk_size):
+    parser = FenceParser()
+    completed = []
+    for start in range(0, len(text), chunk_size):
+        completed.extend(parser.feed(text[start:start + chunk_size]))
+    return completed, parser.close()
+
+def test_blocks_are_parsed_with_their_language():
+    blocks = parse_code_blocks(RESPONSE)
+    assert [block.language for block in blocks] == ["python", ""]
+    assert blocks[0].code == "def main():\n    print('hi')\n\nmain()"
+    assert blocks[1].code == "hi"
+    assert all(block.closed for block in blocks)
+
+def test_any_chunking_gives_the_same_blocks():
+    expected = parse_code_blocks(RESPONSE)
+    for chunk_size in range(1, len(RESPONSE) + 1):
+        completed, blocks = _feed_in_chunks(RESPONSE, chunk_size)
+        assert blocks == expected, chunk_size
+        assert completed == expected, chunk_size
+
+def test_fence_split_across_chunks():
+    parser = FenceParser()
+    assert parser.feed("text\n``") == []
+    assert parser.feed("`py") == []
+    assert parser.feed("thon\nprint(1)\n`") == []
+    assert parser.partial_block().code == "print(1)\n`"
+    completed = parser.feed("``\n")
+    assert [(block.language, block.code) for block in completed] == [("python", "print(1)")]
+
+def test_partial_block_while_streaming():
+    parser = FenceParser()
+    parser.feed("```java\nclass Main {\n")
+    block = parser.partial_block()
+    assert block.language == "java"
+    assert block.code == "class Main {"
+    assert not block.closed
+    assert parser.current_code("Java") == "class Main {"
+
+def test_unterminated_block_on_close():
+    parser = FenceParser()
+    parser.feed("```ruby\nputs 1\nputs 2")
+    blocks = parser.close()
+    assert [(block.code, block.closed) for block in blocks] == [("puts 1\nputs 2", False)]
+
+def test_closing_fence_without_trailing_newline():
+    blocks = parse_code_blocks("```go\nfunc main() {}\n```")
+    assert [(block.language, block.code, block.closed) for block in blocks] == [("go", "func main() {}", True)]
+
+def test_extract_code_prefers_the_requested_language():
+    text = "```bash\npip install x\n```\n```python\nimport x\n```\n"
+    assert extract_code(text, "Python") == "import x"
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import threading
+import time
+import pytest
+import libs.python_worker_pool
+from libs.coder_service import CoderService
+from libs.mock_provider import MockProvider
+
+async def _request(port, method, path, payload=None):
+    """Send one request, return (status, JSON body) or (status, [JSON lines]) for a chunked stream."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    status = int(head.split()[1])
+    if b"transfer-encoding: chunked" not in head.lower():
+        return status, json.loads(body)
+    lines = []
+    while True:
+        size_line, _, body = body.partition(b"\r\n")
+        size = int(size_line, 16)
+        if not size:
+            return status, lines
+        lines.append(json.loads(body[:size]))
+        body = body[size + 2:]
+
+@pytest.fixture(params=[0, 1], ids=["interpreter", "worker-pool"])
+def python_worker_pool_size(request, monkeypatch):
+    """Run the test with a fresh interpreter per program and again on the warm Python worker pool."""
+    monkeypatch.setenv("PYTHON_WORKER_POOL_SIZE", str(request.param))
+    monkeypatch.setattr(libs.python_worker_pool, "_python_worker_pool", None)
+    yield request.param
+    pool = libs.python_worker_pool._python_worker_pool
+    if pool is not None:
+        while not pool._idle.empty():
+            worker = pool._idle.get()
+            if worker is not None:
+                worker.kill()
+
+def _with_service(scenario, **options):
+    async def run():
+        service = CoderService(port=0, **options)
+        await service.start()
+        try:
+            return await scenario(service)
+        finally:
+            await service.stop()
+    return asyncio.run(run())
+
+def test_health_and_stats():
+    async def scenario(service):
+        assert await _request(service.port, "GET", "/health") == (200, {"status": "ok"})
+        status, stats = await _request(service.port, "GET", "/v1/stats")
+        assert status == 200
+        assert stats["requests"] == 2 and stats["allow_execution"] is False
+    _with_service(scenario)
+
+def test_generate_on_the_mock_provider():
+    async def scenario(service):
+        status, result = await _request(service.port, "POST", "/v1/generate", {"code_prompt": "hello world", "code_language": "Python"})
+        assert status == 200
+        assert result["code"] == 'print("Hello, World!")'
+        assert result["provider_name"] == "mock"
+        assert result["error"] is None
+    _with_service(scenario)
+
+def test_complete_on_the_mock_provider():
+    async def scenario(service):
+        status, result = await _request(service.port, "POST", "/v1/complete", {"prompt": "Write a program in Ruby."})
+        assert status == 200
+        assert result["completion"] == '```ruby\nputs "Hello, World!"\n```'
+        assert (result["provider_name"], result["model_name"]) == ("mock", "mock-coder")
+    _with_service(scenario)
+
+def test_streamed_generate(monkeypatch):
+    threads = []
+    render_generate_prompt, stream_complete = MockProvider.render_generate_prompt, MockProvider.stream_complete
+    def recorded(method):
+        def wrapper(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return method(*args, **kwargs)
+        return wrapper
+    monkeypatch.setattr(MockProvider, "render_generate_prompt", recorded(render_generate_prompt))
+    monkeypatch.setattr(MockProvider, "stream_complete", recorded(stream_complete))
+
+    async def scenario(service):
+        payload = {"code_prompt": "hello world", "code_language": "C", "stream": True}
+        status, lines = await _request(service.port, "POST", "/v1/generate", payload)
+        assert status == 200
+        chunks = [line["chunk"] for line in lines[:-1]]
+        assert len(chunks) > 1
+        assert "".join(chunks).startswith("```c\n#include <stdio.h>")
+        assert lines[-1]["code"].startswith("#include <stdio.h>")
+    _with_service(scenario)
+    # The prompt is rendered and the completion streamed on the generation engine, not on the service loop.
+    assert len(threads) == 2 and all(name.startswith("generation-worker") for name in threads)
+
+def test_request_errors():
+    async def scenario(service):
+        status, result = await _request(service.port, "POST", "/v1/generate", {"code_prompt": "hello world"})
+        assert (status, result) == (400, {"error": "Missing fields: code_language"})
+        assert (await _request(service.port, "GET", "/v1/unknown"))[0] == 404
+        assert (await _request(service.port, "GET", "/v1/generate"))[0] == 405
+        assert (await _request(service.port, "POST", "/v1/complete", {"prompt": "x", "provider": "unknown"}))[0] == 400
+        status, result = await _request(service.port, "POST", "/v1/execute", {"code": "print(1)", "code_language": "Python"})
+        assert (status, result) == (403, {"error": "Code execution is disabled on this service."})
+    _with_service(scenario)
+
+def test_execute_with_input_and_expected_output(python_worker_pool_size):
+    async def scenario(service):
+        payload = {"code": "print(int(input()) * 2)", "code_language": "Python", "code_input": "21", "expected_output": "42"}
+        status, result = await _request(service.port, "POST", "/v1/execute", payload)
+        assert status == 200
+        assert result == {"output": "42\n", "failed": False, "matched": True}
+        assert (libs.python_worker_pool._python_worker_pool is not None) == bool(python_worker_pool_size)
+    _with_service(scenario, allow_execution=True)
+
+def test_timed_out_execution_frees_its_worker(python_worker_pool_size):
+    async def scenario(service):
+        started = time.monotonic()
+        payload = {"code": "while True:\n    pass", "code_language": "Python", "timeout": 1}
+        assert await _request(service.port, "POST", "/v1/execute", payload) == (504, {"error": "Request timed out."})
+        # The program was killed, so the only execution worker runs the next program right away.
+        status, result = await _request(service.port, "POST", "/v1/execute", {"code": "print('next')", "code_language": "Python", "timeout": 10})
+        assert (status, result["output"]) == (200, "next\n")
+        assert time.monotonic() - started < 5
+        assert service.stats["timeouts"] == 1
+    _with_service(scenario, allow_execution=True, execution_workers=1)
+
+def test_queued_execution_only_gets_the_time_left(python_worker_pool_size):
+    async def scenario(service):
+        started = time.monotonic()
+        busy = {"code": "import time\ntime.sleep(1.5)\nprint('busy')", "code_language": "Python", "timeout": 10}
+        queued = {"code": "while True:\n    pass", "code_language": "Python", "timeout": 2}
+        skipped = {"code": "print('never')", "code_language": "Python", "timeout": 1}
+        results = await asyncio.gather(*(_request(service.port, "POST", "/v1/execute", payload) for payload in (busy, queued, skipped)))
+        assert results[0] == (200, {"output": "busy\n", "failed": False, "matched": None})
+        # The second program waited 1.5 seconds for the worker and was killed 2 seconds after its request started.
+        assert results[1] == (504, {"error": "Request timed out."})
+        # The third request timed out in the queue, its program never ran.
+        assert results[2] == (504, {"error": "Request timed out."})
+        await asyncio.sleep(0.6)
+        assert service.stats["executions"] == 2
+        assert time.monotonic() - started < 4
+    _with_service(scenario, allow_execution=True, execution_workers=1)
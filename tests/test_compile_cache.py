@@ -0,0 +1,80 @@
+import os
+import shutil
+import subprocess
+import pytest
+from libs.compile_cache import CompileCache
+
+needs_gcc = pytest.mark.skipif(shutil.which("gcc") is None, reason="gcc is not installed")
+
+def _c_program(text):
+    return f'#include <stdio.h>\n\nint main() {{\n    printf("{text}\\n");\n    return 0;\n}}\n'
+
+def _run(program):
+    return subprocess.run(program, capture_output=True, text=True).stdout
+
+def _build_directory(program):
+    return os.path.dirname(program[0])
+
+@needs_gcc
+def test_unchanged_program_is_built_once(tmp_path):
+    cache = CompileCache(str(tmp_path / "compiled"))
+    with cache.build("C", _c_program("first")) as (program, compile_errors):
+        assert compile_errors is None
+        assert _run(program) == "first\n"
+    with cache.build("C", _c_program("first")) as (cached_program, _):
+        assert cached_program == program
+    with cache.build("C", _c_program("second")) as (other_program, _):
+        assert other_program != program
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["builds"]) == (1, 2, 2)
+    # The builds survive a restart.
+    assert CompileCache(str(tmp_path / "compiled")).get_stats()["builds"] == 2
+
+@needs_gcc
+def test_rejected_program_returns_the_diagnostics(tmp_path):
+    cache = CompileCache(str(tmp_path / "compiled"))
+    with cache.build("C", "int main() { return missing; }\n") as (program, compile_errors):
+        assert program is None
+        assert "main.c:1" in compile_errors and "missing" in compile_errors
+        assert str(tmp_path) not in compile_errors
+    assert cache.get_stats()["builds"] == 0
+
+@needs_gcc
+def test_least_recently_used_builds_are_evicted(tmp_path):
+    cache = CompileCache(str(tmp_path / "compiled"), max_bytes=1)
+    with cache.build("C", _c_program("first")) as (first, _):
+        pass
+    with cache.build("C", _c_program("second")) as (second, _):
+        pass
+    assert not os.path.exists(_build_directory(first))
+    assert os.path.exists(_build_directory(second))
+    assert cache.get_stats()["evictions"] == 1
+
+@needs_gcc
+def test_running_build_is_evicted_once_it_finished(tmp_path):
+    cache = CompileCache(str(tmp_path / "compiled"), max_bytes=1)
+    with cache.build("C", _c_program("first")) as (first, _):
+        with cache.build("C", _c_program("second")) as (second, _):
+            with cache.build("C", _c_program("first")) as (first_again, _):
+                assert first_again == first
+            # Both programs still run, nothing is evicted.
+            assert (_run(first), _run(second)) == ("first\n", "second\n")
+            cache.clear()
+            assert cache.get_stats()["evictions"] == 0
+        # The second build is evicted once its program finished, the first one still runs.
+        assert not os.path.exists(_build_directory(second))
+        assert _run(first) == "first\n"
+    assert cache.get_stats()["builds"] == 1
+    with cache.build("C", _c_program("third")):
+        pass
+    assert not os.path.exists(_build_directory(first))
+
+@pytest.mark.skipif(shutil.which("go") is None, reason="go is not installed")
+def test_go_program(tmp_path):
+    cache = CompileCache(str(tmp_path / "compiled"))
+    code = 'package main\n\nimport "fmt"\n\nfunc main() {\n    fmt.Println("Hello, Go!")\n}\n'
+    for _ in range(2):
+        with cache.build("Go", code) as (program, compile_errors):
+            assert compile_errors is None
+            assert _run(program) == "Hello, Go!\n"
+    assert cache.get_stats()["hits"] == 1
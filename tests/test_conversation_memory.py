@@ -0,0 +1,67 @@
+import time
+from libs.conversation_memory import ConversationMemory
+from libs.token_counter import count_tokens
+
+class FakeSummarizer:
+    def __init__(self, summary):
+        self.summary = summary
+        self.prompts = []
+
+    async def acomplete(self, prompt):
+        self.prompts.append(prompt)
+        return self.summary
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_recent_turns_are_kept_in_order():
+    memory = ConversationMemory(max_tokens=1000, window_turns=4)
+    memory.add_turn("user", "Generate a program hello world in Python.")
+    memory.add_turn("assistant", 'print("Hello, World!")')
+    context = memory.context()
+    assert context == 'Recent turns:\nuser: Generate a program hello world in Python.\n\nassistant: print("Hello, World!")'
+    assert memory.summary == ""
+
+def test_empty_turns_are_ignored():
+    memory = ConversationMemory()
+    memory.add_turn("user", "")
+    assert memory.context() == ""
+
+def test_turns_leaving_the_window_are_condensed_without_a_summarizer():
+    memory = ConversationMemory(max_tokens=1000, window_turns=2)
+    for number in range(1, 5):
+        memory.add_turn("user", f"turn {number}\nwith a second line")
+    assert memory.summary == "user: turn 1\nuser: turn 2"
+    context = memory.context()
+    assert context.startswith("Summary of the earlier conversation:\nuser: turn 1\nuser: turn 2")
+    assert "turn 3\nwith a second line" in context and "turn 4" in context
+
+def test_context_stays_within_the_token_budget():
+    memory = ConversationMemory(max_tokens=200, window_turns=10)
+    for number in range(10):
+        memory.add_turn("assistant", f"program {number} " + "x = 1\n" * 100)
+    for max_tokens in (50, 100, 200):
+        # A little slack for the headers and the " ..." of a truncated turn.
+        assert count_tokens(memory.context(max_tokens)) <= max_tokens + 20
+    # The newest turn is the last one to be dropped.
+    assert "program 9" in memory.context()
+
+def test_summary_is_generated_in_the_background():
+    memory = ConversationMemory(max_tokens=1000, window_turns=1)
+    summarizer = FakeSummarizer("The user asked for a hello world program.")
+    memory.add_turn("user", "Generate a program hello world in Python.", summarizer=summarizer)
+    memory.add_turn("assistant", 'print("Hello, World!")', summarizer=summarizer)
+    _wait_for(lambda: memory.summary)
+    assert memory.summary == "The user asked for a hello world program."
+    assert "hello world in Python" in summarizer.prompts[0]
+    assert memory.context().endswith('assistant: print("Hello, World!")')
+
+def test_clear():
+    memory = ConversationMemory(window_turns=1)
+    memory.add_turn("user", "first")
+    memory.add_turn("user", "second")
+    memory.clear()
+    assert memory.context() == ""
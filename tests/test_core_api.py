@@ -0,0 +1,73 @@
+import multiprocessing
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+from libs.core_api import (ConvertRequest, ExecuteRequest, ExecutionResult, FixRequest, GenerateRequest, GenerationResult, ProviderConfig,
+                           create_provider, execute, fix, generate, convert, get_provider, process_request, provider_config_from_env)
+
+MOCK = ProviderConfig("mock")
+
+def test_generate_fix_and_convert_on_the_mock_provider():
+    provider = get_provider(MOCK)
+    assert generate(provider, GenerateRequest("hello world", "Ruby")) == GenerationResult('puts "Hello, World!"', "mock", "mock-coder", None)
+    fixed = fix(provider, FixRequest("print('hello'", "Python", error="SyntaxError: '(' was never closed"))
+    assert (fixed.code, fixed.error) == ('print("Hello, World!")', None)
+    converted = convert(provider, ConvertRequest("print('hello')", "C"))
+    assert converted.code.startswith("#include <stdio.h>")
+
+def test_fix_without_an_error_returns_the_code():
+    assert fix(get_provider(MOCK), FixRequest("print(1)", "Python")).code == "print(1)"
+
+def test_provider_errors_are_returned_in_the_result(monkeypatch):
+    provider = create_provider(MOCK)
+    def fail(prompt, **options):
+        raise ValueError("invalid prompt")
+    monkeypatch.setattr(provider, "_complete", fail)
+    result = generate(provider, GenerateRequest("a program nobody asked for before", "Python"))
+    assert (result.code, result.error) == (None, "invalid prompt")
+
+def test_requests_run_without_a_streamlit_session():
+    results = []
+    thread = threading.Thread(target=lambda: results.append(generate(get_provider(MOCK), GenerateRequest("hello world", "Python"))))
+    thread.start()
+    thread.join(10)
+    assert results[0].code == 'print("Hello, World!")'
+
+def test_execute_compares_the_output():
+    assert execute(ExecuteRequest("print(input()[::-1])", "Python", code_input="olleh", expected_output="hello")) == ExecutionResult("hello\n", False, True)
+    assert execute(ExecuteRequest("print(2)", "Python", expected_output="1")).matched is False
+    assert execute(ExecuteRequest("print(2)", "Python")).matched is None
+    failed = execute(ExecuteRequest("raise ValueError('bad')", "Python"))
+    assert failed.failed and "ValueError: bad" in failed.output
+
+def test_execute_kills_the_program_after_the_timeout():
+    result = execute(ExecuteRequest("while True:\n    pass", "Python", timeout=1))
+    assert result.failed
+    assert result.output.endswith("did not finish within 1 seconds.")
+
+def test_provider_config_is_read_from_the_environment(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "gemini-key")
+    monkeypatch.setenv("GOOGLE_CLOUD_REGION", "europe-west1")
+    config = provider_config_from_env("gemini", "gemini-pro")
+    assert (config.api_key, config.model_name, config.location, config.max_tokens) == ("gemini-key", "gemini-pro", "europe-west1", 2048)
+    assert provider_config_from_env("mock").api_key is None
+
+def test_providers_are_created_once_per_config():
+    assert get_provider(MOCK) is get_provider(ProviderConfig("mock"))
+    assert get_provider(ProviderConfig("mock", "mock-coder-large")).model_name == "mock-coder-large"
+    with pytest.raises(ValueError):
+        create_provider(ProviderConfig("unknown"))
+
+def test_requests_and_results_are_picklable():
+    request = FixRequest("print(1", "Python", error="SyntaxError")
+    assert pickle.loads(pickle.dumps((MOCK, request))) == (MOCK, request)
+    result = process_request(MOCK, request)
+    assert pickle.loads(pickle.dumps(result)) == result
+
+def test_requests_run_in_a_worker_process():
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        generated = executor.submit(process_request, MOCK, GenerateRequest("hello world", "Python")).result(timeout=120)
+        executed = executor.submit(process_request, None, ExecuteRequest(generated.code, "Python", expected_output="Hello, World!")).result(timeout=120)
+    assert generated.code == 'print("Hello, World!")'
+    assert executed.matched
@@ -0,0 +1,79 @@
+import asyncio
+import contextvars
+import threading
+import time
+import pytest
+from libs.generation_engine import GenerationEngine
+
+@pytest.fixture
+def engine():
+    engine = GenerationEngine(max_concurrency=2)
+    yield engine
+    engine.shutdown()
+
+def test_run_returns_the_result_of_the_coroutine(engine):
+    async def answer():
+        return threading.current_thread().name
+    assert engine.run(answer()) == "generation-engine"
+
+def test_submit_runs_blocking_calls_on_the_worker_pool(engine):
+    async def call():
+        return await engine.submit(lambda: threading.current_thread().name)
+    assert engine.run(call()).startswith("generation-worker")
+
+def test_submit_bounds_the_calls_in_flight(engine):
+    lock, running, peak = threading.Lock(), [0], [0]
+
+    def blocking_call(index):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return index
+
+    async def fan_out():
+        return await engine.gather(*[engine.submit(blocking_call, index) for index in range(6)])
+
+    assert engine.run(fan_out(), timeout=10) == list(range(6))
+    assert peak[0] == 2
+
+def test_gather_returns_exceptions_when_asked(engine):
+    def fail():
+        raise ValueError("boom")
+
+    async def fan_out():
+        return await engine.gather(engine.submit(fail), engine.submit(lambda: 1), return_exceptions=True)
+
+    first, second = engine.run(fan_out())
+    assert isinstance(first, ValueError) and second == 1
+
+def test_submit_carries_the_context_variables(engine):
+    variable = contextvars.ContextVar("variable", default=None)
+
+    async def call():
+        variable.set("set on the loop")
+        return await engine.submit(variable.get)
+
+    assert engine.run(call()) == "set on the loop"
+
+def test_scheduling_from_the_engine_loop_is_refused(engine):
+    async def nested():
+        inner = asyncio.sleep(0)
+        try:
+            engine.schedule(inner)
+        finally:
+            inner.close()
+
+    with pytest.raises(RuntimeError):
+        engine.run(nested())
+
+def test_provider_coroutines_run_on_the_shared_engine(echo_provider):
+    from libs.generation_engine import get_generation_engine
+    engine = get_generation_engine()
+    assert engine.run(echo_provider.acomplete("hello")) == "```python\nprint('hello')\n```"
+    prompt = "Task: hello"
+    completions = engine.run(echo_provider.acomplete_candidates(prompt, 3))
+    assert len(completions) == 3
+    assert len(echo_provider.calls) == 4
@@ -0,0 +1,65 @@
+import asyncio
+from libs.hedged_requests import HedgedRequest
+from libs.latency_tracker import LatencyTracker
+
+class FakeProvider:
+    def __init__(self, provider_name, delay, code):
+        self.provider_name = provider_name
+        self.model_name = f"{provider_name}-model"
+        self.delay = delay
+        self.code = code
+        self.started = False
+        self.cancelled = False
+
+    async def generate_extracted(self, code_prompt, code_language):
+        self.started = True
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if isinstance(self.code, Exception):
+            raise self.code
+        return self.code
+
+def _hedge(primary, secondary, delay=0.1):
+    hedged_request = HedgedRequest(default_delay=delay, min_delay=0, latency_tracker=LatencyTracker())
+    return asyncio.run(hedged_request.generate(primary, secondary, "hello world", "Python"))
+
+def test_fast_primary_is_not_hedged():
+    secondary = FakeProvider("secondary", 0, "print(2)")
+    result = _hedge(FakeProvider("primary", 0, "print(1)"), secondary)
+    assert (result.code, result.provider_name, result.hedged) == ("print(1)", "primary", False)
+    assert not secondary.started
+
+def test_slow_primary_is_hedged_and_cancelled():
+    primary = FakeProvider("primary", 5, "print(1)")
+    result = _hedge(primary, FakeProvider("secondary", 0, "print(2)"))
+    assert (result.code, result.provider_name, result.hedged) == ("print(2)", "secondary", True)
+    assert primary.cancelled
+
+def test_slow_primary_still_wins_when_it_answers_first():
+    result = _hedge(FakeProvider("primary", 0.2, "print(1)"), FakeProvider("secondary", 5, "print(2)"))
+    assert (result.provider_name, result.hedged) == ("primary", False)
+
+def test_failing_primary_falls_back_right_away():
+    secondary = FakeProvider("secondary", 0, "print(2)")
+    result = _hedge(FakeProvider("primary", 0, RuntimeError("unavailable")), secondary, delay=5)
+    assert result.provider_name == "secondary"
+
+def test_empty_code_counts_as_a_failure():
+    result = _hedge(FakeProvider("primary", 0, "  "), FakeProvider("secondary", 0, "print(2)"))
+    assert result.provider_name == "secondary"
+    assert _hedge(FakeProvider("primary", 0, ""), FakeProvider("secondary", 0, RuntimeError("unavailable"))) is None
+
+def test_hedge_delay_follows_the_recorded_latency():
+    tracker = LatencyTracker(min_samples=5)
+    hedged_request = HedgedRequest(percentile=50, default_delay=3, min_delay=0.5, latency_tracker=tracker)
+    provider = FakeProvider("primary", 0, "print(1)")
+    assert hedged_request.hedge_delay(provider) == 3
+    for latency in (1, 2, 2, 2, 8):
+        tracker.record("primary", "primary-model", latency)
+    assert hedged_request.hedge_delay(provider) == 2
+    for _ in range(10):
+        tracker.record("primary", "primary-model", 0.01)
+    assert hedged_request.hedge_delay(provider) == 0.5
@@ -0,0 +1,104 @@
+import json
+import math
+import statistics
+from types import SimpleNamespace
+import pytest
+import libs.mock_provider
+from libs.mock_provider import MockProvider, load_mock_responses
+from libs.resilience import RetryableError
+from libs.response_recorder import prompt_hash
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """The delays the mock provider sleeps for, without sleeping."""
+    recorded = []
+    monkeypatch.setattr(libs.mock_provider, "time", SimpleNamespace(sleep=recorded.append))
+    return recorded
+
+def _outcomes(provider, prompts):
+    outcomes = []
+    for prompt in prompts:
+        try:
+            provider._complete(prompt)
+            outcomes.append("ok")
+        except RetryableError as exception:
+            outcomes.append(exception.status_code)
+    return outcomes
+
+def test_hello_world_in_the_language_of_the_prompt():
+    provider = MockProvider(latency=0)
+    assert provider._complete("Task: Design a program hello in Ruby.") == '```ruby\nputs "Hello, World!"\n```'
+    assert provider._complete("Convert it to the GO Lang programming language.").startswith("```go lang\npackage main")
+    assert provider._complete("Anything else") == '```python\nprint("Hello, World!")\n```'
+
+def test_runs_repeat_exactly_for_the_same_seed(sleeps):
+    prompts = [f"prompt {number}" for number in range(50)] * 2
+    options = {"latency": 1.0, "jitter": 0.5, "failure_rate": 0.2, "rate_limit_rate": 0.1}
+    first = _outcomes(MockProvider(seed=7, **options), prompts)
+    first_sleeps = list(sleeps)
+    sleeps.clear()
+    assert _outcomes(MockProvider(seed=7, **options), prompts) == first
+    assert sleeps == first_sleeps
+    sleeps.clear()
+    assert _outcomes(MockProvider(seed=8, **options), prompts) != first
+    # A prompt seen again draws new numbers, so retries of a failed call can succeed.
+    assert first[:50] != first[50:]
+
+def test_share_of_failures_and_rate_limits(sleeps):
+    outcomes = _outcomes(MockProvider(latency=0, failure_rate=0.2, rate_limit_rate=0.1), [f"prompt {number}" for number in range(2000)])
+    assert outcomes.count(503) / len(outcomes) == pytest.approx(0.2, abs=0.03)
+    assert outcomes.count(429) / len(outcomes) == pytest.approx(0.1, abs=0.03)
+    with pytest.raises(RetryableError) as raised:
+        MockProvider(latency=0, rate_limit_rate=1.0)._complete("prompt")
+    assert raised.value.retry_after == 1.0
+
+@pytest.mark.parametrize("distribution, check", [
+    ("fixed", lambda delays: set(delays) == {0.5}),
+    ("uniform", lambda delays: 0.3 <= min(delays) and max(delays) <= 0.7 and statistics.mean(delays) == pytest.approx(0.5, abs=0.02)),
+    ("normal", lambda delays: min(delays) >= 0 and statistics.stdev(delays) == pytest.approx(0.2, abs=0.03)),
+    ("lognormal", lambda delays: statistics.median(delays) == pytest.approx(0.5, abs=0.02)
+                                 and statistics.stdev(math.log(delay) for delay in delays) == pytest.approx(0.2, abs=0.03)),
+    ("exponential", lambda delays: statistics.mean(delays) == pytest.approx(0.5, abs=0.06)),
+])
+def test_latency_distributions(sleeps, distribution, check):
+    provider = MockProvider(latency=0.5, jitter=0.2, latency_distribution=distribution)
+    for number in range(1000):
+        provider._complete(f"prompt {number}")
+    assert check(sleeps)
+
+def test_unknown_latency_distribution():
+    with pytest.raises(ValueError):
+        MockProvider(latency_distribution="pareto")
+
+def test_streams_are_cut_into_token_sized_chunks(sleeps):
+    provider = MockProvider(latency=0, stream_chunk_tokens=2, token_latency=0.01)
+    chunks = list(provider._stream_complete("Task: Design a program hello in Java."))
+    assert "".join(chunks) == provider._response_for("Task: Design a program hello in Java.")
+    assert all(len(chunk) == 8 for chunk in chunks[:-1])
+    assert sleeps[1:] == [pytest.approx(0.02)] * len(chunks)
+
+def test_replayed_and_canned_responses(tmp_path):
+    path = tmp_path / "responses.jsonl"
+    entries = [
+        {"prompt": "recorded prompt", "completion": "recorded completion"},
+        {"prompt_hash": prompt_hash("hashed prompt"), "completion": "hashed completion"},
+        {"pattern": r"reverse (?P<word>\w+)", "completion": "```$code_language\n# reverse $word\n$program\n```"},
+    ]
+    path.write_text("\n".join(json.dumps(entry) for entry in entries) + "\n\n")
+    replayed, canned = load_mock_responses(str(path))
+    assert len(replayed) == 2 and len(canned) == 1
+    provider = MockProvider(latency=0, responses_path=str(path))
+    assert provider._complete("recorded prompt") == "recorded completion"
+    assert provider._complete("hashed prompt") == "hashed completion"
+    assert provider._complete("Task: Design a program to reverse hello in Ruby.") == '```Ruby\n# reverse hello\nputs "Hello, World!"\n```'
+    # Missing or broken files load no responses.
+    assert load_mock_responses(str(tmp_path / "missing.jsonl")) == ({}, [])
+
+def test_settings_from_the_environment(monkeypatch):
+    monkeypatch.setenv("MOCK_LATENCY", "0.25")
+    monkeypatch.setenv("MOCK_LATENCY_DISTRIBUTION", "fixed")
+    monkeypatch.setenv("MOCK_FAILURE_RATE", "0.5")
+    monkeypatch.setenv("MOCK_SEED", "3")
+    provider = MockProvider()
+    assert (provider.latency, provider.latency_distribution, provider.failure_rate, provider.seed) == (0.25, "fixed", 0.5, 3)
+    assert MockProvider(latency=0).latency == 0
@@ -0,0 +1,84 @@
+import pytest
+from libs.general_utils import GeneralUtils
+from libs.generation_engine import get_generation_engine
+from libs.model_cascade import ModelCascade, TierStats, load_cascade_tiers
+
+class TieredProvider:
+    """Provider answering with the program listed for each of its models."""
+    provider_name = "openai"
+
+    def __init__(self, programs, model_name="gpt-4", asked=None):
+        self.programs = programs
+        self.model_name = model_name
+        self.asked = [] if asked is None else asked
+
+    def with_model(self, model_name):
+        return TieredProvider(self.programs, model_name, self.asked) if model_name in self.programs else None
+
+    async def generate_extracted(self, code_prompt, code_language):
+        self.asked.append(self.model_name)
+        return self.programs[self.model_name]
+
+class FakeUtils(GeneralUtils):
+    def __init__(self, outputs):
+        self.outputs = outputs
+
+    def run_code(self, code, code_language, code_input=None, timeout=None):
+        return self.outputs[code]
+
+OUTPUTS = {"cheap program": "41\n", "expensive program": "42\n", "broken program": "Error: invalid syntax"}
+
+def _cascade(provider, tiers, tier_stats=None, expected_output="42", code_language="Python"):
+    cascade = ModelCascade(FakeUtils(OUTPUTS), tiers=tiers, tier_stats=tier_stats or TierStats())
+    return get_generation_engine().run(cascade.generate(provider, "answer", code_language, expected_output))
+
+def test_cheap_tier_is_kept_when_it_passes():
+    provider = TieredProvider({"gpt-3.5-turbo": "expensive program", "gpt-4": "expensive program"})
+    result = _cascade(provider, ["gpt-3.5-turbo", "gpt-4"])
+    assert (result.model_name, result.passed, result.attempts) == ("gpt-3.5-turbo", True, ["gpt-3.5-turbo"])
+    assert provider.asked == ["gpt-3.5-turbo"]
+
+def test_failing_tier_escalates_to_the_next_one():
+    provider = TieredProvider({"gpt-3.5-turbo": "cheap program", "gpt-4": "expensive program"})
+    result = _cascade(provider, ["gpt-3.5-turbo", "gpt-4"])
+    assert (result.code, result.model_name, result.output, result.passed) == ("expensive program", "gpt-4", "42\n", True)
+    assert result.attempts == ["gpt-3.5-turbo", "gpt-4"]
+
+def test_last_tier_is_returned_when_nothing_passes():
+    provider = TieredProvider({"gpt-3.5-turbo": "cheap program", "gpt-4": "broken program"})
+    result = _cascade(provider, ["gpt-3.5-turbo", "gpt-4"])
+    assert (result.model_name, result.passed) == ("gpt-4", False)
+
+def test_without_expected_output_a_clean_run_passes():
+    provider = TieredProvider({"gpt-3.5-turbo": "broken program", "gpt-4": "cheap program"})
+    result = _cascade(provider, ["gpt-3.5-turbo", "gpt-4"], expected_output=None)
+    assert (result.model_name, result.passed) == ("gpt-4", True)
+
+def test_unknown_tiers_are_skipped():
+    provider = TieredProvider({"gpt-4": "expensive program"})
+    result = _cascade(provider, ["gpt-3.5-turbo", "gpt-4"])
+    assert result.model_name == "gpt-4"
+
+def test_tier_without_success_is_skipped_for_the_language():
+    tier_stats = TierStats(min_attempts=2)
+    for _ in range(2):
+        tier_stats.record("gpt-3.5-turbo", "C", False)
+    assert tier_stats.should_skip("gpt-3.5-turbo", "C")
+    assert not tier_stats.should_skip("gpt-3.5-turbo", "Python")
+    provider = TieredProvider({"gpt-3.5-turbo": "expensive program", "gpt-4": "expensive program"})
+    _cascade(provider, ["gpt-3.5-turbo", "gpt-4"], tier_stats, code_language="C")
+    assert provider.asked == ["gpt-4"]
+    # The last tier is always tried.
+    tier_stats.record("gpt-4", "C", False)
+    tier_stats.record("gpt-4", "C", False)
+    assert _cascade(provider, ["gpt-4"], tier_stats, code_language="C").model_name == "gpt-4"
+    assert tier_stats.success_rate("gpt-4", "C") == pytest.approx(2 / 4)
+    assert tier_stats.get_stats()["gpt-3.5-turbo/C"] == {"attempts": 2, "successes": 0}
+
+def test_tiers_are_configured_per_provider(monkeypatch):
+    assert load_cascade_tiers("openai") == ["gpt-3.5-turbo", "gpt-4"]
+    monkeypatch.setenv("CASCADE_TIERS", '{"openai": ["gpt-3.5-turbo-16k", "gpt-4-32k"]}')
+    assert load_cascade_tiers("openai") == ["gpt-3.5-turbo-16k", "gpt-4-32k"]
+    assert load_cascade_tiers("gemini") == ["gemini-pro"]
+    monkeypatch.setenv("CASCADE_TIERS", "not json")
+    assert load_cascade_tiers("openai") == ["gpt-3.5-turbo", "gpt-4"]
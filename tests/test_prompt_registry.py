@@ -0,0 +1,52 @@
+import pytest
+from libs.geminiai import sampling_options
+from libs.prompt_registry import PromptRegistry, guideline_mask, guidelines_text
+
+def test_guidelines_are_packed_in_a_bitmask():
+    mask = guideline_mask({"modular_code": True, "efficient_code": True, "robust_code": False})
+    assert mask == 0b1001
+    assert guidelines_text(mask) == "- Ensure the method is modular in its approach.\n- Optimize the code to ensure it runs efficiently."
+    assert guideline_mask(None) == 0 and guidelines_text(0) == ""
+
+def test_generate_prompt_is_rendered_with_the_request_values():
+    rendered = PromptRegistry().render("generate", "Python", {"naming_conventions": True}, code_prompt="hello world")
+    assert "Design a program hello world in Python" in rendered.text
+    assert "make sure the program doesn't ask for any input from the user" in rendered.text
+    assert "- Follow standard naming conventions." in rendered.text
+    assert rendered.token_count > 0
+
+def test_code_input_selects_the_input_section():
+    rendered = PromptRegistry().render("generate", "Python", code_input="1 2", code_prompt="sum")
+    assert "Given the input for code: 1 2" in rendered.text
+
+def test_request_values_are_never_parsed():
+    code = "int main() { printf(\"{code_language}\"); }"
+    rendered = PromptRegistry().render("fix", "C", code=code, fix_instructions="", history="", error="{error}")
+    assert code in rendered.text
+    assert rendered.text.endswith("Fix the following error: {error}")
+
+def test_compiled_templates_are_memoized():
+    registry = PromptRegistry()
+    first = registry.render("generate", "Python", code_prompt="hello")
+    second = registry.render("generate", "Python", code_prompt="goodbye")
+    assert registry.stats == {"compiled": 1, "hits": 1}
+    # The static hash names the template, the prompt hash the request.
+    assert first.static_hash == second.static_hash
+    assert first.prompt_hash != second.prompt_hash
+    other = registry.render("generate", "Rust", code_prompt="hello")
+    assert other.static_hash != first.static_hash
+    assert registry.stats["compiled"] == 2
+
+def test_registering_a_template_drops_its_compiled_versions():
+    registry = PromptRegistry()
+    registry.render("generate", "Python", code_prompt="hello")
+    registry.register("generate", "Write {code_prompt} in {code_language}.")
+    assert registry.render("generate", "Python", code_prompt="hello").text == "Write hello in Python."
+    assert registry.stats["compiled"] == 2
+
+def test_sampling_options_of_the_generation_modes():
+    assert sampling_options("precise") == {"top_k": 40, "top_p": 0.95}
+    assert sampling_options("balanced") == {"top_k": 20, "top_p": 0.85}
+    assert sampling_options("creative") == {"top_k": 10, "top_p": 0.75}
+    with pytest.raises(ValueError):
+        sampling_options("random")
@@ -0,0 +1,77 @@
+import os
+import time
+import pytest
+from libs.python_worker_pool import PythonWorker, PythonWorkerPool
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="the workers fork once per program")
+
+@pytest.fixture(scope="module")
+def pool():
+    return PythonWorkerPool(size=1, max_runs=1000).start()
+
+def test_output_is_stdout_followed_by_stderr(pool):
+    output = pool.run("import sys\nprint('err', file=sys.stderr)\nprint('out')")
+    assert output == "out\nerr\n"
+
+def test_stdin_is_a_real_file_descriptor(pool):
+    assert pool.run("print(input())\nprint(input())", "first\nsecond\n") == "first\nsecond\n"
+    assert pool.run("import sys\nprint(sys.stdin.buffer.read().upper())", "data") == "b'DATA'\n"
+    assert pool.run("print(open(0).read().split())", "1 2 3") == "['1', '2', '3']\n"
+
+def test_output_of_subprocesses_is_captured(pool):
+    output = pool.run("import os\nos.system('echo from the shell')\nprint('from python', flush=True)")
+    assert output == "from the shell\nfrom python\n"
+
+def test_programs_do_not_leak_into_the_next_one(pool):
+    pool.run("import os, builtins\nos.chdir('/')\nbuiltins.print = None\nimport json\njson.loads = None\nLEAKED = 1")
+    output = pool.run("import os, json\nprint(os.getcwd() != '/', json.loads('[1]'), 'LEAKED' in globals())")
+    assert output == "True [1] False\n"
+
+def test_program_runs_as_main(pool):
+    code = "import sys\nif __name__ == '__main__':\n    print(sys.argv)\ndef f():\n    pass\nprint(f.__module__)"
+    assert pool.run(code) == "['main.py']\n__main__\n"
+
+def test_exceptions_and_exit_statuses(pool):
+    output = pool.run("def f():\n    return 1 / 0\nf()")
+    assert output.startswith("Traceback (most recent call last):\n")
+    assert 'File "main.py", line 3' in output
+    assert "return 1 / 0" in output
+    assert output.endswith("ZeroDivisionError: division by zero\n")
+    assert pool.run("import sys\nprint('before')\nsys.exit('failed')") == "before\nfailed\n"
+    assert pool.run("import sys\nsys.exit(3)") == ""
+
+def test_atexit_handlers_and_threads_run_before_exit(pool):
+    code = (
+        "import atexit, threading, time\n"
+        "atexit.register(lambda: print('exit handler'))\n"
+        "threading.Thread(target=lambda: (time.sleep(0.1), print('thread'))).start()\n"
+        "print('main')\n"
+    )
+    assert pool.run(code) == "main\nthread\nexit handler\n"
+
+def test_program_is_killed_after_the_timeout(pool):
+    started = time.monotonic()
+    output = pool.run("import os\nos.system('sleep 30')\nprint('never')", timeout=1)
+    assert time.monotonic() - started < 5
+    assert "never" not in output
+    assert output.endswith("Error: the program did not finish within 1 seconds.")
+    # The worker survives and runs the next program.
+    assert pool.run("print('next')") == "next\n"
+    assert pool.get_stats()["timeouts"] >= 1
+
+def test_program_without_a_timeout_runs_until_it_exits(pool, monkeypatch):
+    sent = []
+    run = PythonWorker.run
+    def recorded_run(worker, code, stdin, timeout):
+        sent.append(timeout)
+        return run(worker, code, stdin, timeout)
+    monkeypatch.setattr(PythonWorker, "run", recorded_run)
+    assert pool.run("import time\ntime.sleep(1.2)\nprint('done')") == "done\n"
+    assert pool.run("print('limited')", timeout=5) == "limited\n"
+    assert sent == [None, 5]
+
+def test_workers_are_recycled_after_max_runs():
+    recycled_pool = PythonWorkerPool(size=1, max_runs=2).start()
+    pids = [recycled_pool.run("import os\nprint(os.getppid())").strip() for _ in range(4)]
+    assert pids[0] == pids[1] != pids[2] == pids[3]
+    assert recycled_pool.get_stats()["recycled"] == 2
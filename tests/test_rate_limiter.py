@@ -0,0 +1,123 @@
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+import libs.rate_limiter
+from libs.rate_limiter import RateLimiter, RateLimitTimeout, TokenBucket
+from libs.single_flight import SingleFlight
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Frozen monotonic clock, sleeping moves it forward."""
+    clock = {"now": 1000.0, "slept": []}
+    def sleep(seconds):
+        clock["slept"].append(seconds)
+        clock["now"] += seconds
+    monkeypatch.setattr(libs.rate_limiter, "time", SimpleNamespace(monotonic=lambda: clock["now"], sleep=sleep))
+    return clock
+
+def test_bucket_allows_a_burst_then_refills(clock):
+    bucket = TokenBucket(60)
+    assert all(bucket.reserve(1) == 0 for _ in range(60))
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    # Waiters queue up behind each other.
+    assert bucket.reserve(1) == pytest.approx(2.0)
+    clock["now"] += 2
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+def test_requests_larger_than_the_bucket_wait_for_a_full_bucket(clock):
+    bucket = TokenBucket(600)
+    assert bucket.reserve(10000) == 0
+    assert bucket.reserve(600) == pytest.approx(60.0)
+
+def test_acquire_waits_for_the_tokens(clock):
+    limiter = RateLimiter(requests_per_minute=1000, tokens_per_minute=600)
+    limiter.acquire("openai", "openai/key", 600)
+    limiter.acquire("openai", "openai/key", 300)
+    assert clock["slept"] == [pytest.approx(30.0)]
+    assert limiter.get_stats() == {"requests": 2, "throttled": 1, "waited_seconds": pytest.approx(30.0)}
+    # Every key has its own buckets.
+    limiter.acquire("openai", "openai/other-key", 600)
+    assert len(clock["slept"]) == 1
+
+def test_acquire_gives_up_without_consuming_beyond_max_wait(clock):
+    limiter = RateLimiter(requests_per_minute=1, tokens_per_minute=100000, max_wait=10)
+    limiter.acquire("openai", "openai/key", 1)
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire("openai", "openai/key", 1)
+    clock["now"] += 60
+    limiter.acquire("openai", "openai/key", 1)
+    assert clock["slept"] == []
+
+def test_limits_are_overridden_per_provider(clock, monkeypatch):
+    monkeypatch.setenv("PALM_RATE_LIMIT_RPM", "2")
+    limiter = RateLimiter(requests_per_minute=1000, max_wait=0)
+    for _ in range(2):
+        limiter.acquire("palm", "palm/key", 1)
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire("palm", "palm/key", 1)
+    for _ in range(3):
+        limiter.acquire("gemini", "gemini/key", 1)
+
+def test_identical_calls_in_flight_are_coalesced():
+    single_flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def call():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "completion"
+
+    leader = threading.Thread(target=lambda: results.append(single_flight.do("key", call)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(single_flight.do("key", call))) for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    while single_flight.stats["coalesced"] < 3:
+        time.sleep(0.01)
+    assert single_flight.in_flight() == 1
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    assert results == ["completion"] * 4
+    assert len(calls) == 1
+    assert single_flight.in_flight() == 0
+    # The finished call is not reused.
+    assert single_flight.do("key", lambda: "next") == "next"
+
+def test_waiters_receive_the_exception_of_the_call():
+    single_flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def failing_call():
+        started.set()
+        release.wait(5)
+        raise ValueError("invalid prompt")
+
+    def run():
+        try:
+            single_flight.do("key", failing_call)
+        except ValueError as exception:
+            errors.append(exception)
+
+    threads = [threading.Thread(target=run)]
+    threads[0].start()
+    started.wait(5)
+    threads.append(threading.Thread(target=run))
+    threads[1].start()
+    while single_flight.stats["coalesced"] < 1:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(errors) == 2 and errors[0] is errors[1]
+
+def test_different_keys_are_not_coalesced():
+    single_flight = SingleFlight()
+    assert single_flight.do("first", lambda: 1) == 1
+    assert single_flight.do("second", lambda: 2) == 2
+    assert single_flight.stats == {"calls": 2, "coalesced": 0}
@@ -0,0 +1,146 @@
+import time
+from types import SimpleNamespace
+import pytest
+import libs.resilience
+from libs.resilience import CircuitBreaker, CircuitOpenError, ResilienceManager, RetryableError, get_retry_after, is_retryable
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+class RateLimitError(Exception):
+    pass
+
+class FlakyCall:
+    """Fails with the given exceptions first, then returns "ok"."""
+    def __init__(self, *exceptions):
+        self.exceptions = list(exceptions)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.exceptions:
+            raise self.exceptions.pop(0)
+        return "ok"
+
+@pytest.fixture
+def manager():
+    return ResilienceManager(max_attempts=3, base_delay=0, max_delay=0, failure_threshold=5, recovery_timeout=60)
+
+def test_transient_errors_are_recognized():
+    assert is_retryable(StatusError(429)) and is_retryable(StatusError(503))
+    assert not is_retryable(StatusError(401)) and not is_retryable(StatusError(400))
+    assert is_retryable(RateLimitError()) and is_retryable(TimeoutError()) and is_retryable(ConnectionError())
+    assert is_retryable(RetryableError("busy"))
+    assert not is_retryable(ValueError("invalid prompt"))
+    assert not is_retryable(CircuitOpenError("openai/gpt-4", 10))
+
+def test_retry_after_hint():
+    assert get_retry_after(RetryableError("busy", retry_after="2.5")) == 2.5
+    assert get_retry_after(ValueError()) is None
+    assert get_retry_after(RetryableError("busy", retry_after="soon")) is None
+
+def test_transient_errors_are_retried(manager):
+    call = FlakyCall(StatusError(503))
+    assert manager.call("provider/model", call) == "ok"
+    assert call.calls == 2
+    assert manager.get_stats()["retries"] == 1
+    assert manager.get_stats()["breakers"]["provider/model"] == {"state": "closed", "consecutive_failures": 0}
+
+def test_request_errors_are_raised_straight_away(manager):
+    call = FlakyCall(ValueError("invalid prompt"))
+    with pytest.raises(ValueError):
+        manager.call("provider/model", call)
+    assert call.calls == 1
+    assert manager.get_stats()["failures"] == 0
+
+def test_gives_up_after_max_attempts(manager):
+    call = FlakyCall(*[StatusError(500)] * 3)
+    with pytest.raises(StatusError):
+        manager.call("provider/model", call)
+    assert call.calls == 3
+
+def test_long_retry_after_is_not_waited_for(manager):
+    call = FlakyCall(RetryableError("quota", retry_after=3600))
+    with pytest.raises(RetryableError):
+        manager.call("provider/model", call)
+    assert call.calls == 1
+
+def test_circuit_opens_and_fails_fast():
+    manager = ResilienceManager(max_attempts=3, base_delay=0, failure_threshold=2, recovery_timeout=60)
+    failing_call = FlakyCall(*[StatusError(500)] * 3)
+    # The circuit opens after the second failure, so the third attempt is not sent.
+    with pytest.raises(CircuitOpenError):
+        manager.call("provider/model", failing_call)
+    assert failing_call.calls == 2
+    assert manager.is_open("provider/model")
+    call = FlakyCall()
+    with pytest.raises(CircuitOpenError):
+        manager.call("provider/model", call)
+    assert call.calls == 0
+    assert manager.get_stats()["short_circuits"] == 2
+    # The circuits of the other models are not affected.
+    assert manager.call("provider/other-model", call) == "ok"
+
+def test_half_open_circuit_sends_one_trial(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(libs.resilience, "time", SimpleNamespace(monotonic=lambda: now[0], time=time.time, sleep=time.sleep))
+    breaker = CircuitBreaker("provider/model", failure_threshold=1, recovery_timeout=30)
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow_request()
+    now[0] += 31
+    assert breaker.allow_request()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow_request()
+    # A failed trial opens the circuit again, a successful one closes it.
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    now[0] += 31
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow_request()
+
+def test_stream_retries_failures_before_the_first_chunk(manager):
+    attempts = []
+    def chunks():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise StatusError(503)
+        yield from ["a", "b"]
+    assert list(manager.stream("provider/model", chunks)) == ["a", "b"]
+    assert len(attempts) == 2
+
+def test_stream_breaking_half_way_is_not_retried(manager):
+    attempts = []
+    def chunks():
+        attempts.append(1)
+        yield "a"
+        raise StatusError(503)
+    stream = manager.stream("provider/model", chunks)
+    assert next(stream) == "a"
+    with pytest.raises(StatusError):
+        next(stream)
+    assert len(attempts) == 1
+    assert manager.get_stats()["breakers"]["provider/model"]["consecutive_failures"] == 1
+
+def test_stream_closed_by_the_consumer_ends_the_trial(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(libs.resilience, "time", SimpleNamespace(monotonic=lambda: now[0], time=time.time, sleep=time.sleep))
+    manager = ResilienceManager(base_delay=0, failure_threshold=1, recovery_timeout=30)
+    breaker = manager.get_breaker("provider/model")
+    breaker.record_failure()
+    now[0] += 31
+    closed = []
+    def chunks():
+        try:
+            yield from ["a", "b"]
+        finally:
+            closed.append(True)
+    stream = manager.stream("provider/model", chunks)
+    assert next(stream) == "a"
+    stream.close()
+    assert closed == [True]
+    # The trial was released, so the next call is let through as a new trial.
+    assert breaker.allow_request()
@@ -0,0 +1,62 @@
+import time
+from libs.response_cache import ResponseCache, bypass_response_cache, is_cache_bypassed
+
+def test_make_key_is_stable_and_covers_every_part():
+    key = ResponseCache.make_key(provider="openai", model="gpt-4", options={"top_k": 1, "top_p": 0.5}, prompt="p")
+    assert key == ResponseCache.make_key(prompt="p", options={"top_p": 0.5, "top_k": 1}, model="gpt-4", provider="openai")
+    assert key != ResponseCache.make_key(provider="openai", model="gpt-4", options={"top_k": 2, "top_p": 0.5}, prompt="p")
+    assert key != ResponseCache.make_key(provider="openai", model="gpt-4", options={"top_k": 1, "top_p": 0.5}, prompt="q")
+
+def test_entries_survive_a_restart_on_disk(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    ResponseCache(db_path=db_path).set("key", "completion")
+    reopened = ResponseCache(db_path=db_path)
+    assert reopened.get("key") == "completion"
+    assert reopened.get_stats()["disk_hits"] == 1
+    assert reopened.get("key") == "completion"
+    assert reopened.get_stats()["memory_hits"] == 1
+
+def test_missing_and_none_values(tmp_path):
+    cache = ResponseCache(db_path=str(tmp_path / "cache.db"))
+    cache.set("key", None)
+    assert cache.get("key") is None
+    assert cache.get_stats()["misses"] == 1
+
+def test_expired_entries_are_dropped(tmp_path):
+    cache = ResponseCache(db_path=str(tmp_path / "cache.db"), ttl_seconds=0.05)
+    cache.set("key", "completion")
+    time.sleep(0.1)
+    assert cache.get("key") is None
+    assert ResponseCache(db_path=str(tmp_path / "cache.db"), ttl_seconds=0.05).get("key") is None
+
+def test_memory_and_disk_tiers_are_bounded(tmp_path):
+    cache = ResponseCache(db_path=str(tmp_path / "cache.db"), max_memory_entries=2, max_disk_entries=3)
+    for index in range(5):
+        cache.set(f"key {index}", f"value {index}")
+        time.sleep(0.001)
+    assert cache.get_stats()["memory_entries"] == 2
+    rows = cache._connection.execute("SELECT key FROM responses ORDER BY key").fetchall()
+    assert [row[0] for row in rows] == ["key 2", "key 3", "key 4"]
+    assert cache.get("key 0") is None
+    assert cache.get("key 2") == "value 2"
+
+def test_clear(tmp_path):
+    cache = ResponseCache(db_path=str(tmp_path / "cache.db"))
+    cache.set("key", "completion")
+    cache.clear()
+    assert cache.get("key") is None
+
+def test_bypass_is_scoped_to_the_block():
+    assert not is_cache_bypassed()
+    with bypass_response_cache():
+        assert is_cache_bypassed()
+    assert not is_cache_bypassed()
+
+def test_provider_completions_are_cached(echo_provider):
+    assert echo_provider.complete("hello") == echo_provider.complete("hello")
+    assert len(echo_provider.calls) == 1
+    echo_provider.complete("hello", top_k=5)
+    assert len(echo_provider.calls) == 2
+    with bypass_response_cache():
+        echo_provider.complete("hello")
+    assert len(echo_provider.calls) == 3
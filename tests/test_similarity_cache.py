@@ -0,0 +1,47 @@
+import pytest
+from libs.similarity_cache import SimilarityCache
+
+NAMESPACE = SimilarityCache.make_namespace("openai", "gpt-4", "Python", None)
+
+def test_normalize():
+    assert SimilarityCache.normalize("  Write a  PROGRAM, to sort!\n") == "write a program to sort"
+
+def test_near_duplicate_prompt_is_found():
+    cache = SimilarityCache()
+    cache.add(NAMESPACE, "Write a program to sort a list of numbers in ascending order", "sorted(numbers)")
+    match = cache.lookup(NAMESPACE, "write a program to sort a list of numbers in ascending order!")
+    assert match.code == "sorted(numbers)"
+    assert match.score == 1.0
+    match = cache.lookup(NAMESPACE, "Write a program to sort a list of the numbers in ascending order", threshold=0.7)
+    assert match is not None and 0.7 <= match.score < 1.0
+
+def test_different_prompts_do_not_match():
+    cache = SimilarityCache()
+    cache.add(NAMESPACE, "Write a program to sort a list of numbers in ascending order", "sorted(numbers)")
+    assert cache.lookup(NAMESPACE, "Print the first hundred prime numbers") is None
+    assert cache.lookup(NAMESPACE, "") is None
+
+def test_namespaces_are_separate():
+    cache = SimilarityCache()
+    prompt = "Write a program to sort a list of numbers"
+    cache.add(NAMESPACE, prompt, "sorted(numbers)")
+    other_namespace = SimilarityCache.make_namespace("openai", "gpt-4", "Java", None)
+    assert cache.lookup(other_namespace, prompt) is None
+
+def test_best_match_wins():
+    cache = SimilarityCache(threshold=0.5)
+    cache.add(NAMESPACE, "Write a program to reverse a string", "first")
+    cache.add(NAMESPACE, "Write a program to reverse a string in place", "second")
+    assert cache.lookup(NAMESPACE, "write a program to reverse a string in place").code == "second"
+
+def test_oldest_entries_are_evicted():
+    cache = SimilarityCache(max_entries=2)
+    for index, prompt in enumerate(["Compute the factorial of n", "Parse a CSV file into rows", "Download a web page over HTTP"]):
+        cache.add(NAMESPACE, prompt, f"code {index}")
+    assert len(cache) == 2
+    assert cache.lookup(NAMESPACE, "Compute the factorial of n") is None
+    assert cache.lookup(NAMESPACE, "Download a web page over HTTP").code == "code 2"
+
+def test_invalid_band_configuration():
+    with pytest.raises(ValueError):
+        SimilarityCache(num_permutations=100, bands=32)
@@ -0,0 +1,35 @@
+from conftest import EchoProvider
+from libs.usage_meter import get_usage_ledger
+
+class StreamingProvider(EchoProvider):
+    def _stream_complete(self, prompt, **options):
+        self.calls.append((prompt, options))
+        yield from ["```python\n", "print(1)\n", "print(2)\n", "```"]
+
+def _usage_of(model_name):
+    return next((row for row in get_usage_ledger().aggregate("model") if row["model"] == model_name), None)
+
+def test_stream_yields_the_chunks_and_caches_the_completion(request):
+    provider = StreamingProvider(f"stream-{request.node.nodeid}")
+    assert list(provider.stream_complete("prompt")) == ["```python\n", "print(1)\n", "print(2)\n", "```"]
+    # The completed stream is served from the cache in one chunk.
+    assert list(provider.stream_complete("prompt")) == ["```python\nprint(1)\nprint(2)\n```"]
+    assert provider.complete("prompt") == "```python\nprint(1)\nprint(2)\n```"
+    assert len(provider.calls) == 1
+    assert _usage_of(provider.model_name)["requests"] == 1
+
+def test_stream_closed_early_is_metered_but_not_cached(request):
+    provider = StreamingProvider(f"stream-{request.node.nodeid}")
+    stream = provider.stream_complete("prompt")
+    assert [next(stream), next(stream)] == ["```python\n", "print(1)\n"]
+    stream.close()
+    assert _usage_of(provider.model_name)["requests"] == 1
+    assert list(provider.stream_complete("prompt"))[-1] == "```"
+    assert len(provider.calls) == 2
+
+def test_providers_without_a_streaming_backend_send_one_chunk(echo_provider):
+    assert list(echo_provider.stream_complete("prompt")) == ["```python\nprint('prompt')\n```"]
+
+def test_generate_code_stream_renders_the_generation_prompt(echo_provider, monkeypatch):
+    monkeypatch.setattr(EchoProvider, "build_generate_prompt", lambda self, code_prompt, code_language: f"{code_prompt} in {code_language}")
+    assert "".join(echo_provider.generate_code_stream("hello", "Python")) == "```python\nprint('hello in Python')\n```"
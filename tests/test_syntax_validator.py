@@ -0,0 +1,54 @@
+import shutil
+import pytest
+from libs.syntax_validator import PythonUnitChecker, StreamingValidator
+
+def _stream(validator, text, chunk_size=7):
+    """Feed the text in chunks, return (SyntaxCheck, characters fed) of the first failure or (None, all)."""
+    for start in range(0, len(text), chunk_size):
+        check = validator.feed(text[start:start + chunk_size])
+        if check:
+            return check, start + chunk_size
+    return None, len(text)
+
+def test_valid_python_program_passes():
+    text = "```python\nimport os\n\ndef main():\n    print(os.getcwd())\n\nif __name__ == '__main__':\n    main()\n```\nDone."
+    assert _stream(StreamingValidator("Python"), text) == (None, len(text))
+
+def test_broken_python_unit_stops_the_stream_early():
+    broken_unit = "```python\ndef first(:\n    return 1\n\n"
+    text = broken_unit + "def second():\n    return 2\n" * 50 + "```\n"
+    check, fed = _stream(StreamingValidator("Python"), text)
+    assert check is not None
+    assert not check.complete
+    assert "SyntaxError" in check.diagnostics
+    assert 'line 1' in check.diagnostics
+    # Reported as soon as the next unit started, long before the end of the response.
+    assert fed < len(broken_unit) + 40
+
+def test_error_line_counts_the_units_checked_before():
+    text = "```python\nx = 1\n\ny = (\n\nz = 3\n```\n"
+    check, _ = _stream(StreamingValidator("Python"), text, chunk_size=3)
+    assert check is not None
+    assert "line 3" in check.diagnostics
+
+def test_unfinished_python_unit_is_not_an_error():
+    checker = PythonUnitChecker()
+    assert checker.check('text = """first\n\nsecond\n') is None
+    assert checker.check('text = """first\n\nsecond\n"""\nprint(text)\n', final=True) is None
+
+def test_blocks_in_other_languages_are_ignored():
+    text = "```bash\nif [ x\n```\n```python\nprint('ok')\n```\n"
+    assert _stream(StreamingValidator("Python"), text) == (None, len(text))
+
+def test_languages_without_a_checker_are_skipped():
+    validator = StreamingValidator("Ruby")
+    assert validator.feed("```ruby\ndef (\n```\n") is None
+
+@pytest.mark.skipif(shutil.which("gcc") is None, reason="gcc is not installed")
+def test_c_program_is_checked_when_its_fence_closes():
+    validator = StreamingValidator("C")
+    assert validator.feed("```c\nint main() {\n    return 0\n") is None
+    check = validator.feed("}\n```\nThe program returns 0.")
+    assert check is not None
+    assert check.complete
+    assert "error" in check.diagnostics
@@ -0,0 +1,47 @@
+from libs.targeted_repair import RepairRegion, apply_unified_diff, extract_diff, locate_region, parse_hunks
+
+PROGRAM = "\n".join(f"line {number}" for number in range(1, 21)) + "\n"
+
+def test_hunk_is_applied():
+    diff = "--- a/main.py\n+++ b/main.py\n@@ -4,3 +4,3 @@\n line 4\n-line 5\n+line five\n line 6\n"
+    repaired = apply_unified_diff(PROGRAM, diff)
+    assert repaired.splitlines()[3:6] == ["line 4", "line five", "line 6"]
+    assert repaired.endswith("line 20\n")
+
+def test_hunks_match_by_content_near_wrong_line_numbers():
+    diff = "@@ -2,2 +2,3 @@\n line 7\n+inserted\n line 8\n@@ -15,1 +16,0 @@\n-line 12\n"
+    repaired = apply_unified_diff(PROGRAM, diff).splitlines()
+    assert repaired[6:9] == ["line 7", "inserted", "line 8"]
+    assert "line 12" not in repaired
+    assert len(repaired) == 20
+
+def test_empty_context_lines_without_their_leading_space():
+    code = "def a():\n    return 1\n\ndef b():\n    return 2\n"
+    diff = "@@ -2,4 +2,4 @@\n     return 1\n\n def b():\n-    return 2\n+    return 3\n"
+    assert apply_unified_diff(code, diff) == "def a():\n    return 1\n\ndef b():\n    return 3\n"
+
+def test_whitespace_differences_still_match():
+    code = "if x:\n\ty = 1\n"
+    diff = "@@ -1,2 +1,2 @@\n if x:\n-    y = 1\n+    y = 2\n"
+    assert apply_unified_diff(code, diff) == "if x:\n    y = 2\n"
+
+def test_mismatching_hunk_is_rejected():
+    diff = "@@ -3,1 +3,1 @@\n-line 300\n+line three\n"
+    assert apply_unified_diff(PROGRAM, diff) is None
+
+def test_hunk_outside_the_region_is_rejected():
+    diff = "@@ -18,1 +18,1 @@\n-line 18\n+line eighteen\n"
+    assert apply_unified_diff(PROGRAM, diff, RepairRegion(5, 15, 10)) is None
+    assert apply_unified_diff(PROGRAM, diff, RepairRegion(10, 20, 15)) is not None
+
+def test_text_without_hunks_is_rejected():
+    assert parse_hunks("no diff here") == []
+    assert apply_unified_diff(PROGRAM, "no diff here") is None
+
+def test_diff_is_extracted_from_its_fence():
+    completion = "The fix:\n```diff\n@@ -1 +1 @@\n-a\n+b\n```\n"
+    assert extract_diff(completion) == "@@ -1 +1 @@\n-a\n+b"
+
+def test_region_around_the_innermost_traceback_frame():
+    diagnostics = 'Traceback (most recent call last):\n  File "main.py", line 3, in <module>\n  File "main.py", line 12, in f\nZeroDivisionError'
+    assert locate_region(PROGRAM, diagnostics, context_lines=2) == RepairRegion(10, 14, 12)
@@ -0,0 +1,97 @@
+import os
+import stat
+import threading
+import pytest
+import libs.toolchain_registry
+from libs.toolchain_registry import TOOLCHAIN_COMMANDS, ToolchainRegistry, probe_toolchain
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="the fake toolchains are shell scripts")
+
+def _install(directory, name, script):
+    path = directory / name
+    path.write_text(f"#!/bin/sh\n{script}\n")
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    return str(path)
+
+@pytest.fixture
+def bin_directory(tmp_path, monkeypatch):
+    """A PATH holding only fake gcc, javac and go toolchains."""
+    directory = tmp_path / "bin"
+    directory.mkdir()
+    _install(directory, "gcc", 'echo "gcc (Fake) 13.2.0"\necho "Copyright"')
+    _install(directory, "javac", 'echo "javac 21.0.1" >&2')
+    _install(directory, "go", "exit 1")
+    monkeypatch.setenv("PATH", str(directory))
+    return directory
+
+@pytest.fixture
+def probes(monkeypatch):
+    """The language codes probed, in order."""
+    probed = []
+    def counting_probe(language_code):
+        probed.append(language_code)
+        return probe_toolchain(language_code)
+    monkeypatch.setattr(libs.toolchain_registry, "probe_toolchain", counting_probe)
+    return probed
+
+def test_probe_records_path_and_version(bin_directory):
+    gcc = probe_toolchain("c")
+    assert (gcc.command, gcc.path, gcc.version, gcc.available) == ("gcc", str(bin_directory / "gcc"), "gcc (Fake) 13.2.0", True)
+    # The version printed to stderr is used when stdout is empty.
+    assert probe_toolchain("javac").version == "javac 21.0.1"
+    go = probe_toolchain("go")
+    assert go.path is not None and not go.available
+    assert probe_toolchain("ruby").path is None
+
+def test_lookups_are_answered_from_the_inventory(bin_directory, probes):
+    registry = ToolchainRegistry()
+    toolchains = registry.discover()
+    assert set(toolchains) == set(TOOLCHAIN_COMMANDS) == set(probes)
+    probes.clear()
+    assert registry.is_available("c") and registry.is_available("javac")
+    assert not registry.is_available("go") and not registry.is_available("ruby") and not registry.is_available("cobol")
+    assert probes == []
+    assert {code for code, toolchain in registry.inventory().items() if toolchain.available} == {"c", "javac"}
+
+def test_language_is_probed_on_demand_before_the_discovery(bin_directory, probes):
+    registry = ToolchainRegistry()
+    registry.start_background_discovery = lambda: None
+    assert registry.get("c").available
+    assert registry.get("c").available
+    assert probes == ["c"]
+
+def test_path_change_probes_again(bin_directory, tmp_path, probes, monkeypatch):
+    registry = ToolchainRegistry()
+    registry.discover()
+    registry.start_background_discovery = lambda: None
+    probes.clear()
+    other_directory = tmp_path / "other"
+    other_directory.mkdir()
+    _install(other_directory, "go", 'echo "go version go1.22.0 linux/amd64"')
+    monkeypatch.setenv("PATH", f"{other_directory}{os.pathsep}{bin_directory}")
+    assert registry.get("go").version == "go version go1.22.0 linux/amd64"
+    assert registry.get("c").path == str(bin_directory / "gcc")
+    assert probes == ["go", "c"]
+
+def test_expired_inventory_is_used_while_it_is_rediscovered(bin_directory, probes):
+    registry = ToolchainRegistry(ttl=3600)
+    registry.discover()
+    started = []
+    registry.start_background_discovery = lambda: started.append(True)
+    registry.get("c")
+    assert started == []
+    registry.invalidate()
+    assert registry.get("c").available
+    assert started == [True]
+    assert probes.count("c") == 1
+
+def test_background_discovery_runs_once_at_a_time(bin_directory):
+    registry = ToolchainRegistry()
+    release = threading.Event()
+    discover = registry.discover
+    registry.discover = lambda: (release.wait(30), discover())
+    first = registry.start_background_discovery()
+    assert registry.start_background_discovery() is first
+    release.set()
+    first.join(30)
+    assert registry.inventory()["c"].available
@@ -0,0 +1,60 @@
+import json
+import time
+import pytest
+from libs.usage_meter import PriceTable, Usage, UsageLedger, get_usage_ledger, report_usage, reset_reported_usage
+
+@pytest.fixture
+def ledger(tmp_path):
+    return UsageLedger(str(tmp_path / "usage_ledger.db"))
+
+def test_reported_usage_takes_precedence_over_the_local_count():
+    reset_reported_usage()
+    usage = Usage.measure("prompt text", "completion text", "gpt-4")
+    assert usage.source == "estimate" and usage.prompt_tokens > 0
+    report_usage(prompt_tokens=120, completion_tokens=30)
+    usage = Usage.measure("prompt text", "completion text", "gpt-4")
+    assert (usage.prompt_tokens, usage.completion_tokens, usage.source) == (120, 30, "provider")
+    assert (usage.prompt_characters, usage.completion_characters) == (11, 15)
+    reset_reported_usage()
+
+def test_models_are_priced_per_token_or_character():
+    price_table = PriceTable()
+    assert price_table.cost("gpt-4", Usage(1000, 500, 0, 0)) == pytest.approx(0.03 + 0.03)
+    assert price_table.cost("gemini-pro", Usage(0, 0, 4000, 2000)) == pytest.approx(0.001 + 0.001)
+    assert price_table.cost("mock-coder", Usage(1000, 1000, 1000, 1000)) == 0
+    assert price_table.cost("unknown-model", Usage(1000, 1000, 1000, 1000)) == 0
+
+def test_price_table_is_loaded_from_a_file(tmp_path):
+    path = tmp_path / "prices.json"
+    path.write_text(json.dumps({"version": "2024-06", "models": {"gpt-4": {"unit": "token", "input": 0.01, "output": 0.02}}}))
+    price_table = PriceTable.load(str(path))
+    assert price_table.version == "2024-06"
+    assert price_table.cost("gpt-4", Usage(1000, 1000, 0, 0)) == pytest.approx(0.03)
+    # Models missing from the file keep their built in price.
+    assert "gemini-pro" in price_table.prices
+    assert PriceTable.load(str(tmp_path / "missing.json")).version == PriceTable().version
+
+def test_ledger_aggregates_per_model_and_session(ledger):
+    ledger.record("openai", "gpt-4", Usage(1000, 500, 0, 0), session_id="first")
+    ledger.record("openai", "gpt-4", Usage(1000, 500, 0, 0), session_id="second")
+    ledger.record("gemini", "gemini-pro", Usage(10, 10, 4000, 2000), session_id="first")
+    assert ledger.aggregate("model") == [
+        {"model": "gemini-pro", "requests": 1, "prompt_tokens": 10, "completion_tokens": 10, "cost": pytest.approx(0.002)},
+        {"model": "gpt-4", "requests": 2, "prompt_tokens": 2000, "completion_tokens": 1000, "cost": pytest.approx(0.12)},
+    ]
+    assert [row["session"] for row in ledger.aggregate("session")] == ["first", "second"]
+    assert ledger.total_cost(session_id="first") == pytest.approx(0.062)
+    today = time.strftime("%Y-%m-%d", time.gmtime())
+    assert ledger.aggregate("day") == [{"day": today, "requests": 3, "prompt_tokens": 2010, "completion_tokens": 1010, "cost": pytest.approx(0.122)}]
+    assert ledger.aggregate("provider", day="2000-01-01") == []
+
+def test_ledger_keeps_no_prompt_text(ledger, tmp_path):
+    ledger.record("openai", "gpt-4", Usage.measure("secret prompt", "secret completion", "gpt-4"), session_id="first")
+    assert b"secret" not in (tmp_path / "usage_ledger.db").read_bytes()
+
+def test_provider_calls_are_metered_and_cache_hits_are_not(echo_provider):
+    def requests():
+        return sum(row["requests"] for row in get_usage_ledger().aggregate("model") if row["model"] == echo_provider.model_name)
+    echo_provider.complete("prompt")
+    echo_provider.complete("prompt")
+    assert requests() == 1